@@ -0,0 +1,291 @@
+"""Local stand-in for Google Calendar API v3, for benchmarks."""
+
+import email.parser
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Locations of the Calendar v3 discovery document served to googleapiclient,
+# in order of preference: the copy CalGuru builds its clients from, then the
+# one bundled with googleapiclient
+DISCOVERY_DOCUMENT_DIRS = [os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    'src/api/discovery/calendar.v3.json')]
+try:
+    import googleapiclient
+    DISCOVERY_DOCUMENT_DIRS.append(os.path.join(
+        os.path.dirname(googleapiclient.__file__),
+        'discovery_cache/documents/calendar.v3.json'))
+except ImportError:
+    pass
+
+# Path of events collection calls, after the service path
+SERVICE_PATH = '/calendar/v3/'
+
+
+class FakeCalendarServer(object):
+    """
+    HTTP server implementing the Google Calendar API v3 calls CalGuru makes
+    (events insert, get, patch, delete, and list, alone or in batch
+    requests), keeping events in memory.
+
+    Every HTTP request is delayed by latency seconds, plus call_latency
+    seconds per call it contains. Each call independently fails with a 500
+    backendError with probability error_rate, and with a 429
+    rateLimitExceeded with probability rate_limit_rate.
+
+    Point GoogleServiceCache's discovery_url at discovery_url to send
+    CalGuru's calls to the server. The Calendar v3 discovery document served
+    there is read from discovery_document_dir, or else from CalGuru's copy
+    in src/api/discovery.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, call_latency=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, seed=None,
+                 discovery_document_dir=None):
+        self.latency = latency
+        self.call_latency = call_latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+
+        # Guards events and counters
+        self.lock = threading.Lock()
+
+        # Events by calendar id and event id
+        self.events = {}
+
+        # Number of HTTP requests and calls received, and calls failed
+        self.requests = 0
+        self.calls = 0
+        self.failures = 0
+
+        server = self
+
+        class Handler(FakeCalendarHandler):
+            fake = server
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = 'http://%s:%d/' % self.httpd.server_address[:2]
+        self.discovery_url = self.url + 'discovery/v1/apis/{api}/{apiVersion}/rest'
+        self._thread = None
+
+        # Discovery document with calls sent to this server
+        paths = ([discovery_document_dir] if discovery_document_dir else []) + \
+            DISCOVERY_DOCUMENT_DIRS
+        for path in paths:
+            if os.path.exists(path):
+                with open(path, 'rb') as document_file:
+                    document = json.loads(document_file.read().decode('utf-8'))
+                break
+        else:
+            raise RuntimeError("Calendar v3 discovery document wasn't found.")
+        document['rootUrl'] = self.url
+        document['baseUrl'] = self.url + SERVICE_PATH.lstrip('/')
+        self.discovery_document = json.dumps(document).encode('utf-8')
+
+    def start(self):
+        """Starts serving in a background thread; returns self."""
+
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        daemon=True, name='fake-gcal-server')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving."""
+
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def handle_call(self, method, url, body, headers=None):
+        """
+        Returns (status, response dict or None) of a single call with input
+        HTTP method, URL (path and query), json body, and headers. Patches
+        with an If-Match header not matching the event's etag fail with 412.
+        """
+
+        with self.lock:
+            self.calls += 1
+            roll = self._random.random()
+            if roll < self.rate_limit_rate:
+                self.failures += 1
+                return make_error(429, 'rateLimitExceeded', 'Rate Limit Exceeded')
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.failures += 1
+                return make_error(500, 'backendError', 'Backend Error')
+
+        parts = urlsplit(url)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        path = parts.path[len(SERVICE_PATH):] if parts.path.startswith(SERVICE_PATH) \
+            else parts.path.lstrip('/')
+        segments = [unquote(segment) for segment in path.split('/')]
+        if len(segments) < 3 or segments[0] != 'calendars' or segments[2] != 'events':
+            return make_error(404, 'notFound', 'Not Found')
+        calendar_id = segments[1]
+        event_id = segments[3] if len(segments) > 3 else None
+
+        with self.lock:
+            calendar = self.events.setdefault(calendar_id, {})
+
+            if method == 'POST' and event_id is None:
+                event = dict(body or {})
+                event.setdefault('id', uuid.uuid4().hex)
+                if event['id'] in calendar:
+                    return make_error(409, 'duplicate',
+                                      'The requested identifier already exists.')
+                calendar[event['id']] = self._store(calendar_id, event)
+                return 200, calendar[event['id']]
+
+            if method == 'GET' and event_id is None:
+                return 200, self._list(calendar, query)
+
+            event = calendar.get(event_id)
+            if event is None:
+                return make_error(404, 'notFound', 'Not Found')
+
+            if method == 'GET':
+                return 200, event
+            if method == 'PATCH':
+                if_match = (headers or {}).get('If-Match')
+                if if_match and if_match != event['etag']:
+                    return make_error(412, 'conditionNotMet', 'Precondition Failed')
+                event = dict(event, **(body or {}))
+                calendar[event_id] = self._store(calendar_id, event)
+                return 200, calendar[event_id]
+            if method == 'DELETE':
+                del calendar[event_id]
+                return 204, None
+
+        return make_error(405, 'methodNotAllowed', 'Method Not Allowed')
+
+    def _store(self, calendar_id, event):
+        """Returns input event with the fields Google adds to stored events."""
+
+        event['status'] = event.get('status', 'confirmed')
+        event['etag'] = '"%d"' % time.time_ns()
+        event['htmlLink'] = '%scalendar/event?eid=%s' % (self.url, event['id'])
+        event['updated'] = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+        return event
+
+    @staticmethod
+    def _list(calendar, query):
+        """Returns page of events of input calendar. Lock must be held."""
+
+        events = list(calendar.values())
+        start = int(query.get('pageToken') or 0)
+        size = int(query.get('maxResults') or 250)
+        page = {'items': events[start:start + size]}
+        if start + size < len(events):
+            page['nextPageToken'] = str(start + size)
+        else:
+            page['nextSyncToken'] = 'sync-%d' % time.time_ns()
+        return page
+
+
+def make_error(status, reason, message):
+    """Returns (status, body) of a Google API error response."""
+
+    return status, {'error': {
+        'code': status, 'message': message,
+        'errors': [{'domain': 'global', 'reason': reason, 'message': message}]}}
+
+
+class FakeCalendarHandler(BaseHTTPRequestHandler):
+    """Handles HTTP requests of a FakeCalendarServer, with keep-alive."""
+
+    protocol_version = 'HTTP/1.1'
+
+    # FakeCalendarServer handling calls; set by subclass
+    fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith('/discovery/'):
+            return self._send(200, 'application/json', self.fake.discovery_document)
+        self._handle()
+
+    def do_POST(self):
+        if urlsplit(self.path).path.startswith('/batch'):
+            return self._handle_batch()
+        self._handle()
+
+    def do_PATCH(self):
+        self._handle()
+
+    def do_DELETE(self):
+        self._handle()
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _delay(self, calls):
+        with self.fake.lock:
+            self.fake.requests += 1
+        delay = self.fake.latency + self.fake.call_latency * calls
+        if delay:
+            time.sleep(delay)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        """Handles a call sent outside of a batch request."""
+
+        body = self._read_body()
+        self._delay(1)
+        status, response = self.fake.handle_call(
+            self.command, self.path, json.loads(body.decode('utf-8')) if body else None,
+            self.headers)
+        self._send(status, 'application/json; charset=UTF-8',
+                   json.dumps(response).encode('utf-8') if response is not None else b'')
+
+    def _handle_batch(self):
+        """Handles a multipart/mixed batch request."""
+
+        content = self._read_body()
+        message = email.parser.BytesParser().parsebytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode('ascii') +
+            b'\r\n\r\n' + content)
+        parts = message.get_payload()
+        self._delay(len(parts))
+
+        boundary = 'batch_' + uuid.uuid4().hex
+        chunks = []
+        for part in parts:
+
+            # Each part holds an HTTP request: request line, headers, and body
+            request_line, request = part.get_payload().split('\n', 1)
+            method, url = request_line.split(' ')[:2]
+            request = email.parser.Parser().parsestr(request)
+            body = request.get_payload()
+            status, response = self.fake.handle_call(
+                method, url, json.loads(body) if body.strip() else None, request)
+
+            content_id = part['Content-ID']
+            chunks.append(
+                '--%s\r\nContent-Type: application/http\r\n'
+                'Content-ID: <response-%s\r\n\r\n'
+                'HTTP/1.1 %d %s\r\nContent-Type: application/json; charset=UTF-8\r\n'
+                '\r\n%s\r\n' % (boundary, content_id[1:], status,
+                                self.responses.get(status, ('',))[0],
+                                json.dumps(response) if response is not None else ''))
+        chunks.append('--%s--\r\n' % boundary)
+
+        self._send(200, 'multipart/mixed; boundary=%s' % boundary,
+                   ''.join(chunks).encode('utf-8'))
+
@@ -0,0 +1,270 @@
+"""
+Benchmarks POST /gcal/events against a local fake Google Calendar API.
+
+Usage: python -m bench.run_bench [options]; see --help. Results are written
+as json to --output, and compared with an earlier results file if --baseline
+is specified.
+"""
+
+import argparse
+import datetime
+import http.client
+import json
+import platform
+import subprocess
+import sys
+import threading
+import time
+from os.path import dirname, realpath
+import google.auth.credentials
+from bench.fake_gcal_server import FakeCalendarServer
+
+
+class BenchCredentials(google.auth.credentials.Credentials):
+    """Credentials with a fixed token that never expires, for the fake server."""
+
+    def __init__(self):
+        google.auth.credentials.Credentials.__init__(self)
+        self.token = 'bench'
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+
+    def refresh(self, request):
+        pass
+
+
+def parse_args(args=None):
+    """Returns parsed command line arguments."""
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1,50,500',
+                        help='Comma-separated numbers of events per request. '
+                             'Defaults to 1,50,500.')
+    parser.add_argument('--concurrency', default='1,4,16',
+                        help='Comma-separated numbers of concurrent clients. '
+                             'Defaults to 1,4,16.')
+    parser.add_argument('--requests', type=int, default=20,
+                        help='Number of requests per size and concurrency. '
+                             'Defaults to 20.')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='Seconds each request to the fake server takes. '
+                             'Defaults to 0.05.')
+    parser.add_argument('--call-latency', type=float, default=0.0,
+                        help='Extra seconds per call in a batch request. '
+                             'Defaults to 0.')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Probability of a call failing with 500. '
+                             'Defaults to 0.')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                        help='Probability of a call failing with 429. '
+                             'Defaults to 0.')
+    parser.add_argument('--quota', type=float, default=None,
+                        help="Calls per second allowed by CalGuru's rate "
+                             "limiter. Defaults to unlimited.")
+    parser.add_argument('--server-threads', type=int, default=16,
+                        help='Number of threads serving CalGuru. Defaults to 16.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of injected failures. Defaults to 0.')
+    parser.add_argument('--output', default='bench_results.json',
+                        help='Results file to write. Defaults to '
+                             'bench_results.json.')
+    parser.add_argument('--baseline', default=None,
+                        help='Earlier results file to compare with.')
+    parser.add_argument('--max-regression', type=float, default=0.1,
+                        help='Fraction by which events/sec may drop below '
+                             'baseline before exiting with status 1. '
+                             'Defaults to 0.1.')
+    return parser.parse_args(args)
+
+
+def start_calguru(fake, args):
+    """
+    Points GoogleCalendarApi at input fake server and starts CalGuru on a
+    local port. Returns (server adapter, port).
+    """
+
+    # Imported here so the fake server can be used without CalGuru's
+    # dependencies
+    import calguru
+    from src.api.gcal_api import GoogleCalendarApi
+    from src.api.gcal_retry import RetryPolicy
+    from src.api.gcal_service_cache import GoogleServiceCache
+    from src.utils.rate_limiter import TokenBucket
+    from src.utils.server import ThreadedWSGIRefServer
+
+    GoogleCalendarApi.service_cache = GoogleServiceCache(
+        discovery_url=fake.discovery_url,
+        credentials_factory=lambda credentials_dir, scopes: BenchCredentials())
+    GoogleCalendarApi.rate_limiter = TokenBucket(
+        rate=args.quota or 1e9, capacity=GoogleCalendarApi.BATCH_SIZE)
+
+    # Fake server doesn't send Retry-After; keep backoff in scale with latency
+    GoogleCalendarApi.retry_policy = RetryPolicy(base_delay=max(args.latency, 0.01))
+
+    server = ThreadedWSGIRefServer(host='127.0.0.1', port=0,
+                                   threads=args.server_threads)
+    server.quiet = True
+    threading.Thread(target=server.run, args=(calguru.app,), daemon=True).start()
+    while not hasattr(server, 'srv'):
+        time.sleep(0.01)
+    return server, server.srv.server_port
+
+
+def make_payload(size, offset):
+    """Returns json body of a create request with input number of events."""
+
+    start = 1525860000 + offset * 3600
+    return json.dumps({'events': [
+        {'summary': 'Bench %d' % (offset + index), 'start': start + index * 3600,
+         'end': start + (index + 1) * 3600, 'description': 'Benchmark event',
+         'attendees': ['bench@example.com']}
+        for index in range(size)]}).encode('utf-8')
+
+
+def percentile(values, fraction):
+    """Returns input percentile (e.g. 0.99) of input values, by nearest rank."""
+
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+def run_case(port, size, concurrency, requests):
+    """
+    Sends input number of create requests of size events each, from
+    concurrency client threads. Returns dict of results.
+    """
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def client():
+        while True:
+            with lock:
+                number = next(counter, None)
+            if number is None:
+                return
+            body = make_payload(size, number * size)
+            connection = http.client.HTTPConnection('127.0.0.1', port)
+            started = time.perf_counter()
+            connection.request('POST', '/gcal/events?partial=true', body,
+                               {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            content = response.read()
+            elapsed = time.perf_counter() - started
+            connection.close()
+
+            items = json.loads(content.decode('utf-8')).get('data', {}) \
+                .get('calendar_events', []) if response.status == 200 else []
+            with lock:
+                latencies.append(elapsed)
+                errors.append(size - sum(item.get('status') == 'success'
+                                         for item in items))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'events_per_request': size,
+        'concurrency': concurrency,
+        'requests': requests,
+        'failed_events': sum(errors),
+        'events_per_second': round(size * requests / elapsed, 2),
+        'latency_p50': round(percentile(latencies, 0.5), 6),
+        'latency_p99': round(percentile(latencies, 0.99), 6),
+        'latency_mean': round(sum(latencies) / len(latencies), 6)
+    }
+
+
+def get_commit():
+    """Returns git commit of working tree, or None outside of a repository."""
+
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=dirname(realpath(__file__)),
+            stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, max_regression):
+    """
+    Prints change of each case against matching case of baseline results.
+    Returns whether any case's events/sec regressed by more than
+    max_regression.
+    """
+
+    baseline_cases = {(case['events_per_request'], case['concurrency']): case
+                      for case in baseline['results']}
+    regressed = False
+    for case in results['results']:
+        base = baseline_cases.get((case['events_per_request'], case['concurrency']))
+        if not base:
+            continue
+        change = case['events_per_second'] / base['events_per_second'] - 1
+        p99_change = case['latency_p99'] / base['latency_p99'] - 1
+        flag = ''
+        if change < -max_regression:
+            regressed = True
+            flag = '  REGRESSION'
+        print('size %5d  concurrency %3d  events/s %+7.1f%%  p99 %+7.1f%%%s' % (
+            case['events_per_request'], case['concurrency'], change * 100,
+            p99_change * 100, flag))
+    return regressed
+
+
+def main(args=None):
+    args = parse_args(args)
+    sizes = [int(size) for size in args.sizes.split(',')]
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+
+    fake = FakeCalendarServer(latency=args.latency, call_latency=args.call_latency,
+                              error_rate=args.error_rate,
+                              rate_limit_rate=args.rate_limit_rate,
+                              seed=args.seed).start()
+    server, port = start_calguru(fake, args)
+
+    results = {
+        'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('output', 'baseline', 'max_regression')},
+        'results': []
+    }
+
+    try:
+        print('%6s %11s %10s %9s %9s %7s' % ('size', 'concurrency', 'events/s',
+                                            'p50 (s)', 'p99 (s)', 'failed'))
+        for size in sizes:
+            for concurrency in concurrency_levels:
+                case = run_case(port, size, concurrency, args.requests)
+                results['results'].append(case)
+                print('%6d %11d %10.1f %9.4f %9.4f %7d' % (
+                    size, concurrency, case['events_per_second'],
+                    case['latency_p50'], case['latency_p99'],
+                    case['failed_events']))
+    finally:
+        server.srv.shutdown()
+        fake.stop()
+
+    results['fake_server'] = {'requests': fake.requests, 'calls': fake.calls,
+                              'failures': fake.failures}
+    with open(args.output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    print('Results written to %s' % args.output)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            if compare(results, json.load(baseline_file), args.max_regression):
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
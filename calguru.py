@@ -1,8 +1,41 @@
 """Main app."""
 
-from bottle import Bottle, route, request
+import time
+
+# Time calguru started being imported, to report startup time
+START_TIME = time.perf_counter()
+
+import argparse
+import hashlib
+import json
+from os.path import join, dirname, realpath
+from bottle import Bottle, route, request, response
 from src.api.gcal_api import GoogleCalendarApi
-from src.utils.api_utils import APIUtils
+from src.api.gcal_notifications import NotificationPolicy, SmtpDigestSender
+from src.errors.gcal_errors import EventNotFound, MirrorNotReady
+from src.errors.request_errors import BodyTooLarge, IdempotencyKeyReused, \
+    InvalidBody, InvalidParameter
+from src.jobs.job_queue import EventJobQueue
+from src.jobs.job_store import MemoryJobStore
+from src.utils.api_utils import APIUtils, APIResult
+from src.sync.event_mirror import EventMirror
+from src.utils.lru_cache import TTLCache
+from src.utils.metrics import CalGuruMetrics
+from src.utils.quota import SqliteQuotaStore
+from src.utils.server import get_server
+
+# Queue of asynchronous event creation jobs
+job_queue = EventJobQueue(MemoryJobStore())
+
+# Responses of recent event creation requests by idempotency key, stored as
+# (request fingerprint, response data) tuples
+idempotency_cache = TTLCache(max_size=10000, ttl=24 * 60 * 60)
+
+# Location of SQLite database holding local mirror of calendar
+MIRROR_DIR = join(dirname(realpath(__file__)), 'conf/event_mirror.sqlite3')
+
+# Number of seconds between incremental syncs of local mirror
+MIRROR_SYNC_INTERVAL = 60
 
 
 def index():
@@ -11,10 +44,28 @@ def index():
     return "CalGuru"
 
 
+def get_notifications():
+    """
+    Returns notification policy of request's "notifications" query parameter,
+    or None if it isn't given. Throws InvalidParameter if it's invalid.
+    """
+
+    notifications = request.query.get('notifications') or None
+    if notifications not in (None,) + NotificationPolicy.POLICIES:
+        raise InvalidParameter("notifications must be 'all', 'none', or 'digest'.")
+    if notifications == 'digest' and \
+            GoogleCalendarApi.notification_policy.digest_sender is None:
+        raise InvalidParameter("Digests can't be sent; no digest sender is "
+                               "configured.")
+    return notifications
+
+
 @APIUtils.api_decorator
-def create_gcal_events():
+def create_gcal_events(calendar_id=None):
     """
     Called when endpoint for creating Google Calendar events is invoked.
+    Events are created in input calendar, which defaults to
+    GoogleCalendarApi.calendar_id (as for every endpoint below).
 
     Content-Type: application/json
     Input body: Json with "events" field containing Json array of events to be
@@ -25,15 +76,376 @@ def create_gcal_events():
        "attendees": List of attendee emails.
        "description": Event description.
        "location": Event location.
-    Output: Created events' ids, summaries, and links in json.
+    Query parameters:
+       "partial": If "true", every valid event is created even if others fail,
+          and each item of the output reports its own outcome.
+       "async": If "true", events are created in the background. The payload
+          is validated, and the response (status 202) contains the "job_id"
+          to poll at GET /gcal/jobs/<job_id>.
+       "conflicts": "reject" fails events overlapping events known to CalGuru
+          with status 409 (per event in partial mode); "warn" creates them but
+          lists the overlapped events' ids in their output's "conflicts".
+       "compact": If "true", events that differ only by their start time,
+          and start at a daily or weekly cadence, are created as instances of
+          a single recurring event. Their ids are the recurring event's id
+          followed by their UTC start time (e.g. "abc_20180509T100000Z"), and
+          their output also contains the recurring event's "series_id".
+       "notifications": "all" (default) sends an invitation per event,
+          throttled per attendee domain if --notification-rate is set; "none"
+          creates events silently at full throughput; "digest" creates them
+          silently, then sends each attendee one digest of their events
+          (needs --digest-smtp).
+    Headers:
+       "Idempotency-Key": Optional unique string identifying request across
+          retries. Retrying a request with the same key never creates
+          duplicate events, and recent retries get the stored response back
+          without calling Google Calendar API.
+    Output: Created events' ids, summaries, and links in json, in the same
+    order as "events". In partial mode, each item also contains its "index" in
+    "events" and its "status" ("success" or "error"); failed items contain an
+    error "code", "reason", and "message" instead of an id and link.
+    """
+
+    event_dicts = APIUtils.get_body(request)['events']
+    partial = APIUtils.get_bool_query(request, 'partial')
+    run_async = APIUtils.get_bool_query(request, 'async')
+    idempotency_key = request.get_header('Idempotency-Key')
+    conflicts = request.query.get('conflicts') or None
+    compact = APIUtils.get_bool_query(request, 'compact')
+    notifications = get_notifications()
+    if conflicts not in (None, 'reject', 'warn'):
+        raise InvalidParameter("conflicts must be 'reject' or 'warn'.")
+
+    if idempotency_key:
+
+        # Identifies request, so a reused key with another request is caught
+        fingerprint = hashlib.sha256(json.dumps(
+            [event_dicts, partial, run_async, conflicts, calendar_id, compact,
+             notifications],
+            sort_keys=True,
+            default=str).encode('utf-8')).hexdigest()
+
+        # Request was already handled; return its stored response
+        cached = idempotency_cache.get(idempotency_key)
+        if cached:
+            if cached[0] != fingerprint:
+                raise IdempotencyKeyReused(
+                    "Idempotency key was already used with a different request.")
+            result = cached[1]
+
+            # Asynchronous requests get the job's current state
+            if isinstance(result, APIResult):
+                job_id = result.data['job_id']
+                response.set_header('Location', '/gcal/jobs/' + job_id)
+                return APIResult({'job_id': job_id, 'job': job_queue.get(job_id)},
+                                 status=result.status)
+            return result
+
+    # Queue events to be created in the background
+    if run_async:
+
+        # Invalid events fail the whole request unless in partial mode
+        if not partial:
+            GoogleCalendarApi.normalize_events(event_dicts)
+
+        job = job_queue.submit(event_dicts, idempotency_key=idempotency_key,
+                               conflicts=conflicts, calendar_id=calendar_id,
+                               compact=compact, notifications=notifications)
+        response.set_header('Location', '/gcal/jobs/' + job['id'])
+        result = APIResult({'job_id': job['id'], 'job': job}, status=202)
+
+    else:
+
+        # Create events and store Google Calendar info of created events
+        gcal_events_info = GoogleCalendarApi.batch_create_events(
+            event_dicts, partial=partial, idempotency_key=idempotency_key,
+            conflicts=conflicts, calendar_id=calendar_id, compact=compact,
+            notifications=notifications)
+
+        # Created events' ids, summaries, and links
+        result = {'calendar_events': gcal_events_info}
+
+    # Only the id of a job is stored, since its state changes
+    if idempotency_key:
+        idempotency_cache.set(idempotency_key, (fingerprint, APIResult(
+            {'job_id': result.data['job_id']}, status=result.status)
+            if run_async else result))
+
+    return result
+
+
+def stream_gcal_events(calendar_id=None):
+    """
+    Called when endpoint for creating Google Calendar events from a stream is
+    invoked. Events are created while the request body is being uploaded, so
+    imports of any size use the same amount of memory.
+
+    Content-Type: application/x-ndjson
+    Input body: Newline-delimited json, one event per line, with the same keys
+    as items of "events" of POST /gcal/events.
+    Query parameters:
+       "conflicts": As in POST /gcal/events.
+       "notifications": As in POST /gcal/events. Digests are sent per group
+          of events created together.
+    Output: Outcome of each event as newline-delimited json (Content-Type:
+    application/x-ndjson), in the same order as the input lines and in the
+    same format as partial mode of POST /gcal/events. Lines are streamed back
+    as soon as their batch is done. Lines that aren't valid json fail with an
+    "InvalidBody" error, and a line longer than APIUtils.MAX_LINE_SIZE bytes
+    fails with a "BodyTooLarge" error and ends the stream.
+    """
+
+    conflicts = request.query.get('conflicts') or None
+    notifications = request.query.get('notifications') or None
+
+    def read_events():
+        """Yields event dict of each line, or the error parsing it."""
+
+        if conflicts not in (None, 'reject', 'warn'):
+            raise InvalidParameter("conflicts must be 'reject' or 'warn'.")
+        get_notifications()
+
+        try:
+            for line in APIUtils.iter_body_lines(request):
+                try:
+                    yield APIUtils.codec.loads(line)
+                except ValueError as err:
+                    yield InvalidBody("Line couldn't be parsed: %s" % err)
+        except BodyTooLarge as err:
+            yield err
+
+    return APIUtils.stream_ndjson(GoogleCalendarApi.stream_create_events(
+        read_events(), conflicts=conflicts, calendar_id=calendar_id,
+        notifications=notifications))
+
+
+def get_gcal_events(calendar_id=None):
+    """
+    Called when endpoint for reading Google Calendar events is invoked.
+
+    Query parameters:
+       "ids": Comma-separated ids of events to get. If given, the other
+          parameters except "fields" are ignored.
+       "timeMin": UTC timestamp or RFC3339 string; only events ending after
+          it are returned.
+       "timeMax": UTC timestamp or RFC3339 string; only events starting
+          before it are returned.
+       "q": Free text search terms.
+       "fields": Google partial response selector of returned event fields,
+          e.g. "id,summary,start,end".
+    Output: Events as newline-delimited json (Content-Type:
+    application/x-ndjson), streamed as pages are fetched from Google. When
+    getting by "ids", one line per id in the same order, with null for events
+    that couldn't be found.
+    Fails with status 400 if "timeMin" or "timeMax" is invalid.
+    """
+
+    fields = request.query.get('fields')
+
+    # Get events by id
+    if request.query.get('ids'):
+        ids = request.query.get('ids').split(',')
+
+        # Deferred, so errors are caught by stream_ndjson
+        def get_events():
+            for event in GoogleCalendarApi.get_events(ids, fields=fields,
+                                                      calendar_id=calendar_id):
+                yield event
+
+        return APIUtils.stream_ndjson(get_events())
+
+    # List events in time range. Times are parsed before any event is listed,
+    # so invalid ones fail the request; deferred, so they're caught by
+    # stream_ndjson
+    def list_events():
+        time_min = APIUtils.get_time_query(request, 'timeMin')
+        time_max = APIUtils.get_time_query(request, 'timeMax')
+        for event in GoogleCalendarApi.list_events(
+                time_min=time_min, time_max=time_max, q=request.query.get('q'),
+                fields=fields, calendar_id=calendar_id):
+            yield event
+
+    return APIUtils.stream_ndjson(list_events())
+
+
+@APIUtils.api_decorator
+def get_gcal_event(event_id, calendar_id=None):
+    """
+    Called when endpoint for reading a single Google Calendar event is
+    invoked. Served from the local mirror or CalGuru's event cache when
+    possible, so polling the same event doesn't use Google quota.
+
+    Headers:
+       "If-None-Match": Optional etag of the version of the event the client
+          has. If the event still has it, the response has status 304 and no
+          body.
+    Output: Event in json, as returned by Google, under "calendar_event". The
+    event's etag is returned in the ETag header. Fails with status 404 if the
+    event couldn't be found.
+    """
+
+    event = GoogleCalendarApi.get_event(event_id, calendar_id=calendar_id)
+    if event is None:
+        raise EventNotFound("Event %s couldn't be found." % event_id)
+
+    etag = event.get('etag')
+    if etag:
+        response.set_header('ETag', etag)
+        if APIUtils.etag_matches(request.get_header('If-None-Match'), etag):
+            return APIResult(status=304)
+
+    return {'calendar_event': event}
+
+
+@APIUtils.api_decorator
+def delete_gcal_events(calendar_id=None):
+    """
+    Called when endpoint for deleting Google Calendar events is invoked.
+
+    Content-Type: application/json
+    Input body: Json with "ids" field containing Json array of ids of events
+    to be deleted.
+    Output: Outcome of each id in json, in the same order as "ids". Each item
+    contains the id's "index" in "ids", the "id", and its "status" ("success"
+    or "error"); failed items also contain an error "code", "reason", and
+    "message". Events that were already deleted count as successfully deleted.
+    Fails with status 400 if "ids" isn't an array; ids that aren't non-empty
+    strings fail individually.
+    """
+
+    body = APIUtils.get_body(request)
+    return {'calendar_events': GoogleCalendarApi.delete_events(
+        body.get('ids') if isinstance(body, dict) else None,
+        calendar_id=calendar_id)}
+
+
+@APIUtils.api_decorator
+def patch_gcal_events(calendar_id=None):
+    """
+    Called when endpoint for updating Google Calendar events is invoked.
+
+    Content-Type: application/json
+    Input body: Json with "events" field containing Json array of updates.
+    Each item in array specifies an update and should follow these keys:
+       "id": Id of event to update. Required.
+       "changes": Json object of changed fields, with the keys of events in
+          the create endpoint's body. Only these fields are sent to Google;
+          optional fields changed to null are cleared. Required.
+       "etag": Optional etag of the version of the event the changes were
+          made to, sent to Google as If-Match. If the event has changed since,
+          it isn't updated and its item fails with code 412.
+    Query parameters:
+       "notify": If "false", attendees aren't notified of updates.
+    Output: Outcome of each update in json, in the same order as "events".
+    Each item contains its "index" in "events", the event's "id", and its
+    "status" ("success" or "error"). Successful items contain the event's
+    "summary", "link", and new "etag"; failed items contain an error "code",
+    "reason", and "message".
+    """
+
+    return {'calendar_events': GoogleCalendarApi.patch_events(
+        APIUtils.get_body(request)['events'],
+        send_notifications=APIUtils.get_bool_query(request, 'notify', True),
+        calendar_id=calendar_id)}
+
+
+@APIUtils.api_decorator
+def get_gcal_free_busy(calendar_id=None):
+    """
+    Called when endpoint for checking availability of time slots is invoked.
+    Answered locally from events known to CalGuru (created, fetched, listed,
+    or mirrored), without calling Google.
+
+    Content-Type: application/json
+    Input body: Json with "slots" field containing Json array of time slots,
+    each with "start" and "end" UTC timestamps.
+    Output: "slots" containing input slots in the same order, each with
+    "busy" set to whether it overlaps a known event. Fails with status 400 if
+    a slot's times aren't timestamps or its start isn't before its end.
+    """
+
+    body = APIUtils.get_body(request)
+    slots = body.get('slots') if isinstance(body, dict) else None
+    busy = GoogleCalendarApi.get_free_busy(slots, calendar_id)
+    return {'slots': [{'start': slot['start'], 'end': slot['end'],
+                       'busy': slot_busy}
+                      for slot, slot_busy in zip(slots, busy)]}
+
+
+@APIUtils.api_decorator
+def get_gcal_changes(calendar_id=None):
+    """
+    Called when endpoint for listing changes to Google Calendar events is
+    invoked. Changes are read from the local mirror of the calendar, which is
+    synced incrementally in the background.
+
+    Query parameters:
+       "since": Sequence number returned by previous call. Defaults to 0,
+          which lists every event in mirror.
+       "limit": Maximum number of changes returned. Defaults to 1000.
+    Output: "changes" containing changed events in order of change (deleted
+    events have status "cancelled"), and "next", the sequence number to pass
+    as "since" on the next call.
+    """
+
+    mirror = GoogleCalendarApi.mirror
+    if mirror is None or not mirror.is_ready(calendar_id):
+        message = "Local event mirror isn't enabled or hasn't finished syncing."
+        if mirror is not None and mirror.last_error:
+            message += ' Last sync failed with %s' % mirror.last_error
+        raise MirrorNotReady(message)
+
+    changes, seq = mirror.changes(APIUtils.get_int_query(request, 'since', 0),
+                                  APIUtils.get_int_query(request, 'limit', 1000,
+                                                         minimum=1))
+    return {'changes': changes, 'next': seq}
+
+
+@APIUtils.api_decorator
+def get_gcal_job(job_id):
+    """
+    Called when endpoint for checking an asynchronous event creation job is
+    invoked.
+
+    Output: Job's "id", "status" ("queued", "running", "succeeded", or
+    "failed"), "total" number of events, number of "completed" events, and
+    "created" and "updated" timestamps. Once the job has succeeded, "results"
+    contains the outcome of each event as in partial mode of POST
+    /gcal/events. If the job has failed, "error" contains the error message.
+    """
+
+    return {'job': job_queue.get(job_id)}
+
+
+@APIUtils.api_decorator
+def get_gcal_quota():
+    """
+    Called when endpoint for checking Google Calendar API quota usage is
+    invoked.
+
+    Output: "accounts": usage of each service account's rate limiter, with
+    its "name", sustained "rate" and burst "capacity" of calls per second,
+    currently available "tokens", seconds it's "paused_for" after Google
+    rate limited calls, and whether it's "shared" with other workers. Shared
+    rate limiters also have the number of "waiting" calls and the calls made
+    by each worker in the last minute under "workers".
+    """
+
+    return {'accounts': GoogleCalendarApi.get_quota_usage()}
+
+
+def get_metrics():
     """
+    Called when endpoint for monitoring CalGuru is invoked.
 
-    # Create events and store Google Calendar info of created events
-    gcal_events_info = GoogleCalendarApi.batch_create_events(
-        APIUtils.get_body(request)['events'])
+    Output: Counters and latency histograms of request body parsing, event
+    validation, Resource object builds, and Google Calendar API requests, and
+    counts of created events, retried calls, and Google errors by reason, in
+    Prometheus text format.
+    """
 
-    # Return created events' ids, summaries, and links
-    return {'calendar_events': gcal_events_info}
+    response.content_type = CalGuruMetrics.registry.CONTENT_TYPE
+    return CalGuruMetrics.registry.render()
 
 
 # Initialize main app
@@ -42,13 +454,141 @@ app = Bottle()
 # Route homepage
 app.get("/", callback=index)
 
-# Route for creating Google Calendar events
-app.post("/gcal/events", callback=create_gcal_events)
+# Routes of each calendar's endpoints, relative to /gcal for the default
+# calendar and to /gcal/calendars/<calendar_id> for any other calendar.
+# Colon of :stream is escaped so Bottle doesn't read it as a wildcard.
+for prefix in ("/gcal", "/gcal/calendars/<calendar_id>"):
 
+    # Route for creating Google Calendar events
+    app.post(prefix + "/events", callback=create_gcal_events)
 
-if __name__ == '__main__':
+    # Route for creating Google Calendar events from a newline-delimited json
+    # stream
+    app.post(prefix + "/events\\:stream", callback=stream_gcal_events)
+
+    # Route for reading Google Calendar events
+    app.get(prefix + "/events", callback=get_gcal_events)
+
+    # Route for reading a single Google Calendar event
+    app.get(prefix + "/events/<event_id>", callback=get_gcal_event)
+
+    # Route for deleting Google Calendar events
+    app.delete(prefix + "/events", callback=delete_gcal_events)
+
+    # Route for updating Google Calendar events
+    app.patch(prefix + "/events", callback=patch_gcal_events)
+
+    # Route for checking availability of time slots
+    app.post(prefix + "/freebusy", callback=get_gcal_free_busy)
+
+    # Route for listing changes to Google Calendar events
+    app.get(prefix + "/changes", callback=get_gcal_changes)
+
+# Route for checking asynchronous event creation jobs
+app.get("/gcal/jobs/<job_id>", callback=get_gcal_job)
+
+# Route for checking usage of Google Calendar API quota
+app.get("/gcal/quota", callback=get_gcal_quota)
+
+# Route for monitoring metrics
+app.get("/metrics", callback=get_metrics)
+
+
+def parse_args(args=None):
+    """Returns parsed command line arguments of calguru.py."""
+
+    parser = argparse.ArgumentParser(description='Runs CalGuru.')
 
-    # Run the application from http://192.168.50.1:8080.
     # Should match scheduling tool's
     # src/utils/calendar_utils.CalendarUtils.CALGURU_BASE_URL.
-    app.run(host='192.168.50.1', port=8080)
+    parser.add_argument('--host', default='192.168.50.1',
+                        help='Address to listen on. Defaults to 192.168.50.1.')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='Port to listen on. Defaults to 8080.')
+    parser.add_argument('--server', default='auto',
+                        choices=('auto', 'waitress', 'threaded', 'dev'),
+                        help="Server to run: 'waitress' (thread pool, "
+                             "keep-alive), 'threaded' (thread pool, standard "
+                             "library only), 'dev' (Bottle's single-threaded "
+                             "server), or 'auto' (waitress if installed, "
+                             "otherwise threaded). Defaults to auto.")
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Number of threads handling requests. '
+                             'Defaults to 8.')
+    parser.add_argument('--shutdown-timeout', type=float, default=None,
+                        help='Seconds waitress waits for in-flight requests '
+                             'on shutdown. Defaults to waiting until they are '
+                             'done.')
+    parser.add_argument('--max-body-size', type=int, default=None,
+                        help="Largest request body waitress accepts, in "
+                             "bytes. Defaults to waitress' 1 GB.")
+    parser.add_argument('--service-account', dest='service_accounts',
+                        action='append', default=[], metavar='PATH',
+                        help='Credentials file of an additional service '
+                             'account to spread calls across. Can be '
+                             'repeated.')
+    parser.add_argument('--notification-rate', type=float, default=None,
+                        help='Maximum number of event inserts sending '
+                             'invitations per second per attendee domain. '
+                             'Defaults to unlimited.')
+    parser.add_argument('--digest-smtp', default=None, metavar='HOST[:PORT]',
+                        help='SMTP server sending digests of created events '
+                             'to attendees, for notifications=digest.')
+    parser.add_argument('--digest-from', default='calguru@localhost',
+                        help='From address of digests. Defaults to '
+                             'calguru@localhost.')
+    parser.add_argument('--quota-db', default=None, metavar='PATH',
+                        help='SQLite database through which workers on this '
+                             'host share the Google Calendar API quota of '
+                             'each service account. Created if missing.')
+    parser.add_argument('--preload', action='store_true',
+                        help='Load credentials, Google Calendar API clients, '
+                             'and connections of every service account '
+                             'before serving, instead of on first use.')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Runs app until interrupted, then shuts it down gracefully."""
+
+    args = parse_args(args)
+    GoogleCalendarApi.service_account_dirs = args.service_accounts
+    GoogleCalendarApi.notification_policy.domain_rate = args.notification_rate
+    if args.digest_smtp:
+        host, _, port = args.digest_smtp.partition(':')
+        GoogleCalendarApi.notification_policy.digest_sender = SmtpDigestSender(
+            host, int(port or 25), sender=args.digest_from)
+    if args.quota_db:
+        GoogleCalendarApi.use_quota_store(SqliteQuotaStore(args.quota_db))
+
+    # Serve reads from a local mirror of the calendar, kept in sync with Google
+    GoogleCalendarApi.mirror = EventMirror(path=MIRROR_DIR)
+    GoogleCalendarApi.mirror.start(MIRROR_SYNC_INTERVAL)
+
+    try:
+        if args.preload:
+            GoogleCalendarApi.preload()
+        print('CalGuru started in %.3f seconds.' % (
+            time.perf_counter() - START_TIME))
+
+        if args.server == 'dev':
+            app.run(host=args.host, port=args.port)
+        else:
+
+            # Returns once in-flight requests are done after SIGTERM or SIGINT
+            options = {'threads': args.threads}
+            if args.shutdown_timeout is not None:
+                options['shutdown_timeout'] = args.shutdown_timeout
+            if args.max_body_size is not None:
+                options['max_request_body_size'] = args.max_body_size
+            app.run(server=get_server(args.server, args.host, args.port,
+                                      **options))
+    finally:
+
+        # Finish queued event creation jobs before exiting
+        job_queue.join()
+        GoogleCalendarApi.mirror.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Compaction of regularly repeating events into recurring event series."""
+
+import time
+from functools import reduce
+from math import gcd
+
+
+class EventSeries(object):
+    """
+    Events created as the instances of a single recurring event.
+
+    :ivar indexes: Input positions of the series' events, in order of start.
+    :ivar starts: UTC timestamps of the series' events' starts, in the same
+       order as indexes.
+    :ivar record: EventRecord of the recurring event: the first event, with
+       RRULE and EXDATE recurrence rules.
+    """
+
+    def __init__(self, indexes, starts, record):
+        self.indexes = indexes
+        self.starts = starts
+        self.record = record
+
+    def get_instance_ids(self, series_id):
+        """
+        Returns ids of the series' instances, in the same order as indexes,
+        given input id of the recurring event. Google ids instances of
+        recurring events by appending their original UTC start time.
+        """
+
+        return [EventCompactor.make_instance_id(series_id, start)
+                for start in self.starts]
+
+
+class EventCompactor(object):
+    """
+    Finds events that differ only by their start time and start at a regular
+    daily or weekly cadence, so each group is created with a single insert of
+    a recurring event instead of one insert per event.
+
+    Slots of a cadence that no event was submitted for are excluded from the
+    series with EXDATEs.
+    """
+
+    # Recurrence frequencies tried, longest first, with their period in seconds
+    FREQUENCIES = (('WEEKLY', 7 * 24 * 60 * 60), ('DAILY', 24 * 60 * 60))
+
+    # Minimum number of events compacted into a series
+    MIN_SERIES_EVENTS = 3
+
+    # Maximum number of excluded slots per event of a series; sparser groups
+    # are created as separate events
+    MAX_EXDATES_PER_EVENT = 1
+
+    @classmethod
+    def compact(cls, records, indexes):
+        """
+        Groups events at input positions into recurring event series.
+
+        :param records: List of EventRecords of input events, as returned by
+           EventNormalizer.normalize.
+        :param indexes: Positions of valid events that may be compacted.
+        :return: (series, remaining) tuple. series is a list of EventSeries,
+           and remaining is a list of positions in indexes that weren't
+           compacted, in input order.
+        """
+
+        # Events by everything except their start time
+        groups = {}
+        for index in indexes:
+            groups.setdefault(cls._get_group_key(records[index]), []).append(index)
+
+        series = []
+        compacted = set()
+        for group in groups.values():
+            if len(group) < cls.MIN_SERIES_EVENTS:
+                continue
+
+            group.sort(key=lambda index: records[index].start)
+            starts = [records[index].start for index in group]
+            found = cls._find_series(group, starts, records[group[0]])
+            if found:
+                series.append(found)
+                compacted.update(group)
+
+        return series, [index for index in indexes if index not in compacted]
+
+    @staticmethod
+    def _get_group_key(record):
+        """Returns hashable key of every field of event except its start."""
+
+        return (record.summary, record.end - record.start, record.description,
+                record.location, tuple(str(email) for email in record.attendees))
+
+    @classmethod
+    def _find_series(cls, indexes, starts, first_record):
+        """
+        Returns EventSeries of events at input positions with input sorted
+        start times, or None if they don't start at a supported cadence.
+        """
+
+        # Fractional or repeated starts can't be instances of one series
+        if any(start != int(start) for start in starts) or \
+                len(set(starts)) != len(starts):
+            return None
+
+        first = int(starts[0])
+        period = reduce(gcd, (int(start) - first for start in starts[1:]))
+
+        for frequency, frequency_seconds in cls.FREQUENCIES:
+            if period % frequency_seconds == 0:
+                break
+        else:
+            return None
+
+        count = (int(starts[-1]) - first) // period + 1
+        if count - len(starts) > cls.MAX_EXDATES_PER_EVENT * len(starts):
+            return None
+
+        # Slots of cadence without a submitted event
+        submitted = set(int(start) for start in starts)
+        excluded = [first + slot * period for slot in range(count)
+                    if first + slot * period not in submitted]
+
+        recurrence = ['RRULE:FREQ=%s;INTERVAL=%d;COUNT=%d' % (
+            frequency, period // frequency_seconds, count)]
+        if excluded:
+            recurrence.append('EXDATE:' + ','.join(
+                cls.format_utc(start) for start in excluded))
+
+        return EventSeries(tuple(indexes), list(starts),
+                           first_record.copy(recurrence=recurrence))
+
+    @staticmethod
+    def format_utc(timestamp):
+        """Returns input UTC timestamp in iCalendar UTC form, e.g. 20180509T100000Z."""
+
+        return time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(timestamp))
+
+    @classmethod
+    def make_instance_id(cls, series_id, start):
+        """
+        Returns id of instance of recurring event with input id, originally
+        starting at input UTC timestamp.
+        """
+
+        return '%s_%s' % (series_id, cls.format_utc(start))
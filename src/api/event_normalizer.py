@@ -0,0 +1,319 @@
+"""Bulk validation and conversion of events to Google Calendar API format."""
+
+import datetime
+import sys
+import time
+import src.errors.gcal_errors as gcal_errors
+
+# NumPy speeds up time checks and formatting of large payloads, but isn't
+# required; without it the same checks run in pure Python. It's imported by
+# get_numpy() the first time a large payload is normalized, since importing
+# it takes longer than starting the rest of CalGuru.
+numpy = None
+_numpy_loaded = False
+
+
+def get_numpy():
+    """Returns numpy module, importing it on first call, or None if missing."""
+
+    global numpy, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            import numpy as numpy_module
+            numpy = numpy_module
+        except ImportError:
+            numpy = None
+        _numpy_loaded = True
+    return numpy
+
+
+class EventRecord(object):
+    """
+    Validated event to be created, holding only what its Google Calendar API
+    resource is built from: whole-second timestamps as ints and attendee
+    emails as a tuple of interned strings, in slots. The resource itself is
+    only built by to_gcal_event() when the event's batch request is sent, so
+    large payloads don't hold a resource dict, two time dicts, and a dict per
+    attendee for every event at once.
+    """
+
+    __slots__ = ('summary', 'start', 'end', 'description', 'location',
+                 'attendees', 'id', 'recurrence')
+
+    def __init__(self, summary, start, end, description=None, location=None,
+                 attendees=(), id=None, recurrence=None):
+        self.summary = summary or None
+        self.start = int(start) if start == int(start) else start
+        self.end = int(end) if end == int(end) else end
+        self.description = description or None
+        self.location = location or None
+
+        # Emails repeat across the events of a payload; interning stores
+        # each distinct email once
+        self.attendees = tuple(sys.intern(email) for email in attendees or ())
+
+        # Optional event id and recurrence rules
+        self.id = id
+        self.recurrence = recurrence
+
+    def copy(self, **changes):
+        """Returns copy of record with input attributes changed."""
+
+        attributes = {name: getattr(self, name) for name in self.__slots__}
+        attributes.update(changes)
+        return EventRecord(**attributes)
+
+    def to_gcal_event(self):
+        """Returns Google Calendar API resource of event."""
+
+        gcal_event = {}
+        if self.id:
+            gcal_event['id'] = self.id
+        if self.summary:
+            gcal_event['summary'] = self.summary
+        gcal_event['start'] = {'dateTime': EventNormalizer.format_timestamp(self.start),
+                               'timeZone': 'UTC'}
+        gcal_event['end'] = {'dateTime': EventNormalizer.format_timestamp(self.end),
+                             'timeZone': 'UTC'}
+        if self.description:
+            gcal_event['description'] = self.description
+        if self.location:
+            gcal_event['location'] = self.location
+        if self.attendees:
+            gcal_event['attendees'] = [{'email': email} for email in self.attendees]
+        if self.recurrence:
+            gcal_event['recurrence'] = list(self.recurrence)
+        return gcal_event
+
+
+class EventNormalizer(object):
+    """
+    Validates and converts whole arrays of input event dicts at once, instead
+    of one event at a time, and reports every invalid event rather than
+    stopping at the first one.
+    """
+
+    # Fields that need to be specified for each event
+    MANDATORY_FIELDS = ('summary', 'start', 'end')
+
+    # Other fields supported for each event
+    OPTIONAL_FIELDS = ('description', 'location', 'attendees')
+
+    # Bounds of timestamps (years 1 to 9999); RFC3339 years have four digits
+    MIN_TIMESTAMP = -62135596800
+    MAX_TIMESTAMP = 253402300800
+
+    # Minimum number of events for which NumPy is used
+    NUMPY_MIN_EVENTS = 64
+
+    @classmethod
+    def normalize(cls, event_dicts):
+        """
+        Validates input event dicts and converts valid ones to EventRecords,
+        from which their Google Calendar API event resources are built. Event
+        dict keys are described in GoogleCalendarApi.batch_create_events.
+
+        :param event_dicts: List of event dicts.
+        :return: (records, errors) tuple. records is a list in the same order
+           as event_dicts, holding each valid event's EventRecord and None for
+           invalid events. errors maps the index of each invalid event to its
+           gcal_errors.MissingEventFields, gcal_errors.InvalidEventTime, or
+           gcal_errors.InvalidEventAttendees.
+        """
+
+        count = len(event_dicts)
+        errors = {}
+
+        # Start and end timestamps of each event; 0 for invalid events
+        starts = [0] * count
+        ends = [0] * count
+
+        # Check mandatory fields are specified, times are timestamps, and
+        # attendees are emails
+        for index, event_dict in enumerate(event_dicts):
+            if not isinstance(event_dict, dict) or 'summary' not in event_dict \
+                    or 'start' not in event_dict or 'end' not in event_dict:
+                errors[index] = gcal_errors.MissingEventFields(
+                    "Mandatory fields (summary, start time, and end time) "
+                    "weren't all specified for event.")
+                continue
+
+            start = event_dict['start']
+            end = event_dict['end']
+            if not isinstance(start, (int, float)) or isinstance(start, bool) or \
+                    not isinstance(end, (int, float)) or isinstance(end, bool):
+                errors[index] = gcal_errors.InvalidEventTime(
+                    "Event start and end times must be UTC timestamps.")
+                continue
+
+            if event_dict.get('attendees') is not None and \
+                    not cls._is_email_list(event_dict['attendees']):
+                errors[index] = gcal_errors.InvalidEventAttendees(
+                    "Event attendees must be a list of emails.")
+                continue
+
+            starts[index] = start
+            ends[index] = end
+
+        # Check start is before end, and both are representable
+        for index in cls._find_invalid_times(starts, ends):
+            if index not in errors:
+                errors[index] = gcal_errors.InvalidEventTime(
+                    "Google Calendar event creation with start time after or "
+                    "equal to end time was attempted.")
+
+        records = [None] * count
+        for index, event_dict in enumerate(event_dicts):
+            if index not in errors:
+                records[index] = EventRecord(
+                    event_dict['summary'], starts[index], ends[index],
+                    event_dict.get('description'), event_dict.get('location'),
+                    event_dict.get('attendees'))
+
+        return records, errors
+
+    @classmethod
+    def normalize_changes(cls, change_dicts):
+        """
+        Validates input dicts of changes to events and converts valid ones to
+        partial Google Calendar API event resources, holding only the changed
+        fields. Keys are those of event dicts; optional fields changed to
+        None (or an empty value) are cleared.
+
+        :param change_dicts: List of dicts of changes.
+        :return: (gcal_changes, errors) tuple, like that of normalize but with
+           partial resources instead of records. Errors
+           are gcal_errors.InvalidEventChanges or gcal_errors.InvalidEventTime.
+        """
+
+        count = len(change_dicts)
+        errors = {}
+        supported = cls.MANDATORY_FIELDS + cls.OPTIONAL_FIELDS
+
+        # Start and end timestamps of each change; unchanged times are the
+        # bounds, so a single changed time is only checked against its range
+        starts = [cls.MIN_TIMESTAMP] * count
+        ends = [cls.MAX_TIMESTAMP - 1] * count
+
+        for index, change_dict in enumerate(change_dicts):
+            if not isinstance(change_dict, dict) or not change_dict:
+                errors[index] = gcal_errors.InvalidEventChanges(
+                    "No changes were specified for event.")
+                continue
+
+            unsupported = sorted(str(key) for key in change_dict
+                                 if key not in supported)
+            if unsupported:
+                errors[index] = gcal_errors.InvalidEventChanges(
+                    "Unsupported event fields were changed: %s."
+                    % ', '.join(unsupported))
+                continue
+
+            times = [change_dict[key] for key in ('start', 'end') if key in change_dict]
+            if any(not isinstance(value, (int, float)) or isinstance(value, bool)
+                   for value in times):
+                errors[index] = gcal_errors.InvalidEventTime(
+                    "Event start and end times must be UTC timestamps.")
+                continue
+
+            if change_dict.get('attendees') is not None and \
+                    not cls._is_email_list(change_dict['attendees']):
+                errors[index] = gcal_errors.InvalidEventChanges(
+                    "Event attendees must be a list of emails.")
+                continue
+
+            starts[index] = change_dict.get('start', starts[index])
+            ends[index] = change_dict.get('end', ends[index])
+
+        for index in cls._find_invalid_times(starts, ends):
+            if index not in errors:
+                errors[index] = gcal_errors.InvalidEventTime(
+                    "Google Calendar event update with start time after or "
+                    "equal to end time was attempted.")
+
+        start_times = cls.format_rfc3339(starts)
+        end_times = cls.format_rfc3339(ends)
+
+        gcal_changes = [None] * count
+        for index, change_dict in enumerate(change_dicts):
+            if index in errors:
+                continue
+
+            gcal_change = {}
+            for key, value in change_dict.items():
+                if key == 'start':
+                    value = {'dateTime': start_times[index], 'timeZone': 'UTC'}
+                elif key == 'end':
+                    value = {'dateTime': end_times[index], 'timeZone': 'UTC'}
+                elif key == 'attendees':
+                    value = [{'email': email} for email in value or []]
+                elif not value:
+                    value = None
+                gcal_change[key] = value
+
+            gcal_changes[index] = gcal_change
+
+        return gcal_changes, errors
+
+    @staticmethod
+    def _is_email_list(value):
+        """Returns whether input value is a list of attendee email strings."""
+
+        return isinstance(value, (list, tuple)) and \
+            all(isinstance(email, str) for email in value)
+
+    @classmethod
+    def _find_invalid_times(cls, starts, ends):
+        """
+        Returns indexes of events whose start isn't before their end, or whose
+        times are out of range.
+        """
+
+        numpy = get_numpy() if len(starts) >= cls.NUMPY_MIN_EVENTS else None
+        if numpy is not None:
+            start_array = numpy.asarray(starts, dtype=numpy.float64)
+            end_array = numpy.asarray(ends, dtype=numpy.float64)
+            valid = (start_array >= cls.MIN_TIMESTAMP) & (start_array < end_array) & \
+                (end_array < cls.MAX_TIMESTAMP)
+            return numpy.flatnonzero(~valid).tolist()
+
+        # Written so NaN times are invalid too
+        return [index for index, (start, end) in enumerate(zip(starts, ends))
+                if not cls.MIN_TIMESTAMP <= start < end < cls.MAX_TIMESTAMP]
+
+    @classmethod
+    def format_rfc3339(cls, timestamps):
+        """
+        Returns list of input UTC timestamps formatted as RFC3339 strings,
+        e.g. '2018-05-09T10:00:00+00:00'. Fractional seconds are kept as
+        microseconds. Out of range timestamps are formatted as None.
+        """
+
+        numpy = get_numpy() if len(timestamps) >= cls.NUMPY_MIN_EVENTS else None
+        if numpy is not None:
+            array = numpy.asarray(timestamps, dtype=numpy.float64)
+            whole = (array == numpy.floor(array)) & (array >= cls.MIN_TIMESTAMP) & \
+                (array < cls.MAX_TIMESTAMP)
+
+            # Whole seconds are formatted by NumPy in one pass
+            formatted = numpy.where(whole, array, 0).astype(numpy.int64) \
+                .astype('datetime64[s]').astype(str).tolist()
+            return [formatted[index] + '+00:00' if is_whole
+                    else cls.format_timestamp(timestamps[index])
+                    for index, is_whole in enumerate(whole.tolist())]
+
+        return [cls.format_timestamp(timestamp) for timestamp in timestamps]
+
+    @classmethod
+    def format_timestamp(cls, timestamp):
+        """Returns single UTC timestamp formatted as RFC3339 string."""
+
+        if not cls.MIN_TIMESTAMP <= timestamp < cls.MAX_TIMESTAMP:
+            return None
+        if timestamp == int(timestamp):
+
+            # strftime's %Y isn't zero-padded before year 1000 on Linux
+            return '%04d-%02d-%02dT%02d:%02d:%02d+00:00' % \
+                time.gmtime(int(timestamp))[:6]
+        return datetime.datetime.fromtimestamp(
+            timestamp, datetime.timezone.utc).isoformat()
@@ -1,10 +1,25 @@
 """Methods for interacting with Google Calendar API."""
 
-import arrow
-from googleapiclient import discovery
+import base64
+import hashlib
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.errors import HttpError
-from google.oauth2 import service_account
 from os.path import join, dirname, realpath
+from src.api.event_compactor import EventCompactor
+from src.api.event_normalizer import EventNormalizer
+from src.api.gcal_notifications import NotificationPolicy
+from src.api.gcal_retry import RetryPolicy
+from src.api.gcal_service_cache import GoogleServiceCache
+from src.errors.calguru_error import CalGuruError
+from src.utils.interval_index import IntervalIndex
+from src.utils.lru_cache import TTLCache
+from src.utils.metrics import CalGuruMetrics
+from src.utils.quota import SharedTokenBucket
+from src.utils.rate_limiter import TokenBucket
 import src.errors.gcal_errors as gcal_errors
 
 
@@ -24,26 +39,446 @@ class GoogleCalendarApi(object):
     service_account_dir = join(dirname(realpath(__file__)),
                                '../../conf/gcal_service_account.json')
 
+    # Process-wide cache of credentials, Resource objects, and kept-alive
+    # HTTP connections, shared by every GoogleCalendarApi call. At most
+    # pool_size calls are in flight at once; others wait for a connection.
+    service_cache = GoogleServiceCache(pool_size=16, timeout=60)
+
+    # Maximum number of calls put in a single batch request. Google Calendar
+    # API rejects batches of more than 1000 calls and recommends at most 50.
+    BATCH_SIZE = 50
+
+    # Maximum number of batch requests sent to Google Calendar API at once
+    MAX_CONCURRENT_BATCHES = 4
+
+    # Optional src.sync.event_mirror.EventMirror of calendar. Once synced,
+    # reads are served from it instead of Google, and writes update it.
+    mirror = None
+
+    # Indexes of known events' time intervals by calendar id, used for local
+    # conflict and free/busy checks. Filled from created, fetched, listed, and
+    # mirrored events.
+    interval_indexes = {}
+    _interval_indexes_lock = threading.Lock()
+
+    # Translates standard base32 alphabet to lowercase base32hex alphabet
+    _BASE32HEX_TABLE = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ234567',
+                                     '0123456789abcdefghijklmnopqrstuv')
+
+    # Decides which failed calls are retried and how long to wait beforehand
+    retry_policy = RetryPolicy()
+
+    # Limits rate of calls sent to Google Calendar API. Every call in a batch
+    # request counts against Google's default quota of 600 calls per minute
+    # per user, so calls are smoothed to 10 per second with bursts of up to
+    # one full batch.
+    rate_limiter = TokenBucket(rate=10, capacity=BATCH_SIZE)
+
+    # Optional src.utils.quota.QuotaStore shared with other CalGuru workers;
+    # set with use_quota_store. Once set, each service account's rate limiter
+    # draws from a bucket shared by every worker using the account, so their
+    # combined calls stay under its quota.
+    quota_store = None
+
+    # Events read by get_event by (calendar id, event id), stored as
+    # (monotonic time fetched or revalidated, event). Entries are served
+    # without calling Google for EVENT_CACHE_FRESH_SECONDS, then revalidated
+    # with their etag until they're evicted. Writes through GoogleCalendarApi
+    # drop or replace the entries of the events they change.
+    EVENT_CACHE_FRESH_SECONDS = 30
+    event_cache = TTLCache(max_size=10000, ttl=60 * 60)
+
+    # Throttles invitations per attendee domain and sends digests of created
+    # events; see batch_create_events' notifications
+    notification_policy = NotificationPolicy()
+
+    # Credentials files of additional service accounts. Batch requests are
+    # spread round robin across these and service_account_dir, each account
+    # with its own rate limiter, so write throughput grows with the number of
+    # accounts. Every account needs access to the calendars it's used for.
+    service_account_dirs = []
+
+    # Rate limiters of additional service accounts by credentials file
+    rate_limiters = {}
+    _rate_limiters_lock = threading.Lock()
+    _service_account_counter = itertools.count()
+
     @staticmethod
-    def get_service():
+    def get_service(service_account_dir=None):
         """
         Returns Resource object for interacting with Google Calendar
         API or throws error if valid Google credentials are not found.
 
-        Looks for credentials in file specified by CREDENTIALS_DIR.
+        Looks for credentials in input file, which defaults to
+        service_account_dir. Credentials and Resource objects are cached in
+        service_cache, so only the first call per credentials file builds a
+        new one.
+        """
+
+        return GoogleCalendarApi.service_cache.get_service(
+            service_account_dir or GoogleCalendarApi.service_account_dir,
+            GoogleCalendarApi.SCOPES)
+
+    @staticmethod
+    def get_http_pool(service_account_dir=None):
+        """
+        Returns pool of HTTP connections authorized with credentials in input
+        file (defaults to service_account_dir), that Google Calendar API calls
+        are executed with, e.g.:
+
+            with GoogleCalendarApi.get_http_pool().connection() as http:
+                request.execute(http=http)
+
+        Resource objects are shared by every thread, but their own httplib2
+        connection isn't thread-safe, so calls must never be executed without
+        a pooled connection. Pooled connections are kept alive between calls.
+        """
+
+        return GoogleCalendarApi.service_cache.get_http_pool(
+            service_account_dir or GoogleCalendarApi.service_account_dir,
+            GoogleCalendarApi.SCOPES)
+
+    @classmethod
+    def preload(cls):
+        """
+        Loads credentials, Resource object, and an HTTP connection of every
+        service account, and imports modules that are otherwise imported on
+        first use, so the first requests served don't wait for them.
+        """
+
+        import arrow
+        from src.api.event_normalizer import get_numpy
+        get_numpy()
+
+        for service_account_dir in cls.get_service_accounts():
+            cls.get_service(service_account_dir)
+            http_pool = cls.get_http_pool(service_account_dir)
+            http_pool.release(http_pool.acquire())
+
+    @classmethod
+    def get_service_accounts(cls):
+        """
+        Returns list of credentials files of every service account calls are
+        spread across: service_account_dir followed by service_account_dirs.
+        """
+
+        return [cls.service_account_dir] + [
+            account for account in cls.service_account_dirs
+            if account != cls.service_account_dir]
+
+    @classmethod
+    def next_service_account(cls):
+        """Returns credentials file of next service account, round robin."""
+
+        accounts = cls.get_service_accounts()
+        return accounts[next(cls._service_account_counter) % len(accounts)]
+
+    @classmethod
+    def get_rate_limiter(cls, service_account_dir=None):
+        """
+        Returns rate limiter of input service account (defaults to
+        service_account_dir). Each service account has its own quota, so
+        each gets its own rate limiter; the default account's is rate_limiter.
+        """
+
+        if not service_account_dir or service_account_dir == cls.service_account_dir:
+            return cls.rate_limiter
+
+        with cls._rate_limiters_lock:
+            rate_limiter = cls.rate_limiters.get(service_account_dir)
+            if rate_limiter is None:
+                rate_limiter = cls.rate_limiters[service_account_dir] = \
+                    cls.make_rate_limiter(service_account_dir,
+                                          rate=cls.rate_limiter.rate,
+                                          capacity=cls.rate_limiter.capacity)
+            return rate_limiter
+
+    @classmethod
+    def make_rate_limiter(cls, service_account_dir, rate, capacity):
+        """
+        Returns new rate limiter of input service account: a bucket shared
+        through quota_store if set, otherwise a TokenBucket of this process.
+        """
+
+        if cls.quota_store is None:
+            return TokenBucket(rate=rate, capacity=capacity)
+        return SharedTokenBucket(cls.get_quota_name(service_account_dir),
+                                 rate=rate, capacity=capacity, store=cls.quota_store)
+
+    @staticmethod
+    def get_quota_name(service_account_dir):
+        """
+        Returns name of shared quota bucket of input service account: its
+        email, so workers with the credentials file at different paths share
+        a bucket, or else the file's path.
+        """
+
+        try:
+            with open(service_account_dir) as credentials_file:
+                return json.load(credentials_file)['client_email']
+        except (OSError, ValueError, KeyError, TypeError):
+            return realpath(service_account_dir)
+
+    @classmethod
+    def use_quota_store(cls, quota_store):
+        """
+        Shares rate limits of every service account with the other workers
+        using input src.utils.quota.QuotaStore, keeping the current rate and
+        capacity of rate_limiter.
+        """
+
+        with cls._rate_limiters_lock:
+            cls.quota_store = quota_store
+            cls.rate_limiter = cls.make_rate_limiter(
+                cls.service_account_dir, rate=cls.rate_limiter.rate,
+                capacity=cls.rate_limiter.capacity)
+            cls.rate_limiters = {}
+
+    @classmethod
+    def get_quota_usage(cls):
+        """
+        Returns list of usage dicts of each service account's rate limiter,
+        as returned by its usage method, with the account's quota 'name'.
+        """
+
+        return [dict(cls.get_rate_limiter(account).usage(),
+                     name=cls.get_quota_name(account))
+                for account in cls.get_service_accounts()]
+
+    @classmethod
+    def _execute_batched(cls, request_builders, batch_size=None,
+                         max_concurrency=None, on_progress=None):
+        """
+        Executes Google Calendar API calls in batch requests of at most
+        batch_size calls each, with at most max_concurrency batch requests in
+        flight at once.
+
+        Each batch request is sent with the next service account, round robin,
+        no faster than that account's rate limiter allows. Calls that fail
+        with rate limit, server, or transport (e.g. timeout) errors are
+        retried in a new batch request after waiting as specified by
+        retry_policy; other calls in the batch aren't resent. A batch request
+        that fails as a whole fails every call in it, without affecting
+        other chunks.
+
+        :param request_builders: List of functions, where each function takes
+           a Resource object and returns the HttpRequest of a single call.
+        :param batch_size: Maximum number of calls per batch request. Defaults
+           to BATCH_SIZE.
+        :param max_concurrency: Maximum number of batch requests executed
+           concurrently. Defaults to MAX_CONCURRENT_BATCHES.
+        :param on_progress: Optional function called with the range of
+           positions of calls in a chunk once that chunk is done. May be
+           called from worker threads.
+        :return: List of (response, exception) tuples in the same order as
+           request_builders. Exactly one of each tuple's items is None. Calls
+           that still fail after all retries hold their last error.
+        """
+
+        batch_size = batch_size or cls.BATCH_SIZE
+        max_concurrency = max_concurrency or cls.MAX_CONCURRENT_BATCHES
+
+        # Results indexed by input position, filled in by batch callbacks
+        results = [None] * len(request_builders)
+
+        def execute_chunk(chunk_start):
+            """
+            Executes calls in chunk beginning at input index chunk_start,
+            retrying only those calls that failed with retryable errors.
+            """
+
+            # Chunk is sent and retried with a single service account
+            service_account_dir = cls.next_service_account()
+            service = cls.get_service(service_account_dir)
+            http_pool = cls.get_http_pool(service_account_dir)
+            rate_limiter = cls.get_rate_limiter(service_account_dir)
+
+            # Called once per call in batch; request ids are input indexes
+            def request_done(request_id, response, exception):
+                results[int(request_id)] = (response, exception)
+
+            # Indexes of calls still to be executed
+            chunk_end = min(chunk_start + batch_size, len(request_builders))
+            pending = list(range(chunk_start, chunk_end))
+            attempt = 0
+
+            while True:
+                batch = service.new_batch_http_request(callback=request_done)
+                for index in pending:
+                    batch.add(request_builders[index](service), request_id=str(index))
+
+                # Wait until quota allows every call in batch
+                rate_limiter.acquire(len(pending))
+
+                try:
+                    with http_pool.connection() as http, \
+                            CalGuruMetrics.google_request_seconds.time(kind='batch'):
+                        batch.execute(http=http)
+
+                # Whole batch request failed, e.g. timed out; every call in it
+                # failed. Errors are recorded rather than raised, so other
+                # chunks' outcomes are still reported.
+                except Exception as err:
+                    CalGuruMetrics.google_errors.inc(
+                        len(pending), reason=cls.retry_policy.get_reason(err) or 'unknown')
+                    for index in pending:
+                        results[index] = (None, err)
+                else:
+                    for index in pending:
+                        if results[index][1] is not None:
+                            CalGuruMetrics.google_errors.inc(
+                                reason=cls.retry_policy.get_reason(
+                                    results[index][1]) or 'unknown')
+
+                # Calls that failed with retryable errors
+                pending = [index for index in pending
+                           if results[index][1] is not None and
+                           cls.retry_policy.is_retryable(results[index][1])]
+                if not pending or attempt >= cls.retry_policy.max_retries:
+                    if on_progress:
+                        on_progress(range(chunk_start, chunk_end))
+                    return
+
+                CalGuruMetrics.retries.inc(len(pending))
+
+                # Wait out longest backoff or Retry-After of failed calls
+                errors = [results[index][1] for index in pending]
+                delay = max(cls.retry_policy.get_delay(attempt, err) for err in errors)
+
+                # Account's quota exceeded; hold back every thread using it
+                if any(cls.retry_policy.is_rate_limited(err) for err in errors):
+                    rate_limiter.pause(delay)
+
+                time.sleep(delay)
+                attempt += 1
+
+        chunk_starts = range(0, len(request_builders), batch_size)
+
+        # Single chunk; no need for worker threads
+        if len(chunk_starts) <= 1 or max_concurrency == 1:
+            for chunk_start in chunk_starts:
+                execute_chunk(chunk_start)
+
+        else:
+            with ThreadPoolExecutor(
+                    max_workers=min(max_concurrency, len(chunk_starts))) as executor:
+
+                # Consuming map's results re-raises any error raised by a chunk
+                list(executor.map(execute_chunk, chunk_starts))
+
+        return results
+
+    @classmethod
+    def _execute_single(cls, request_builder):
         """
+        Executes a single Google Calendar API call outside of a batch request,
+        with the next service account, rate limited and retried like calls in
+        _execute_batched.
 
-        # Get Google service account credentials
-        credentials = service_account.Credentials.from_service_account_file(
-            GoogleCalendarApi.service_account_dir,
-            scopes=GoogleCalendarApi.SCOPES)
+        :param request_builder: Function taking a Resource object and returning
+           the HttpRequest of the call.
+        :return: Response of call. Throws the call's last error if it still
+           fails after all retries.
+        """
 
-        # Return Resource object
-        return discovery.build('calendar', 'v3', credentials=credentials,
-                               cache_discovery=False)
+        service_account_dir = cls.next_service_account()
+        service = cls.get_service(service_account_dir)
+        http_pool = cls.get_http_pool(service_account_dir)
+        rate_limiter = cls.get_rate_limiter(service_account_dir)
+        attempt = 0
+
+        while True:
+            rate_limiter.acquire()
+            try:
+                with http_pool.connection() as http, \
+                        CalGuruMetrics.google_request_seconds.time(kind='single'):
+                    return request_builder(service).execute(http=http)
+            except (HttpError,) + cls.retry_policy.TRANSPORT_ERRORS as err:
+
+                # Not Modified answers a conditional request; it's no error
+                if cls.retry_policy.get_status(err) == 304:
+                    raise
+                CalGuruMetrics.google_errors.inc(
+                    reason=cls.retry_policy.get_reason(err) or 'unknown')
+                if not cls.retry_policy.is_retryable(err) or \
+                        attempt >= cls.retry_policy.max_retries:
+                    raise
+                CalGuruMetrics.retries.inc()
+                delay = cls.retry_policy.get_delay(attempt, err)
+                if cls.retry_policy.is_rate_limited(err):
+                    rate_limiter.pause(delay)
+                time.sleep(delay)
+                attempt += 1
 
     @classmethod
-    def batch_create_events(cls, event_dicts, send_notifications=True):
+    def normalize_events(cls, event_dicts, raise_errors=True):
+        """
+        Validates input event dicts and converts valid ones to EventRecords,
+        all at once. Keys are described in batch_create_events.
+
+        :param event_dicts: List of event dicts.
+        :param raise_errors: Boolean specifying whether to throw if any event
+           is invalid. The error of the first invalid event is thrown
+           (gcal_errors.MissingEventFields, gcal_errors.InvalidEventTime, or
+           gcal_errors.InvalidEventAttendees), with its 'errors' listing every
+           invalid event's index and error.
+           Defaults to true.
+        :return: (records, errors) tuple, as returned by
+           EventNormalizer.normalize.
+        """
+
+        records, errors = EventNormalizer.normalize(event_dicts)
+
+        if errors and raise_errors:
+            error = errors[min(errors)]
+            error.errors = [dict(cls.get_error_info(errors[index]), index=index)
+                            for index in sorted(errors)]
+            raise error
+
+        return records, errors
+
+    @staticmethod
+    def make_event_id(idempotency_key, index):
+        """
+        Returns deterministic Google Calendar event id for event at input
+        index of request with input idempotency key.
+
+        Ids are a SHA-256 hash encoded in base32hex, whose lowercase alphabet
+        (0-9 and a-v) matches the characters Google allows in event ids.
+        """
+
+        digest = hashlib.sha256(
+            ('%s:%d' % (idempotency_key, index)).encode('utf-8')).digest()
+        return base64.b32encode(digest).decode('ascii').rstrip('=').translate(
+            GoogleCalendarApi._BASE32HEX_TABLE)
+
+    @classmethod
+    def get_error_info(cls, exception):
+        """
+        Returns dict describing input error of a single item, with keys
+        'code' (HTTP status), 'reason', and 'message'.
+        """
+
+        # Input failed a CalGuru check
+        if isinstance(exception, CalGuruError):
+            return {'code': exception.status, 'reason': type(exception).__name__,
+                    'message': exception.message}
+
+        # Google Calendar API call failed
+        if isinstance(exception, HttpError):
+            return {'code': cls.retry_policy.get_status(exception),
+                    'reason': cls.retry_policy.get_reason(exception),
+                    'message': cls.retry_policy.get_message(exception)}
+
+        return {'code': 500, 'reason': type(exception).__name__,
+                'message': str(exception)}
+
+    @classmethod
+    def batch_create_events(cls, event_dicts, send_notifications=True,
+                            batch_size=None, max_concurrency=None,
+                            partial=False, on_progress=None,
+                            idempotency_key=None, conflicts=None,
+                            calendar_id=None, compact=False, notifications=None):
         """
         Creates Google Calendar events and returns list of dicts containing
         events' ids, summaries, and links.
@@ -60,105 +495,842 @@ class GoogleCalendarApi(object):
         :param send_notifications: Boolean specifying whether to send
            notifications about creation of events (includes invitations).
            Defaults to true.
+        :param batch_size: Maximum number of events created per batch request.
+           Defaults to BATCH_SIZE.
+        :param max_concurrency: Maximum number of batch requests executed
+           concurrently. Defaults to MAX_CONCURRENT_BATCHES.
+        :param partial: Boolean specifying whether to return the outcome of
+           each event instead of throwing the first error. Defaults to false.
+        :param on_progress: Optional function called with the number of
+           events whose outcome is known and the total number of events,
+           every time a batch request is done. May be called from worker
+           threads.
+        :param idempotency_key: Optional string identifying this request
+           across client retries. If specified, each event's id is derived
+           from the key and the event's index, so retrying the request never
+           creates duplicates: events that already exist are returned as if
+           they had just been created.
+        :param conflicts: Optional handling of events overlapping events known
+           to interval index: 'reject' fails them with
+           gcal_errors.EventConflict (per event if partial is true), and
+           'warn' creates them but lists the ids of the overlapped events in
+           their output dict's 'conflicts'.
+        :param calendar_id: Optional id of calendar to create events in.
+           Defaults to calendar_id.
+        :param notifications: Optional notification policy of attendees, as
+           described in NotificationPolicy: 'all' (an invitation per event,
+           throttled per attendee domain), 'none', or 'digest' (events are
+           created silently, then each attendee gets one digest from
+           notification_policy's digest_sender). Overrides
+           send_notifications, which otherwise picks 'all' or 'none'.
+        :param compact: Boolean specifying whether to create events that
+           differ only by their start time, and start at a daily or weekly
+           cadence, as instances of a single recurring event (see
+           EventCompactor). Each instance's id is that of the recurring event
+           followed by its UTC start time, e.g. 'abc_20180509T100000Z', and
+           its output dict also contains the recurring event's 'series_id'.
+           Defaults to false.
         :return: List of dicts containing created events' ids, summaries, and
-           links.
+           links, in the same order as event_dicts.
+           If partial is true, each dict instead contains the event's 'index'
+           in event_dicts and 'status', which is either 'success' (with 'id',
+           'summary', and 'link') or 'error' (with 'code', 'reason', and
+           'message'). Invalid events are reported rather than thrown, and
+           don't stop valid events from being created.
         """
 
-        # Mandatory fields that need to be specified for each event
-        mandatory_event_fields = {'summary', 'start', 'end'}
+        calendar_id = calendar_id or GoogleCalendarApi.calendar_id
+        notifications = notifications or ('all' if send_notifications else 'none')
 
-        # All valid event fields supported in batch_create_events
-        all_event_fields = mandatory_event_fields | {'description', 'location', 'attendees'}
+        # Outcome of each input event, indexed by input position
+        ret_items = [None] * len(event_dicts)
 
-        # Resource object for interacting with Google Calendar API
-        service = cls.get_service()
+        # Input positions of valid events
+        valid_indexes = []
 
-        # List of dicts containing created events' ids and links; returned at
-        # end of method
-        ret_events_info = []
+        # Known events that events overlap, by input position
+        interval_index = cls.get_interval_index(calendar_id)
+        conflict_ids = {}
 
-        # Initialize batch create event operation with callback for assigning ret_events_info
-        def event_created(_, response, exception):  # Called every time event is created
-            if exception:
-                raise exception
-            ret_events_info.append({'id': response.get('id'), 'summary': response.get('summary'),
-                                    'link': response.get('htmlLink')})
-        batch = service.new_batch_http_request(callback=event_created)
+        # Validate and convert all events at once
+        with CalGuruMetrics.normalize_seconds.time():
+            records, errors = cls.normalize_events(event_dicts,
+                                                   raise_errors=not partial)
 
         # Iterate through each input event dict
-        for event_dict in event_dicts:
+        for index, event_dict in enumerate(event_dicts):
 
-            # Mandatory event fields aren't all specified for input event dict; raise error
-            if not mandatory_event_fields.issubset(set(event_dict.keys())):
-                raise gcal_errors.MissingEventFields(
-                    "Mandatory fields (summary, start time, and end time) "
-                    "weren't all specified for event.")
+            # Check event is valid and doesn't overlap known events
+            try:
+                if index in errors:
+                    raise errors[index]
+                if conflicts:
+                    overlapping_ids = interval_index.overlaps(
+                        event_dict['start'], event_dict['end'])
+                    if overlapping_ids and conflicts == 'reject':
+                        raise gcal_errors.EventConflict(
+                            "Event overlaps existing events: %s."
+                            % ', '.join(overlapping_ids))
+                    if overlapping_ids:
+                        conflict_ids[index] = overlapping_ids
+            except gcal_errors.GoogleCalendarError as err:
+                if not partial:
+                    raise
+                ret_items[index] = dict(cls.get_error_info(err), index=index,
+                                        status='error')
+                continue
 
-            # Input event dict has invalid times; raise error
-            if event_dict.get('start') >= event_dict.get('end'):
-                raise gcal_errors.InvalidEventTime(
-                    "Google Calendar event creation with start time after or "
-                    "equal to end time was attempted.")
-
-            # Event to be added to Google Calendar
-            gcal_event = {}
-
-            # Add fields to gcal_event
-            for key, value in event_dict.items():
-                if value and key in all_event_fields:
-                    if key == 'attendees':
-                        value = [{'email': email} for email in value]
-                    if key == 'start' or key == 'end':
-                        value = {
-                            'dateTime': arrow.get(value).isoformat('T'),  # RFC3339 format
-                            'timeZone': 'UTC',
-                        }
-                    gcal_event[key] = value
-
-            # Add create event operation to batch operation
-            batch.add(service.events().insert(
-                calendarId=GoogleCalendarApi.calendar_id, body=gcal_event,
-                sendNotifications=send_notifications))
-
-        # Batch create events (batch.execute() will call event_created for every
-        # single event creation operation before returning)
-        batch.execute()
+            valid_indexes.append(index)
+
+        # Regularly repeating events are created as recurring event series
+        series, single_indexes = EventCompactor.compact(records, valid_indexes) \
+            if compact else ([], valid_indexes)
+
+        # Record of each create event operation, and input positions of the
+        # events it creates. A series is identified by the position of its
+        # first event.
+        requests = [(records[index], (index,)) for index in single_indexes] + \
+            [(event_series.record, event_series.indexes) for event_series in series]
+        series_by_index = {event_series.indexes[0]: event_series
+                           for event_series in series}
+
+        # Functions building create event operation of each record. Request
+        # bodies are built as their chunk is sent, so only one chunk's bodies
+        # are held at a time.
+        request_builders = []
+        notify = notifications == 'all'
+
+        # Positions of requests whose inserts have waited for the
+        # notification rate limiters of their attendees' domains. Retried
+        # requests are rebuilt, but don't wait for them again.
+        throttled = set()
+
+        for position, (record, indexes) in enumerate(requests):
+
+            # Assign deterministic id, so retried requests can't duplicate event
+            if idempotency_key:
+                record.id = cls.make_event_id(idempotency_key, indexes[0])
+
+            def build_request(service, position=position, record=record):
+                body = record.to_gcal_event()
+                if notify and position not in throttled:
+                    throttled.add(position)
+                    cls.notification_policy.throttle(body)
+                return service.events().insert(
+                    calendarId=calendar_id, body=body, sendNotifications=notify)
+
+            # Add create event operation to batch operations
+            request_builders.append(build_request)
+
+        # Number of events whose outcome is known; invalid events are known
+        # before any batch request is sent
+        progress = {'completed': len(event_dicts) - len(valid_indexes)}
+        progress_lock = threading.Lock()
+
+        def chunk_done(positions):
+            """Reports progress after a chunk of operations is done."""
+
+            with progress_lock:
+                progress['completed'] += sum(len(requests[position][1])
+                                             for position in positions)
+                completed = progress['completed']
+            on_progress(completed, len(event_dicts))
+
+        # Batch create events in chunks
+        results = cls._execute_batched(request_builders, batch_size,
+                                       max_concurrency,
+                                       chunk_done if on_progress else None)
+
+        # Events whose ids already exist were created by an earlier attempt of
+        # this request; fetch them instead of reporting duplicate errors
+        if idempotency_key:
+            duplicates = [position for position, (_, exception) in enumerate(results)
+                          if cls.retry_policy.get_status(exception) == 409]
+            fetched = cls._execute_batched(
+                [lambda service, event_id=requests[position][0].id:
+                    service.events().get(calendarId=calendar_id,
+                                         eventId=event_id)
+                 for position in duplicates],
+                batch_size, max_concurrency)
+            for position, result in zip(duplicates, fetched):
+                results[position] = result
+
+        # Created events, with each instance of a series as its own event
+        created_events = []
+
+        # Store outcome of each create event operation at its input positions
+        for (_, indexes), (response, exception) in zip(requests, results):
+            if exception:
+                if not partial:
+                    raise exception
+                for index in indexes:
+                    ret_items[index] = dict(cls.get_error_info(exception),
+                                            index=index, status='error')
+                continue
+
+            event_series = series_by_index.get(indexes[0])
+            if event_series:
+                instances = []
+                for index, instance_id in zip(
+                        indexes, event_series.get_instance_ids(response.get('id'))):
+                    gcal_event = records[index].to_gcal_event()
+                    instances.append(dict(
+                        response, id=instance_id, recurringEventId=response.get('id'),
+                        start=gcal_event['start'], end=gcal_event['end']))
+            else:
+                instances = [response]
+
+            for index, instance in zip(indexes, instances):
+                event_info = {'id': instance.get('id'),
+                              'summary': instance.get('summary'),
+                              'link': instance.get('htmlLink')}
+                if event_series:
+                    event_info['series_id'] = response.get('id')
+                if partial:
+                    event_info.update(index=index, status='success')
+                if index in conflict_ids:
+                    event_info['conflicts'] = conflict_ids[index]
+                ret_items[index] = event_info
+            created_events.extend(instances)
+
+        CalGuruMetrics.events_created.inc(len(created_events))
+
+        # Events created under ids read before, e.g. by an earlier attempt
+        # of an idempotent request, are read again
+        cls.invalidate_events(
+            set(event['id'] for event in created_events) |
+            set(response['id'] for response, exception in results if not exception),
+            calendar_id)
+
+        # Created events are known to conflict checks
+        cls.index_events(created_events, calendar_id)
+
+        # Attendees get a single digest instead of an invitation per event
+        if notifications == 'digest':
+            cls.notification_policy.send_digests(created_events)
+
+        # Keep mirror up to date with created events. It syncs with recurring
+        # events expanded into their instances, so series are stored as their
+        # instances too; storing the recurring event itself would leave a row
+        # that incremental syncs never update or delete.
+        mirror = cls._get_mirror(calendar_id)
+        if mirror:
+            mirror.apply(created_events)
 
         # Returns created events' ids, summaries, and links
-        return ret_events_info
+        return ret_items
+
+    @classmethod
+    def stream_create_events(cls, event_dicts, send_notifications=True,
+                             batch_size=None, max_concurrency=None,
+                             conflicts=None, calendar_id=None,
+                             notifications=None):
+        """
+        Creates Google Calendar events from an iterable that may be much
+        larger than memory, e.g. lines of a request body still being
+        uploaded, and yields the outcome of each event as soon as it's known.
+
+        Events are pulled from input in groups filling max_concurrency batch
+        requests of batch_size events. Each group is created in the background
+        while the next one is pulled, so at most two groups are held in
+        memory at any time.
+
+        :param event_dicts: Iterable of event dicts, as described in
+           batch_create_events. Items that are exceptions (e.g. for input
+           that couldn't be parsed) are reported as errors of their position.
+        :param send_notifications: As in batch_create_events.
+        :param batch_size: As in batch_create_events.
+        :param max_concurrency: As in batch_create_events.
+        :param conflicts: As in batch_create_events.
+        :param calendar_id: As in batch_create_events.
+        :param notifications: As in batch_create_events. Digests are sent per
+           group of events.
+        :return: Generator of output dicts in input order, as returned by
+           batch_create_events in partial mode, with 'index' counting from
+           the start of input.
+        """
+
+        group_size = (batch_size or cls.BATCH_SIZE) * \
+            (max_concurrency or cls.MAX_CONCURRENT_BATCHES)
+
+        def create_group(offset, group):
+            """Creates group of events starting at input offset."""
+
+            items = cls.batch_create_events(
+                [None if isinstance(item, Exception) else item for item in group],
+                send_notifications=send_notifications, batch_size=batch_size,
+                max_concurrency=max_concurrency, partial=True, conflicts=conflicts,
+                calendar_id=calendar_id, notifications=notifications)
+            for position, item in enumerate(items):
+                if isinstance(group[position], Exception):
+                    items[position] = dict(cls.get_error_info(group[position]),
+                                           status='error')
+                items[position]['index'] = offset + position
+            return items
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+
+            # Group being created while next group is pulled
+            pending = None
+            offset = 0
+            group = []
+            for event_dict in event_dicts:
+                group.append(event_dict)
+                if len(group) < group_size:
+                    continue
+                if pending:
+                    yield from pending.result()
+                pending = executor.submit(create_group, offset, group)
+                offset += len(group)
+                group = []
+
+            if pending:
+                yield from pending.result()
+            if group:
+                yield from create_group(offset, group)
 
     @classmethod
-    def get_event(cls, id):
+    def get_interval_index(cls, calendar_id=None):
+        """
+        Returns interval index of known events in input calendar (defaults to
+        calendar_id), creating it if needed.
+        """
+
+        calendar_id = calendar_id or GoogleCalendarApi.calendar_id
+        with cls._interval_indexes_lock:
+            interval_index = cls.interval_indexes.get(calendar_id)
+            if interval_index is None:
+                interval_index = cls.interval_indexes[calendar_id] = IntervalIndex()
+            return interval_index
+
+    @classmethod
+    def index_events(cls, events, calendar_id=None):
+        """
+        Updates interval index of input calendar (defaults to calendar_id) with
+        input Google Calendar event resources. Cancelled and transparent
+        (not busy) events are removed from it; events without start and end
+        times are ignored.
+        """
+
+        interval_index = cls.get_interval_index(calendar_id)
+        for event in events:
+            if not event or not event.get('id'):
+                continue
+            if event.get('status') == 'cancelled' or \
+                    event.get('transparency') == 'transparent':
+                interval_index.remove(event['id'])
+            elif event.get('start') and event.get('end'):
+                interval_index.add(event['id'],
+                                   cls.get_event_timestamp(event['start']),
+                                   cls.get_event_timestamp(event['end']))
+
+    @classmethod
+    def get_free_busy(cls, slots, calendar_id=None):
+        """
+        Returns whether each input time slot overlaps an event known to the
+        interval index of input calendar (defaults to calendar_id), without
+        calling Google. Each check takes O(log n) in the number of known
+        events.
+
+        :param slots: List of dicts with 'start' and 'end' UTC timestamps.
+           Throws gcal_errors.MissingEventFields if it isn't one, and
+           gcal_errors.InvalidEventTime if a slot's times aren't timestamps
+           or its start isn't before its end.
+        :return: List of booleans in the same order as slots; true means busy.
+        """
+
+        if not isinstance(slots, list):
+            raise gcal_errors.MissingEventFields("Slots weren't specified as a list.")
+
+        interval_index = cls.get_interval_index(calendar_id)
+        busy = []
+        for index, slot in enumerate(slots):
+            if not isinstance(slot, dict) or 'start' not in slot or 'end' not in slot:
+                raise gcal_errors.MissingEventFields(
+                    "Start and end times weren't both specified for slot %d."
+                    % index)
+            start, end = slot['start'], slot['end']
+            if not isinstance(start, (int, float)) or isinstance(start, bool) or \
+                    not isinstance(end, (int, float)) or isinstance(end, bool):
+                raise gcal_errors.InvalidEventTime(
+                    "Start and end times of slot %d must be UTC timestamps." % index)
+            if not start < end:
+                raise gcal_errors.InvalidEventTime(
+                    "Start time of slot %d isn't before its end time." % index)
+            busy.append(interval_index.is_busy(start, end))
+        return busy
+
+    @staticmethod
+    def get_event_timestamp(time):
+        """
+        Returns UTC timestamp of input Google event start or end time, which
+        holds either a 'dateTime' or an all-day 'date'.
+        """
+
+        if not time:
+            return None
+        import arrow
+        return arrow.get(time.get('dateTime') or time.get('date')).timestamp
+
+    @classmethod
+    def _get_mirror(cls, calendar_id=None, synced=False):
+        """
+        Returns mirror if there is one for input calendar (defaults to
+        calendar_id) and it has been synced, if synced is true; otherwise
+        None.
+        """
+
+        calendar_id = calendar_id or GoogleCalendarApi.calendar_id
+        mirror = cls.mirror
+        if mirror is None or mirror.calendar_id != calendar_id:
+            return None
+        if synced and not mirror.is_ready(calendar_id):
+            return None
+        return mirror
+
+    @classmethod
+    def get_event(cls, id, calendar_id=None):
         """
         Returns dict containing all information about Google Calendar event with
-        input event id.
+        input event id, in input calendar (defaults to calendar_id).
         Returns None if no such event could be found.
+
+        Served from mirror if it has been synced and holds the event, and
+        otherwise from event_cache while its entry is fresh. Stale entries are
+        revalidated with Google using the event's etag, which costs a call
+        but no transfer of an unchanged event. If Google fails for another
+        reason than the event being gone, a stale entry is served as is, and
+        without one the error is raised.
         """
 
-        # Resource object for interacting with Google Calendar API
-        service = cls.get_service()
+        calendar_id = calendar_id or GoogleCalendarApi.calendar_id
+        mirror = cls._get_mirror(calendar_id, synced=True)
+        if mirror:
+            event = mirror.get(id)
+            if event:
+                return event
+
+        key = (calendar_id, id)
+        cached = cls.event_cache.get(key)
+        if cached and time.monotonic() - cached[0] < cls.EVENT_CACHE_FRESH_SECONDS:
+            CalGuruMetrics.event_cache.inc(result='hit')
+            return cached[1]
+
+        def build_request(service):
+            request = service.events().get(calendarId=calendar_id, eventId=id)
+
+            # Google answers 304 if cached event is still current
+            if cached and cached[1].get('etag'):
+                request.headers['If-None-Match'] = cached[1]['etag']
+            return request
 
         try:
 
             # Retrieve and return event with input event id
-            return service.events().get(calendarId=GoogleCalendarApi.calendar_id,
-                                        eventId=id).execute()
-        except HttpError:
+            event = cls._execute_single(build_request)
+            CalGuruMetrics.event_cache.inc(result='miss')
+        except HttpError as err:
+            status = cls.retry_policy.get_status(err)
+            if status in (404, 410):
 
-            # Event with input id couldn't be found; return None
-            return None
+                # Event with input id couldn't be found; return None
+                cls.event_cache.pop(key)
+                return None
+            if not cached:
+                raise
+            if status != 304:
+
+                # Google is failing, e.g. out of quota; serve stale copy
+                CalGuruMetrics.event_cache.inc(result='stale')
+                return cached[1]
+            event = cached[1]
+            CalGuruMetrics.event_cache.inc(result='revalidated')
+
+        cls.event_cache.set(key, (time.monotonic(), event))
+        cls.index_events([event], calendar_id)
+        return event
+
+    @classmethod
+    def invalidate_events(cls, ids, calendar_id=None):
+        """
+        Drops events with input ids, in input calendar (defaults to
+        calendar_id), from event_cache.
+        """
+
+        calendar_id = calendar_id or GoogleCalendarApi.calendar_id
+        for event_id in ids:
+            cls.event_cache.pop((calendar_id, event_id))
+
+    @classmethod
+    def get_events(cls, ids, fields=None, batch_size=None, max_concurrency=None,
+                   calendar_id=None):
+        """
+        Returns list of dicts containing information about Google Calendar
+        events with input event ids, fetched in batch requests. Items are in
+        the same order as ids, and are None for events that couldn't be found.
+
+        :param ids: List of ids of events to get.
+        :param fields: Optional Google partial response selector (e.g.
+           'id,summary,start,end') limiting the fields returned for each event.
+        :param batch_size: Maximum number of events fetched per batch request.
+           Defaults to BATCH_SIZE.
+        :param max_concurrency: Maximum number of batch requests executed
+           concurrently. Defaults to MAX_CONCURRENT_BATCHES.
+        :param calendar_id: Optional id of calendar holding events. Defaults
+           to calendar_id.
+        """
+
+        calendar_id = calendar_id or GoogleCalendarApi.calendar_id
+
+        # Only pass fields when specified; None isn't a valid selector
+        fields_kwargs = {'fields': fields} if fields else {}
+
+        # Batch get events in chunks
+        results = cls._execute_batched(
+            [lambda service, event_id=event_id: service.events().get(
+                calendarId=calendar_id, eventId=event_id, **fields_kwargs)
+             for event_id in ids],
+            batch_size, max_concurrency)
+
+        ret_events = []
+        for response, exception in results:
+            if exception:
+
+                # Event with id couldn't be found
+                if cls.retry_policy.get_status(exception) in (404, 410):
+                    ret_events.append(None)
+                    continue
+                raise exception
+            ret_events.append(response)
+
+        cls.index_events(ret_events, calendar_id)
+        return ret_events
+
+    # Event fields returned by list_events unless others are requested
+    LIST_FIELDS = ('id,status,summary,description,location,start,end,'
+                   'htmlLink,attendees(email),updated')
+
+    # Maximum number of events Google returns per page of events().list
+    LIST_PAGE_SIZE = 2500
+
+    @classmethod
+    def list_events(cls, time_min=None, time_max=None, q=None, fields=None,
+                    calendar_id=None):
+        """
+        Generator yielding Google Calendar events in input time range and
+        matching input query, ordered by start time. Pages of events are
+        fetched from Google as the generator is consumed, so only one page is
+        held in memory at a time.
+
+        :param time_min: Optional UTC timestamp or RFC3339 string; only events
+           ending after it are yielded.
+        :param time_max: Optional UTC timestamp or RFC3339 string; only events
+           starting before it are yielded.
+        :param q: Optional free text search terms.
+        :param fields: Optional Google partial response selector of each
+           event's fields. Defaults to LIST_FIELDS.
+        :param calendar_id: Optional id of calendar to list. Defaults to
+           calendar_id.
+
+        If mirror has been synced and no fields are requested, events are read
+        from mirror instead, with all their fields. Mirror search matches q
+        against events' summaries, descriptions, and locations.
+        """
+
+        calendar_id = calendar_id or GoogleCalendarApi.calendar_id
+        mirror = cls._get_mirror(calendar_id, synced=True)
+        if mirror and not fields:
+            for event in mirror.query(
+                    None if time_min is None else cls.to_timestamp(time_min),
+                    None if time_max is None else cls.to_timestamp(time_max), q):
+                yield event
+            return
+
+        list_kwargs = {
+            'calendarId': calendar_id,
+            'singleEvents': True,
+            'orderBy': 'startTime',
+            'maxResults': cls.LIST_PAGE_SIZE,
+            'fields': 'nextPageToken,items(%s)' % (fields or cls.LIST_FIELDS)
+        }
+        if time_min is not None:
+            list_kwargs['timeMin'] = cls.to_rfc3339(time_min)
+        if time_max is not None:
+            list_kwargs['timeMax'] = cls.to_rfc3339(time_max)
+        if q:
+            list_kwargs['q'] = q
+
+        page_token = None
+        while True:
+            page = cls._execute_single(
+                lambda service: service.events().list(pageToken=page_token,
+                                                      **list_kwargs))
+            events = page.get('items', [])
+            cls.index_events(events, calendar_id)
+            for event in events:
+                yield event
+
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                return
 
     @classmethod
-    def delete_event(cls, id):
+    def list_event_pages(cls, sync_token=None, calendar_id=None):
         """
-        Deletes event with input event id from Google Calendar.
+        Generator yielding pages of every event in calendar, as returned by
+        Google's events().list, for incremental sync. Cancelled events are
+        included, and the last page contains 'nextSyncToken'.
+
+        :param sync_token: Optional 'nextSyncToken' of an earlier sync; only
+           events changed since then are listed. Throws
+           googleapiclient.errors.HttpError with status 410 if Google no
+           longer accepts the token, in which case a full sync is needed.
+        :param calendar_id: Optional id of calendar to list. Defaults to
+           calendar_id.
+        """
+
+        list_kwargs = {
+            'calendarId': calendar_id or GoogleCalendarApi.calendar_id,
+            'singleEvents': True,
+            'showDeleted': True,
+            'maxResults': cls.LIST_PAGE_SIZE
+        }
+        if sync_token:
+            list_kwargs['syncToken'] = sync_token
+
+        page_token = None
+        while True:
+            page = cls._execute_single(
+                lambda service: service.events().list(pageToken=page_token,
+                                                      **list_kwargs))
+            yield page
+
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                return
+
+    @staticmethod
+    def to_rfc3339(value):
+        """
+        Returns input UTC timestamp as RFC3339 string. Strings that aren't
+        timestamps are assumed to already be RFC3339 and are returned as is.
+        """
+
+        try:
+            value = float(value)
+        except ValueError:
+            return value
+        return EventNormalizer.format_rfc3339([value])[0]
+
+    @staticmethod
+    def to_timestamp(value):
+        """Returns input UTC timestamp or RFC3339 string as UTC timestamp."""
+
+        try:
+            return float(value)
+        except ValueError:
+            import arrow
+            return arrow.get(value).timestamp
+
+    @classmethod
+    def delete_event(cls, id, calendar_id=None):
+        """
+        Deletes event with input event id from input Google Calendar (defaults
+        to calendar_id).
         Throws googleapiclient.errors.HttpError if event with input id
         doesn't exist or has already been deleted.
         """
 
-        # Resource object for interacting with Google Calendar API
-        service = cls.get_service()
+        calendar_id = calendar_id or GoogleCalendarApi.calendar_id
 
         # Delete event with input event id from Google Calendar
-        service.events().delete(calendarId=GoogleCalendarApi.calendar_id,
-                                eventId=id).execute()
+        cls._execute_single(
+            lambda service: service.events().delete(calendarId=calendar_id,
+                                                    eventId=id))
+
+        # Keep mirror, interval index, and event cache up to date with
+        # deleted event
+        mirror = cls._get_mirror(calendar_id)
+        if mirror:
+            mirror.remove([id])
+        cls.get_interval_index(calendar_id).remove(id)
+        cls.invalidate_events([id], calendar_id)
+
+    @classmethod
+    def delete_events(cls, ids, batch_size=None, max_concurrency=None,
+                      calendar_id=None):
+        """
+        Deletes events with input event ids from Google Calendar in batch
+        requests.
+
+        Events that don't exist or have already been deleted (404 or 410)
+        count as deleted, so deleting the same ids again is safe. Throws
+        gcal_errors.InvalidEventIds if ids isn't a list; ids that aren't
+        non-empty strings fail individually, without a call to Google.
+
+        :param ids: List of ids of events to delete.
+        :param batch_size: Maximum number of events deleted per batch request.
+           Defaults to BATCH_SIZE.
+        :param max_concurrency: Maximum number of batch requests executed
+           concurrently. Defaults to MAX_CONCURRENT_BATCHES.
+        :param calendar_id: Optional id of calendar holding events. Defaults
+           to calendar_id.
+        :return: List of dicts containing the outcome of each id, in the same
+           order as ids. Each dict contains the id's 'index' in ids, the 'id',
+           and 'status', which is either 'success' or 'error' (with 'code',
+           'reason', and 'message').
+        """
+
+        calendar_id = calendar_id or GoogleCalendarApi.calendar_id
+
+        # A string would be deleted character by character
+        if not isinstance(ids, list):
+            raise gcal_errors.InvalidEventIds(
+                "Ids of events to delete must be a list.")
+
+        # Outcome of each id, indexed by input position
+        ret_items = [None] * len(ids)
+        request_indexes = []
+        for index, event_id in enumerate(ids):
+            if not event_id or not isinstance(event_id, str):
+                ret_items[index] = dict(cls.get_error_info(
+                    gcal_errors.InvalidEventIds("Id of event to delete must be "
+                                                "a non-empty string.")),
+                    index=index, id=event_id, status='error')
+            else:
+                request_indexes.append(index)
+
+        # Batch delete events in chunks
+        results = cls._execute_batched(
+            [lambda service, event_id=ids[index]: service.events().delete(
+                calendarId=calendar_id, eventId=event_id)
+             for index in request_indexes],
+            batch_size, max_concurrency)
+
+        for index, (_, exception) in zip(request_indexes, results):
+
+            # Event is gone, whether deleted now or before
+            if not exception or cls.retry_policy.get_status(exception) in (404, 410):
+                ret_items[index] = {'index': index, 'id': ids[index],
+                                    'status': 'success'}
+            else:
+                ret_items[index] = dict(cls.get_error_info(exception), index=index,
+                                        id=ids[index], status='error')
+
+        # Keep mirror, interval index, and event cache up to date with deleted
+        # events
+        deleted_ids = [item['id'] for item in ret_items
+                       if item['status'] == 'success']
+        cls.invalidate_events(deleted_ids, calendar_id)
+        mirror = cls._get_mirror(calendar_id)
+        if mirror:
+            mirror.remove(deleted_ids)
+        interval_index = cls.get_interval_index(calendar_id)
+        for event_id in deleted_ids:
+            interval_index.remove(event_id)
+
+        return ret_items
+
+    @classmethod
+    def patch_events(cls, patch_dicts, send_notifications=True, batch_size=None,
+                     max_concurrency=None, calendar_id=None):
+        """
+        Updates fields of existing Google Calendar events in batch requests.
+        Only changed fields are sent; other fields keep their values. Throws
+        gcal_errors.InvalidEventChanges if patch_dicts isn't a list; invalid
+        updates fail individually, without a call to Google.
+
+        :param patch_dicts: List of dicts, where each dict specifies an update
+           with the following keys:
+           'id': Id of event to update. Required.
+           'changes': Dict of changed fields, with the keys of event dicts
+              described in batch_create_events. Optional fields changed to
+              None are cleared. Required.
+           'etag': Optional etag of the version of the event the changes were
+              made to. If the event has changed since, it isn't updated and
+              its outcome is an error with code 412.
+        :param send_notifications: Boolean specifying whether to notify
+           attendees of updates. Defaults to true.
+        :param batch_size: Maximum number of events updated per batch request.
+           Defaults to BATCH_SIZE.
+        :param max_concurrency: Maximum number of batch requests executed
+           concurrently. Defaults to MAX_CONCURRENT_BATCHES.
+        :param calendar_id: Optional id of calendar holding events. Defaults
+           to calendar_id.
+        :return: List of dicts containing the outcome of each update, in the
+           same order as patch_dicts. Each dict contains the update's 'index'
+           in patch_dicts, the event's 'id', and 'status', which is either
+           'success' (with the updated event's 'summary', 'link', and new
+           'etag') or 'error' (with 'code', 'reason', and 'message').
+        """
+
+        calendar_id = calendar_id or GoogleCalendarApi.calendar_id
+
+        # A string would be updated character by character
+        if not isinstance(patch_dicts, list):
+            raise gcal_errors.InvalidEventChanges(
+                "Updates of events must be a list.")
+
+        # Outcome of each update, indexed by input position
+        ret_items = [None] * len(patch_dicts)
+        event_ids = [patch_dict.get('id') if isinstance(patch_dict, dict) else None
+                     for patch_dict in patch_dicts]
+
+        # Validate and convert all changes at once
+        gcal_changes, errors = EventNormalizer.normalize_changes(
+            [patch_dict.get('changes') if isinstance(patch_dict, dict) else None
+             for patch_dict in patch_dicts])
+
+        request_builders = []
+        request_indexes = []
+        for index, patch_dict in enumerate(patch_dicts):
+            if not event_ids[index] or not isinstance(event_ids[index], str):
+                errors[index] = gcal_errors.InvalidEventChanges(
+                    "Id of event to update wasn't specified.")
+            if index in errors:
+                ret_items[index] = dict(cls.get_error_info(errors[index]),
+                                        index=index, id=event_ids[index],
+                                        status='error')
+                continue
+
+            def build_request(service, event_id=event_ids[index],
+                              body=gcal_changes[index], etag=patch_dict.get('etag')):
+                request = service.events().patch(
+                    calendarId=calendar_id, eventId=event_id, body=body,
+                    sendNotifications=send_notifications)
+
+                # Google only applies changes if event still has this etag
+                if etag:
+                    request.headers['If-Match'] = etag
+                return request
+
+            request_builders.append(build_request)
+            request_indexes.append(index)
+
+        # Batch update events in chunks
+        results = cls._execute_batched(request_builders, batch_size,
+                                       max_concurrency)
+
+        updated_events = []
+        for index, (response, exception) in zip(request_indexes, results):
+            if exception:
+                ret_items[index] = dict(cls.get_error_info(exception), index=index,
+                                        id=event_ids[index], status='error')
+                continue
+            updated_events.append(response)
+            ret_items[index] = {'index': index, 'id': response.get('id'),
+                                'status': 'success',
+                                'summary': response.get('summary'),
+                                'link': response.get('htmlLink'),
+                                'etag': response.get('etag')}
+
+        # Keep mirror, interval index, and event cache up to date with updated
+        # events
+        cls.index_events(updated_events, calendar_id)
+        for event in updated_events:
+            cls.event_cache.set((calendar_id, event['id']), (time.monotonic(), event))
+        mirror = cls._get_mirror(calendar_id)
+        if mirror:
+            mirror.apply(updated_events)
+
+        return ret_items
@@ -0,0 +1,77 @@
+"""Pool of reusable HTTP connections for Google Calendar API calls."""
+
+import threading
+from contextlib import contextmanager
+
+
+class HttpPool(object):
+    """
+    Thread-safe pool of at most size HTTP objects (e.g. authorized
+    httplib2.Http objects), each used by one thread at a time.
+
+    httplib2.Http keeps its connection to www.googleapis.com open between
+    requests, so a pooled object skips the TCP and TLS handshakes that a
+    newly built one has to make. The most recently released object is handed
+    out first, since its connection is the least likely to have timed out.
+    """
+
+    def __init__(self, factory, size=16):
+        """
+        :param factory: Function returning a new HTTP object.
+        :param size: Maximum number of HTTP objects. Once all of them are in
+           use, threads wait for one to be released.
+        """
+
+        self.factory = factory
+        self.size = size
+        self._condition = threading.Condition()
+
+        # Released HTTP objects, most recently released last
+        self._idle = []
+
+        # Pool counters
+        self._created = 0
+        self._reused = 0
+
+    def acquire(self):
+        """Returns an idle HTTP object, creating one if the pool isn't full."""
+
+        with self._condition:
+            while not self._idle and self._created >= self.size:
+                self._condition.wait()
+            if self._idle:
+                self._reused += 1
+                return self._idle.pop()
+            self._created += 1
+
+        try:
+            return self.factory()
+        except Exception:
+            with self._condition:
+                self._created -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, http):
+        """Returns input HTTP object, acquired from this pool, to the pool."""
+
+        with self._condition:
+            self._idle.append(http)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager acquiring an HTTP object and releasing it after use."""
+
+        http = self.acquire()
+        try:
+            yield http
+        finally:
+            self.release(http)
+
+    def stats(self):
+        """Returns dict containing pool size and counters."""
+
+        with self._condition:
+            return {'size': self.size, 'created': self._created,
+                    'idle': len(self._idle), 'reused': self._reused}
@@ -0,0 +1,181 @@
+"""Policies for notifying attendees of created Google Calendar events."""
+
+import smtplib
+import threading
+from contextlib import contextmanager
+from email.message import EmailMessage
+from src.utils.metrics import CalGuruMetrics
+from src.utils.rate_limiter import TokenBucket
+
+
+class DigestSender(object):
+    """
+    Sends attendees a single digest of the events created for them. Subclass
+    and set NotificationPolicy.digest_sender to deliver digests.
+    """
+
+    def send(self, email, events):
+        """
+        Sends digest to input attendee email.
+
+        :param email: Attendee's email.
+        :param events: List of created Google Calendar event resources the
+           attendee was invited to, ordered by start time.
+        """
+
+        raise NotImplementedError
+
+    @contextmanager
+    def session(self):
+        """
+        Returns context manager yielding a function that sends a digest like
+        send. Override to share a connection among the digests sent in one
+        session.
+        """
+
+        yield self.send
+
+
+class SmtpDigestSender(DigestSender):
+    """Sends digests as plain text emails through an SMTP server."""
+
+    def __init__(self, host, port=25, sender='calguru@localhost', timeout=30):
+        """
+        :param host: Host of SMTP server.
+        :param port: Port of SMTP server. Defaults to 25.
+        :param sender: From address of digests.
+        :param timeout: Seconds to wait for SMTP server. Defaults to 30.
+        """
+
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.timeout = timeout
+
+    def send(self, email, events):
+        with self.session() as send:
+            send(email, events)
+
+    @contextmanager
+    def session(self):
+        """Sends every digest of session through one SMTP connection."""
+
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            yield lambda email, events: smtp.send_message(
+                self.make_message(email, events))
+
+    def make_message(self, email, events):
+        """Returns digest email of input events to input attendee email."""
+
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = email
+        message['Subject'] = 'You were invited to %d event%s' % (
+            len(events), '' if len(events) == 1 else 's')
+        message.set_content('\n'.join(
+            '%s: %s to %s %s' % (event.get('summary') or '(No title)',
+                                 event['start'].get('dateTime'),
+                                 event['end'].get('dateTime'),
+                                 event.get('htmlLink') or '')
+            for event in events))
+        return message
+
+
+class NotificationPolicy(object):
+    """
+    Decides how attendees of created events are notified. Policies are:
+       'all': Google sends an invitation per event. If domain_rate is set,
+          inserts of events with attendees in a domain are throttled to
+          domain_rate per second, since Google limits the rate of
+          notifications and slows bulk loads down once they're exceeded.
+       'none': Events are inserted silently, at full throughput.
+       'digest': Events are inserted silently, and then each attendee gets
+          one digest of all their events from digest_sender.
+    """
+
+    POLICIES = ('all', 'none', 'digest')
+
+    def __init__(self, domain_rate=None, domain_capacity=10, digest_sender=None):
+        """
+        :param domain_rate: Optional maximum sustained number of notifying
+           inserts per second per attendee domain. Defaults to unlimited.
+        :param domain_capacity: Number of notifying inserts per attendee
+           domain that can go through at once before being throttled.
+        :param digest_sender: Optional DigestSender; digests can't be sent
+           without one.
+        """
+
+        self.domain_rate = domain_rate
+        self.domain_capacity = domain_capacity
+        self.digest_sender = digest_sender
+
+        # Rate limiters by attendee domain
+        self._domain_limiters = {}
+        self._lock = threading.Lock()
+
+    def get_domain_limiter(self, domain):
+        """Returns rate limiter of notifying inserts for input domain."""
+
+        with self._lock:
+            rate_limiter = self._domain_limiters.get(domain)
+            if rate_limiter is None:
+                rate_limiter = self._domain_limiters[domain] = TokenBucket(
+                    rate=self.domain_rate, capacity=self.domain_capacity)
+            return rate_limiter
+
+    @staticmethod
+    def get_emails(gcal_event):
+        """Returns emails of attendees of input event resource."""
+
+        return [attendee['email'] for attendee in gcal_event.get('attendees') or []
+                if attendee.get('email')]
+
+    def throttle(self, gcal_event):
+        """
+        Blocks until an insert notifying attendees of input event resource is
+        allowed by the rate limiter of each of their domains.
+        """
+
+        if not self.domain_rate:
+            return
+
+        domains = set(email.rsplit('@', 1)[-1].lower()
+                      for email in self.get_emails(gcal_event))
+        for domain in sorted(domains):
+            self.get_domain_limiter(domain).acquire()
+
+    def send_digests(self, gcal_events):
+        """
+        Sends each attendee of input created event resources one digest of
+        their events, all in one session of digest_sender. A digest that
+        fails to send doesn't stop the others.
+
+        :return: Number of digests sent.
+        """
+
+        events_by_email = {}
+        for gcal_event in gcal_events:
+            for email in self.get_emails(gcal_event):
+                events_by_email.setdefault(email.lower(), []).append(gcal_event)
+
+        sent = 0
+        attempted = 0
+        try:
+            with self.digest_sender.session() as send:
+                for email, events in sorted(events_by_email.items()):
+                    events.sort(key=lambda event: event['start'].get('dateTime') or '')
+                    attempted += 1
+                    try:
+                        send(email, events)
+                    except Exception:
+                        CalGuruMetrics.digests.inc(status='failed')
+                        continue
+                    CalGuruMetrics.digests.inc(status='sent')
+                    sent += 1
+        except Exception:
+
+            # Session couldn't be opened, e.g. SMTP server is down
+            if len(events_by_email) > attempted:
+                CalGuruMetrics.digests.inc(len(events_by_email) - attempted,
+                                           status='failed')
+        return sent
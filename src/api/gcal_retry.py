@@ -0,0 +1,130 @@
+"""Retry policy for failed Google Calendar API calls."""
+
+import json
+import random
+from email.utils import parsedate_to_datetime
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+class RetryPolicy(object):
+    """
+    Decides which failed Google Calendar API calls are retried and how long to
+    wait before retrying them.
+
+    Waits grow exponentially with full jitter, and are never shorter than
+    the Retry-After header of the failed call's response.
+    """
+
+    # Error reasons Google returns with 403 when a quota is exceeded
+    RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded',
+                          'quotaExceeded'}
+
+    # Errors of calls that didn't get a response, e.g. timeouts and dropped
+    # connections (socket.timeout and ConnectionError are OSErrors)
+    TRANSPORT_ERRORS = (OSError, httplib2.HttpLib2Error)
+
+    def __init__(self, max_retries=5, base_delay=0.5, max_delay=32.0):
+        """
+        :param max_retries: Maximum number of times a call is retried.
+        :param base_delay: Upper bound in seconds of first retry's wait.
+        :param max_delay: Upper bound in seconds of any exponential wait.
+        """
+
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def get_status(exception):
+        """Returns HTTP status of input error, or None if it has none."""
+
+        if isinstance(exception, HttpError):
+            return int(exception.resp.status)
+        return None
+
+    @staticmethod
+    def get_error(exception):
+        """
+        Returns 'error' object of Google's JSON error response in input
+        error, or an empty dict if it has none.
+        """
+
+        if not isinstance(exception, HttpError):
+            return {}
+
+        try:
+            content = exception.content
+            if isinstance(content, bytes):
+                content = content.decode('utf-8')
+            return json.loads(content).get('error') or {}
+        except (ValueError, AttributeError):
+            return {}
+
+    @classmethod
+    def get_reason(cls, exception):
+        """
+        Returns Google error reason (e.g. 'rateLimitExceeded') of input
+        error, or None if it has none.
+        """
+
+        errors = cls.get_error(exception).get('errors') or [{}]
+        return errors[0].get('reason')
+
+    @classmethod
+    def get_message(cls, exception):
+        """Returns Google's error message in input error."""
+
+        return cls.get_error(exception).get('message') or str(exception)
+
+    def is_rate_limited(self, exception):
+        """Whether input error means a Google quota was exceeded."""
+
+        status = self.get_status(exception)
+        return status == 429 or (
+            status == 403 and self.get_reason(exception) in self.RATE_LIMIT_REASONS)
+
+    def is_retryable(self, exception):
+        """Whether call that failed with input error should be retried."""
+
+        if isinstance(exception, self.TRANSPORT_ERRORS):
+            return True
+        status = self.get_status(exception)
+        return status is not None and (
+            status >= 500 or self.is_rate_limited(exception))
+
+    @staticmethod
+    def get_retry_after(exception):
+        """
+        Returns number of seconds specified by Retry-After header of input
+        error's response, or 0 if there is no such header.
+        """
+
+        if not isinstance(exception, HttpError):
+            return 0.0
+
+        value = exception.resp.get('retry-after')
+        if not value:
+            return 0.0
+
+        # Retry-After is either a number of seconds or an HTTP date
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        import arrow
+        try:
+            retry_at = arrow.get(parsedate_to_datetime(value))
+            return max(0.0, (retry_at - arrow.utcnow()).total_seconds())
+        except (TypeError, ValueError):
+            return 0.0
+
+    def get_delay(self, attempt, exception=None):
+        """
+        Returns number of seconds to wait before input retry attempt (starting
+        at 0) of call that failed with input error.
+        """
+
+        backoff = random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(backoff, self.get_retry_after(exception))
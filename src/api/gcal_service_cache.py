@@ -0,0 +1,239 @@
+"""Process-wide cache of Google credentials, Resource objects, and connections."""
+
+import datetime
+import json
+import threading
+from os.path import join, dirname, realpath
+from src.api.gcal_http_pool import HttpPool
+from src.utils.metrics import CalGuruMetrics
+
+
+class GoogleServiceCache(object):
+    """
+    Caches Google service account credentials, Google Calendar API Resource
+    objects, and pools of authorized HTTP connections so they aren't rebuilt
+    on every request.
+
+    Entries are keyed by credentials file and scopes. Credentials are shared
+    by every thread and refreshed proactively before their token expires.
+    Resource objects are shared too, but wrap a httplib2.Http object, which
+    isn't thread-safe; calls built from them are executed with a connection
+    of the entry's HttpPool instead (e.g. request.execute(http=http)).
+    """
+
+    # Number of seconds before a token's expiry at which it is refreshed
+    REFRESH_MARGIN_SECONDS = 300
+
+    # Location of bundled Google Calendar API v3 discovery document, which
+    # Resource objects are built from without fetching it from Google
+    DISCOVERY_DOCUMENT_DIR = join(dirname(realpath(__file__)),
+                                  'discovery/calendar.v3.json')
+
+    def __init__(self, pool_size=16, timeout=60, discovery_url=None,
+                 credentials_factory=None):
+        """
+        :param pool_size: Maximum number of HTTP connections per entry.
+        :param timeout: Socket timeout of HTTP connections in seconds.
+        :param discovery_url: Optional URL template of Google API discovery
+           documents, as taken by googleapiclient.discovery.build, to fetch
+           the discovery document from instead of using the bundled one.
+           Calls are sent to the root URL of the document served there, so
+           pointing it at a local server (e.g. bench.fake_gcal_server)
+           redirects every call to that server.
+        :param credentials_factory: Optional function taking a credentials
+           file and scopes and returning credentials. Defaults to loading
+           service account credentials from the file.
+        """
+
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.discovery_url = discovery_url
+        self.credentials_factory = credentials_factory or \
+            self.load_service_account_credentials
+
+        # Parsed bundled discovery document, loaded on first build
+        self._discovery_document = None
+
+        # Guards _credentials and the counters
+        self._lock = threading.Lock()
+
+        # Maps cache key to dict containing shared credentials, Resource
+        # object, and HttpPool, and the lock used when building them
+        self._credentials = {}
+
+        # Cache counters
+        self._hits = 0
+        self._misses = 0
+        self._refreshes = 0
+
+    @staticmethod
+    def load_service_account_credentials(credentials_dir, scopes):
+        """Returns service account credentials loaded from input file."""
+
+        # google.oauth2 is slow to import; only load it once it's needed
+        from google.oauth2 import service_account
+        return service_account.Credentials.from_service_account_file(
+            credentials_dir, scopes=scopes)
+
+    @staticmethod
+    def make_key(credentials_dir, scopes):
+        """Returns cache key for input credentials file and scopes."""
+
+        return realpath(credentials_dir), tuple(sorted(scopes))
+
+    def get_service(self, credentials_dir, scopes):
+        """
+        Returns cached Resource object for interacting with Google Calendar
+        API, building it the first time it is requested for input
+        credentials file and scopes.
+
+        :param credentials_dir: Location of Google service account credentials
+           file.
+        :param scopes: List of scopes requested for credentials.
+        :return: Resource object for interacting with Google Calendar API.
+        """
+
+        # Ensure shared credentials are loaded and fresh
+        entry = self._get_entry(credentials_dir, scopes)
+        credentials = entry['credentials']
+
+        service = entry.get('service')
+        if service is not None:
+            with self._lock:
+                self._hits += 1
+            return service
+
+        with entry['lock']:
+
+            # Another thread may have built it while we were waiting
+            if entry.get('service') is None:
+                with self._lock:
+                    self._misses += 1
+                with CalGuruMetrics.service_build_seconds.time():
+                    entry['service'] = self._build_service(credentials)
+
+        return entry['service']
+
+    def _build_service(self, credentials):
+        """
+        Returns new Resource object using input credentials, built from the
+        bundled discovery document unless discovery_url is set.
+        """
+
+        # googleapiclient is slow to import; only load it once it's needed
+        from googleapiclient import discovery
+
+        if self.discovery_url:
+            return discovery.build('calendar', 'v3', credentials=credentials,
+                                   cache_discovery=False,
+                                   discoveryServiceUrl=self.discovery_url)
+
+        with self._lock:
+            if self._discovery_document is None:
+                with open(self.DISCOVERY_DOCUMENT_DIR, 'rb') as document_file:
+                    self._discovery_document = json.loads(
+                        document_file.read().decode('utf-8'))
+            document = self._discovery_document
+
+        return discovery.build_from_document(document, credentials=credentials)
+
+    def get_http_pool(self, credentials_dir, scopes):
+        """
+        Returns pool of HTTP connections authorized with credentials for
+        input credentials file and scopes, which Google Calendar API calls
+        are executed with.
+        """
+
+        # Ensure shared credentials are loaded and fresh
+        entry = self._get_entry(credentials_dir, scopes)
+        credentials = entry['credentials']
+
+        if entry.get('http_pool') is None:
+            import httplib2
+            import google_auth_httplib2
+            with entry['lock']:
+                if entry.get('http_pool') is None:
+                    entry['http_pool'] = HttpPool(
+                        lambda: google_auth_httplib2.AuthorizedHttp(
+                            credentials, http=httplib2.Http(timeout=self.timeout)),
+                        self.pool_size)
+
+        return entry['http_pool']
+
+    def get_credentials(self, credentials_dir, scopes):
+        """
+        Returns shared credentials for input credentials file and scopes,
+        loading them from disk the first time and refreshing their token if
+        it is missing or about to expire.
+        """
+
+        return self._get_entry(credentials_dir, scopes)['credentials']
+
+    def _get_entry(self, credentials_dir, scopes):
+        """
+        Returns cache entry of input credentials file and scopes, loading
+        credentials and refreshing their token as in get_credentials.
+        """
+
+        key = self.make_key(credentials_dir, scopes)
+
+        with self._lock:
+            entry = self._credentials.get(key)
+            if entry is None:
+                entry = {
+                    'credentials': self.credentials_factory(credentials_dir,
+                                                            list(scopes)),
+                    'lock': threading.Lock()
+                }
+                self._credentials[key] = entry
+
+        credentials = entry['credentials']
+
+        # Refresh token ahead of expiry so in-flight requests never have to
+        if self._needs_refresh(credentials):
+            with entry['lock']:
+
+                # Another thread may have refreshed while we were waiting
+                if self._needs_refresh(credentials):
+                    import httplib2
+                    import google_auth_httplib2
+                    credentials.refresh(
+                        google_auth_httplib2.Request(httplib2.Http()))
+                    with self._lock:
+                        self._refreshes += 1
+
+        return entry
+
+    def _needs_refresh(self, credentials):
+        """Whether input credentials' token is missing or about to expire."""
+
+        if not credentials.token or credentials.expiry is None:
+            return True
+
+        # google-auth stores expiry as a naive UTC datetime
+        margin = datetime.timedelta(seconds=self.REFRESH_MARGIN_SECONDS)
+        return credentials.expiry - margin <= datetime.datetime.utcnow()
+
+    def stats(self):
+        """
+        Returns dict containing cache hit, miss, and refresh counters, and the
+        number of HTTP connections created and reused.
+        """
+
+        with self._lock:
+            pools = [entry['http_pool'].stats() for entry in
+                     self._credentials.values() if entry.get('http_pool')]
+            return {'hits': self._hits, 'misses': self._misses,
+                    'refreshes': self._refreshes,
+                    'credentials': len(self._credentials),
+                    'connections': sum(pool['created'] for pool in pools),
+                    'connections_reused': sum(pool['reused'] for pool in pools)}
+
+    def clear(self):
+        """
+        Drops all cached credentials, Resource objects, and HTTP connections.
+        They are rebuilt the next time they are requested.
+        """
+
+        with self._lock:
+            self._credentials.clear()
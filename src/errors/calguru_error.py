@@ -4,5 +4,12 @@
 class CalGuruError(Exception):
     """Any custom error thrown by CalGuru when some check is failed."""
 
-    def __init__(self, message):
+    # HTTP status of response to request that raised error
+    status = 400
+
+    def __init__(self, message, errors=None):
         self.message = message
+
+        # Optional list of dicts describing each item's error when several
+        # items of a request failed the check
+        self.errors = errors
@@ -24,3 +24,54 @@ class MissingEventFields(GoogleCalendarError):
     """
 
     pass
+
+
+class InvalidEventAttendees(GoogleCalendarError):
+    """
+    There was an attempt to create an event whose attendees aren't a list of
+    emails.
+    """
+
+    pass
+
+
+class InvalidEventChanges(GoogleCalendarError):
+    """
+    There was an attempt to update an event without an id, without changes,
+    or with changes to unsupported fields.
+    """
+
+    pass
+
+
+class InvalidEventIds(GoogleCalendarError):
+    """
+    There was an attempt to delete events whose ids aren't a list, or with
+    an id that isn't a string.
+    """
+
+    pass
+
+
+class EventNotFound(GoogleCalendarError):
+    """An event that doesn't exist, or was deleted, was requested."""
+
+    status = 404
+
+
+class MirrorNotReady(GoogleCalendarError):
+    """
+    A read needed the local event mirror, but it isn't enabled or hasn't
+    finished its first sync.
+    """
+
+    status = 503
+
+
+class EventConflict(GoogleCalendarError):
+    """
+    There was an attempt to create an event overlapping existing events while
+    conflicts are rejected.
+    """
+
+    status = 409
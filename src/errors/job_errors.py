@@ -0,0 +1,15 @@
+"""Background job errors."""
+
+from src.errors.calguru_error import CalGuruError
+
+
+class JobError(CalGuruError):
+    """All background job errors."""
+
+    pass
+
+
+class JobNotFound(JobError):
+    """No job with the requested id exists (or it has expired)."""
+
+    status = 404
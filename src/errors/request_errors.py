@@ -0,0 +1,36 @@
+"""Errors in how clients use CalGuru's endpoints."""
+
+from src.errors.calguru_error import CalGuruError
+
+
+class RequestError(CalGuruError):
+    """All request errors."""
+
+    pass
+
+
+class IdempotencyKeyReused(RequestError):
+    """
+    An idempotency key was sent again with a different request than the one
+    it was first used with.
+    """
+
+    status = 422
+
+
+class InvalidParameter(RequestError):
+    """A query parameter has a value the endpoint doesn't support."""
+
+    pass
+
+
+class InvalidBody(RequestError):
+    """A request body couldn't be parsed."""
+
+    pass
+
+
+class BodyTooLarge(RequestError):
+    """A request body is larger than CalGuru accepts."""
+
+    status = 413
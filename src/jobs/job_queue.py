@@ -0,0 +1,109 @@
+"""Background queue for creating Google Calendar events."""
+
+import queue
+import threading
+import time
+import uuid
+from src.api.gcal_api import GoogleCalendarApi
+from src.errors.job_errors import JobNotFound
+
+
+class EventJobQueue(object):
+    """
+    Queue of event creation jobs, drained by a pool of worker threads into
+    GoogleCalendarApi.batch_create_events.
+
+    Jobs run in partial mode, so a finished job's results report the outcome
+    of every event. Job state lives in a JobStore.
+    """
+
+    # Number of seconds finished jobs are kept before being deleted
+    JOB_TTL_SECONDS = 24 * 60 * 60
+
+    def __init__(self, store, workers=2):
+        """
+        :param store: JobStore that holds job state.
+        :param workers: Number of worker threads processing jobs.
+        """
+
+        self.store = store
+        self.workers = workers
+
+        # Jobs waiting for a worker, as (job id, event dicts, kwargs) tuples
+        self._queue = queue.Queue()
+
+        # Worker threads are started on first submission
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, event_dicts, **kwargs):
+        """
+        Queues job creating input events and returns the new job.
+
+        :param event_dicts: List of event dicts, as accepted by
+           GoogleCalendarApi.batch_create_events.
+        :param kwargs: Other arguments passed to batch_create_events.
+        :return: Dict of queued job, as described in JobStore.
+        """
+
+        # Drop old finished jobs so the store doesn't grow without bound
+        self.store.delete_before(time.time() - self.JOB_TTL_SECONDS)
+
+        job = self.store.create(uuid.uuid4().hex, len(event_dicts))
+        self._start_workers()
+        self._queue.put((job['id'], event_dicts, kwargs))
+        return job
+
+    def get(self, job_id):
+        """
+        Returns job with input id. Throws job_errors.JobNotFound if there is
+        no such job.
+        """
+
+        job = self.store.get(job_id)
+        if job is None:
+            raise JobNotFound("No job with id %s exists." % job_id)
+        return job
+
+    def _start_workers(self):
+        """Starts worker threads if they aren't running yet."""
+
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, daemon=True,
+                                          name='calguru-job-worker')
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        """Processes queued jobs forever. Runs on a worker thread."""
+
+        while True:
+            job_id, event_dicts, kwargs = self._queue.get()
+            try:
+                self._run(job_id, event_dicts, kwargs)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id, event_dicts, kwargs):
+        """Creates events of job with input id and stores the outcome."""
+
+        self.store.update(job_id, status='running')
+
+        def report_progress(completed, _):
+            self.store.update(job_id, completed=completed)
+
+        try:
+            results = GoogleCalendarApi.batch_create_events(
+                event_dicts, partial=True, on_progress=report_progress, **kwargs)
+        except Exception as err:
+            self.store.update(job_id, status='failed', error=str(err))
+            return
+
+        self.store.update(job_id, status='succeeded', completed=len(results),
+                          results=results)
+
+    def join(self):
+        """Blocks until every queued job has been processed."""
+
+        self._queue.join()
@@ -0,0 +1,141 @@
+"""Storage of background job state."""
+
+import json
+import sqlite3
+import threading
+import time
+
+
+class JobStore(object):
+    """
+    Interface for storing background jobs. Jobs are dicts with these keys:
+       'id': Unique job id.
+       'status': One of 'queued', 'running', 'succeeded', or 'failed'.
+       'total': Number of items job processes.
+       'completed': Number of items whose outcome is known.
+       'results': List of per-item results once job has succeeded, else None.
+       'error': Error message if job has failed, else None.
+       'created': UTC timestamp of job creation.
+       'updated': UTC timestamp of job's last update.
+
+    Implementations must be safe to use from multiple threads.
+    """
+
+    def create(self, job_id, total):
+        """Stores and returns new queued job with input id and item count."""
+
+        raise NotImplementedError
+
+    def update(self, job_id, **fields):
+        """Updates input fields of job with input id."""
+
+        raise NotImplementedError
+
+    def get(self, job_id):
+        """Returns job with input id, or None if no such job exists."""
+
+        raise NotImplementedError
+
+    def delete_before(self, timestamp):
+        """Deletes finished jobs last updated before input UTC timestamp."""
+
+        raise NotImplementedError
+
+    @staticmethod
+    def new_job(job_id, total):
+        """Returns dict of new queued job."""
+
+        now = time.time()
+        return {'id': job_id, 'status': 'queued', 'total': total,
+                'completed': 0, 'results': None, 'error': None,
+                'created': now, 'updated': now}
+
+
+class MemoryJobStore(JobStore):
+    """Stores jobs in a dict; jobs are lost when the process exits."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def create(self, job_id, total):
+        job = self.new_job(job_id, total)
+        with self._lock:
+            self._jobs[job_id] = job
+        return dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields, updated=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def delete_before(self, timestamp):
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job['status'] in ('succeeded', 'failed') and
+                           job['updated'] < timestamp]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Stores jobs in a SQLite database, so jobs outlive the process and can be
+    shared by several processes using the same database file.
+    """
+
+    def __init__(self, path=':memory:'):
+        """
+        :param path: Location of SQLite database file. Defaults to an
+           in-memory database.
+        """
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, status TEXT, total INTEGER, '
+            'completed INTEGER, results TEXT, error TEXT, created REAL, '
+            'updated REAL)')
+
+    def create(self, job_id, total):
+        job = self.new_job(job_id, total)
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job['id'], job['status'], job['total'], job['completed'],
+                 None, None, job['created'], job['updated']))
+        return job
+
+    def update(self, job_id, **fields):
+        fields['updated'] = time.time()
+        if 'results' in fields:
+            fields['results'] = json.dumps(fields['results'])
+        columns = ', '.join('%s = ?' % column for column in fields)
+        with self._lock:
+            self._conn.execute('UPDATE jobs SET %s WHERE id = ?' % columns,
+                               list(fields.values()) + [job_id])
+
+    def get(self, job_id):
+        with self._lock:
+            cursor = self._conn.execute(
+                'SELECT id, status, total, completed, results, error, created, '
+                'updated FROM jobs WHERE id = ?', (job_id,))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        job = dict(zip(('id', 'status', 'total', 'completed', 'results',
+                        'error', 'created', 'updated'), row))
+        if job['results'] is not None:
+            job['results'] = json.loads(job['results'])
+        return job
+
+    def delete_before(self, timestamp):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') "
+                "AND updated < ?", (timestamp,))
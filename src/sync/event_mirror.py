@@ -0,0 +1,282 @@
+"""Local mirror of a Google Calendar, kept up to date incrementally."""
+
+import json
+import sqlite3
+import threading
+from src.api.gcal_api import GoogleCalendarApi
+from src.utils.metrics import CalGuruMetrics
+
+
+class EventMirror(object):
+    """
+    Copy of every event in a Google Calendar, stored in SQLite.
+
+    The mirror is filled by a full sync and then updated incrementally with
+    Google's sync tokens, so each sync only fetches events changed since the
+    last one. When Google no longer accepts the sync token (410 Gone), the
+    mirror falls back to a full sync.
+
+    Every change is numbered with an increasing sequence number, so clients
+    can ask for changes since the last sequence number they saw. Deleted
+    events are kept as 'cancelled' tombstones for that purpose.
+    """
+
+    def __init__(self, calendar_id=None, path=':memory:'):
+        """
+        :param calendar_id: Id of mirrored calendar. Defaults to
+           GoogleCalendarApi.calendar_id.
+        :param path: Location of SQLite database file. Defaults to an
+           in-memory database.
+        """
+
+        self.calendar_id = calendar_id or GoogleCalendarApi.calendar_id
+
+        # Guards _conn; sqlite3 connections can't be used concurrently
+        self._lock = threading.Lock()
+
+        # Only one sync runs at a time
+        self._sync_lock = threading.Lock()
+
+        # Background sync thread and the event stopping it
+        self._thread = None
+        self._stop = threading.Event()
+
+        # Message of error the last background sync failed with, or None if
+        # it succeeded
+        self.last_error = None
+
+        self._conn = sqlite3.connect(path, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS events ('
+            'id TEXT PRIMARY KEY, status TEXT, start_ts REAL, end_ts REAL, '
+            'search TEXT, body TEXT, seq INTEGER);'
+            'CREATE INDEX IF NOT EXISTS events_seq ON events (seq);'
+            'CREATE INDEX IF NOT EXISTS events_start ON events (start_ts);'
+            'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);')
+
+    def _get_meta(self, key, default=None):
+        """Returns stored metadata value of input key. Lock must be held."""
+
+        row = self._conn.execute('SELECT value FROM meta WHERE key = ?',
+                                 (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        """Stores metadata value of input key. Lock must be held."""
+
+        self._conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                           (key, value))
+
+    @property
+    def sync_token(self):
+        """Google sync token of last sync, or None if never synced."""
+
+        with self._lock:
+            return self._get_meta('sync_token')
+
+    @property
+    def seq(self):
+        """Sequence number of latest change."""
+
+        with self._lock:
+            return int(self._get_meta('seq', 0))
+
+    def is_ready(self, calendar_id=None):
+        """
+        Whether mirror has been synced and mirrors input calendar (defaults to
+        GoogleCalendarApi.calendar_id), so reads can be served from it.
+        """
+
+        return (calendar_id or GoogleCalendarApi.calendar_id) == self.calendar_id \
+            and self.sync_token is not None
+
+    def apply(self, events):
+        """
+        Stores input Google Calendar event resources, replacing earlier
+        versions. Events with status 'cancelled' become tombstones.
+        """
+
+        with self._lock:
+            self._apply(events)
+
+    def _apply(self, events):
+        """
+        Stores input events in a single transaction, and updates interval
+        index of mirrored calendar with them. Lock must be held.
+        """
+
+        GoogleCalendarApi.index_events(events, self.calendar_id)
+
+        seq = int(self._get_meta('seq', 0))
+        self._conn.execute('BEGIN')
+        try:
+            for event in events:
+                seq += 1
+                search = ' '.join(event.get(key) or '' for key in
+                                  ('summary', 'description', 'location')).lower()
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (event['id'], event.get('status'),
+                     GoogleCalendarApi.get_event_timestamp(event.get('start')),
+                     GoogleCalendarApi.get_event_timestamp(event.get('end')), search,
+                     json.dumps(event), seq))
+            self._set_meta('seq', str(seq))
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+
+    def remove(self, ids):
+        """Turns events with input ids into 'cancelled' tombstones."""
+
+        self.apply([{'id': event_id, 'status': 'cancelled'} for event_id in ids])
+
+    def sync(self):
+        """
+        Fetches events changed since last sync from Google and stores them.
+        Runs a full sync if mirror has never been synced or Google rejects
+        the sync token.
+
+        :return: Number of changed events fetched.
+        """
+
+        with self._sync_lock:
+            sync_token = self.sync_token
+            if sync_token:
+                try:
+                    return self._sync(sync_token)
+                except Exception as err:
+
+                    # Sync token expired or invalidated; start over
+                    if GoogleCalendarApi.retry_policy.get_status(err) != 410:
+                        raise
+
+            return self._sync(None)
+
+    def _sync(self, sync_token):
+        """
+        Stores every page of events changed since input sync token, or of all
+        events if it is None. In a full sync, events that are no longer in
+        the calendar become tombstones.
+        """
+
+        # Events listed by full sync
+        seen_ids = set()
+        count = 0
+        next_sync_token = None
+
+        # Events stored after this point may be newer than the full sync's
+        # listing, so they are never treated as stale
+        start_seq = self.seq
+
+        for page in GoogleCalendarApi.list_event_pages(sync_token,
+                                                       self.calendar_id):
+            events = page.get('items', [])
+            count += len(events)
+            if sync_token is None:
+                seen_ids.update(event['id'] for event in events)
+            with self._lock:
+                self._apply(events)
+            next_sync_token = page.get('nextSyncToken') or next_sync_token
+
+        with self._lock:
+
+            # Events deleted while mirror wasn't being updated incrementally
+            if sync_token is None:
+                stale_ids = [row[0] for row in self._conn.execute(
+                    "SELECT id FROM events WHERE status IS NOT 'cancelled' "
+                    "AND seq <= ?", (start_seq,)) if row[0] not in seen_ids]
+                self._apply([{'id': event_id, 'status': 'cancelled'}
+                             for event_id in stale_ids])
+
+            self._set_meta('sync_token', next_sync_token)
+
+        return count
+
+    def get(self, event_id):
+        """
+        Returns stored event with input id, or None if it isn't stored or has
+        been deleted.
+        """
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM events WHERE id = ? AND status IS NOT 'cancelled'",
+                (event_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, time_min=None, time_max=None, q=None):
+        """
+        Returns list of stored events ending after time_min and starting
+        before time_max (UTC timestamps), whose summary, description, or
+        location contain q, ordered by start time.
+        """
+
+        clauses = ["status IS NOT 'cancelled'"]
+        params = []
+        if time_min is not None:
+            clauses.append('end_ts > ?')
+            params.append(time_min)
+        if time_max is not None:
+            clauses.append('start_ts < ?')
+            params.append(time_max)
+        if q:
+            clauses.append('instr(search, ?) > 0')
+            params.append(q.lower())
+
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT body FROM events WHERE %s ORDER BY start_ts, id'
+                % ' AND '.join(clauses), params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def changes(self, since=0, limit=1000):
+        """
+        Returns (events, seq) tuple, where events is a list of at most limit
+        events changed after input sequence number, in order of change
+        (deleted events have status 'cancelled'), and seq is the sequence
+        number to ask for next.
+        """
+
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT body, seq FROM events WHERE seq > ? ORDER BY seq LIMIT ?',
+                (since, limit)).fetchall()
+            seq = rows[-1][1] if rows else max(since, int(self._get_meta('seq', 0)))
+        return [json.loads(row[0]) for row in rows], seq
+
+    def start(self, interval=60):
+        """
+        Starts background thread syncing mirror every input number of
+        seconds. Sync errors are retried at the next interval; until then,
+        the error is kept in last_error and counted in CalGuruMetrics.
+        """
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.sync()
+                except Exception as err:
+
+                    # Google may be unreachable; mirror stays as it is until
+                    # next sync succeeds
+                    self.last_error = '%s: %s' % (type(err).__name__, err)
+                    CalGuruMetrics.mirror_syncs.inc(status='failed')
+                else:
+                    self.last_error = None
+                    CalGuruMetrics.mirror_syncs.inc(status='succeeded')
+                self._stop.wait(interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, daemon=True,
+                                        name='calguru-event-mirror')
+        self._thread.start()
+
+    def stop(self):
+        """Stops background sync thread."""
+
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
@@ -1,14 +1,40 @@
 """Methods commonly used across REST API calls."""
 
 from bottle import response
-import bson
-from bson import json_util
+from src.api.event_normalizer import EventNormalizer
 from src.errors.calguru_error import CalGuruError
+from src.errors.request_errors import BodyTooLarge, InvalidBody, InvalidParameter
+from src.utils.json_codecs import JsonCodec
+from src.utils.metrics import CalGuruMetrics
+
+
+class APIResult(object):
+    """
+    Data returned by an API endpoint together with the HTTP status of its
+    successful response, for endpoints that don't respond with 200.
+    """
+
+    def __init__(self, data=None, status=200):
+        self.data = data
+        self.status = status
 
 
 class APIUtils(object):
     """Class for implementing API utility methods."""
 
+    # Codec for request and response bodies. Set to
+    # src.utils.json_codecs.ExtendedJsonCodec for MongoDB extended json.
+    codec = JsonCodec
+
+    # Maximum size of request bodies in bytes
+    MAX_BODY_SIZE = 64 * 1024 * 1024
+
+    # Number of bytes of request body read at a time
+    BODY_CHUNK_SIZE = 64 * 1024
+
+    # Maximum size of a single line of a streamed request body in bytes
+    MAX_LINE_SIZE = 1024 * 1024
+
     @staticmethod
     def api_decorator(func):
         """
@@ -24,7 +50,10 @@ class APIUtils(object):
 
             # Try the function and return to success
             try:
-                return APIUtils.success(func(*args, **kwargs))
+                result = func(*args, **kwargs)
+                if isinstance(result, APIResult):
+                    return APIUtils.success(result.data, result.status)
+                return APIUtils.success(result)
 
             # Except any errors and call failure
             except Exception as err:
@@ -33,17 +62,18 @@ class APIUtils(object):
         return make_request
 
     @staticmethod
-    def success(data=None):
+    def success(data=None, status=200):
         """ Method for returning successful API request."""
 
         # Dictionary to be returned
         ret = {'status': 'success', 'data': data}
 
-        # Set response status
-        response.status = 200
+        # Set response status and type
+        response.status = status
+        response.content_type = APIUtils.codec.content_type
 
         # Return ret as json
-        return bson.json_util.dumps(ret)
+        return APIUtils.codec.dumps(ret)
 
     @staticmethod
     def failure(error):
@@ -53,9 +83,14 @@ class APIUtils(object):
         if isinstance(error, CalGuruError):
             ret = {'status': 'error', 'message': error.message}
 
+            # Every failed item, when several items of request failed check
+            if error.errors:
+                ret['errors'] = error.errors
+
             # We know application has failed a check and thrown a custom error;
-            # set response status for client making a bad request
-            response.status = 400
+            # set response status for client making a bad request (or the
+            # error's own status, e.g. 404)
+            response.status = error.status
 
         else:
             ret = {'status': 'error', 'message': str(error)}
@@ -64,10 +99,226 @@ class APIUtils(object):
             response.status = 500
 
         # Return error as json
-        return bson.json_util.dumps(ret)
+        response.content_type = APIUtils.codec.content_type
+        return APIUtils.codec.dumps(ret)
+
+    @staticmethod
+    def stream_ndjson(items):
+        """
+        Method for returning API request whose items are streamed as
+        newline-delimited json (one json document per line) while they are
+        produced.
+
+        Items are pulled from input iterable before the response starts, up
+        to its first item, so errors raised by it before anything is sent
+        still become a failed API request.
+        """
+
+        # Marks that input iterable has no items
+        empty = object()
+
+        items = iter(items)
+        try:
+            first = next(items, empty)
+        except Exception as err:
+            return APIUtils.failure(err)
+
+        response.status = 200
+        response.content_type = 'application/x-ndjson'
+
+        def lines():
+            if first is empty:
+                return
+            yield APIUtils.codec.dumps(first) + b'\n'
+            for item in items:
+                yield APIUtils.codec.dumps(item) + b'\n'
+
+        return lines()
 
     @staticmethod
     def get_body(data):
-        """Method to decode and return request body."""
+        """
+        Method to decode and return request body.
+
+        Body is read in chunks of BODY_CHUNK_SIZE bytes into a bytearray,
+        which codec parses without copying it. Throws
+        request_errors.BodyTooLarge as soon as more than MAX_BODY_SIZE bytes
+        are sent, and request_errors.InvalidBody if body can't be parsed.
+        """
+
+        with CalGuruMetrics.body_parse_seconds.time():
+
+            # Reject oversized bodies before reading them when size is declared
+            if not data.chunked and data.content_length > APIUtils.MAX_BODY_SIZE:
+                raise BodyTooLarge("Request body is larger than %d bytes."
+                                   % APIUtils.MAX_BODY_SIZE)
+
+            body = bytearray()
+            for chunk in APIUtils._iter_body_chunks(data):
+                body += chunk
+                if len(body) > APIUtils.MAX_BODY_SIZE:
+                    raise BodyTooLarge("Request body is larger than %d bytes."
+                                       % APIUtils.MAX_BODY_SIZE)
+
+            try:
+                return APIUtils.codec.loads(body)
+            except ValueError as err:
+                raise InvalidBody("Request body couldn't be parsed: %s" % err)
+
+    @staticmethod
+    def _iter_body_chunks(data):
+        """
+        Method to iterate over chunks of at most BODY_CHUNK_SIZE bytes of
+        request body, as they are received.
+
+        Unless Bottle has already buffered the body, it's read straight from
+        the client, so callers can limit its size: Bottle buffers whole
+        bodies, including chunked ones of any size, before returning them.
+        """
+
+        if 'bottle.request.body' in data.environ:
+            body = data.body
+            return iter(lambda: body.read(APIUtils.BODY_CHUNK_SIZE), b'')
+
+        stream = data.environ['wsgi.input']
+        if data.chunked:
+            return APIUtils._iter_chunked(stream)
+
+        def read_chunks(remaining):
+            while remaining > 0:
+                chunk = stream.read(min(remaining, APIUtils.BODY_CHUNK_SIZE))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+        return read_chunks(max(0, data.content_length))
+
+    @staticmethod
+    def _iter_chunked(stream):
+        """
+        Method to iterate over chunks of a request body sent with chunked
+        transfer encoding, decoding it from input stream. Throws
+        request_errors.InvalidBody if body isn't properly chunked.
+        """
+
+        error = InvalidBody("Request body isn't properly chunked.")
+        while True:
+            header = stream.readline(APIUtils.BODY_CHUNK_SIZE)
+            if not header.endswith(b'\n'):
+                raise error
+            try:
+                size = int(header.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise error
+            if size < 0:
+                raise error
+            if size == 0:
+                return
+
+            while size > 0:
+                chunk = stream.read(min(size, APIUtils.BODY_CHUNK_SIZE))
+                if not chunk:
+                    raise error
+                size -= len(chunk)
+                yield chunk
+
+            if stream.read(2) != b'\r\n':
+                raise error
+
+    @staticmethod
+    def get_bool_query(data, name, default=False):
+        """
+        Method to return boolean query parameter of request. "true", "1", and
+        "yes" are true; any other given value is false.
+        """
+
+        value = data.query.get(name)
+        if value is None:
+            return default
+        return value.lower() in ('true', '1', 'yes')
+
+    @staticmethod
+    def get_int_query(data, name, default, minimum=0):
+        """
+        Method to return integer query parameter of request. Throws
+        request_errors.InvalidParameter if given value isn't an integer of at
+        least minimum.
+        """
+
+        value = data.query.get(name)
+        if not value:
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            value = None
+        if value is None or value < minimum:
+            raise InvalidParameter("%s must be an integer of at least %d."
+                                   % (name, minimum))
+        return value
+
+    @staticmethod
+    def get_time_query(data, name):
+        """
+        Method to return UTC timestamp or RFC3339 string query parameter of
+        request as UTC timestamp, or None if it isn't given. Throws
+        request_errors.InvalidParameter if given value is neither, or is out
+        of the range of Google Calendar times.
+        """
+
+        value = data.query.get(name)
+        if not value:
+            return None
+        try:
+            timestamp = float(value)
+        except ValueError:
+            import arrow
+            try:
+                timestamp = arrow.get(value).timestamp
+            except (ValueError, arrow.parser.ParserError):
+                timestamp = None
+        if timestamp is None or not \
+                EventNormalizer.MIN_TIMESTAMP <= timestamp < EventNormalizer.MAX_TIMESTAMP:
+            raise InvalidParameter("%s must be a UTC timestamp or RFC3339 string."
+                                   % name)
+        return timestamp
+
+    @staticmethod
+    def etag_matches(header, etag):
+        """
+        Method to return whether If-None-Match (or If-Match) header value
+        matches input etag. Weak etags match their strong counterparts.
+        """
+
+        if not header or not etag:
+            return False
+        tags = [tag.strip() for tag in header.split(',')]
+        return '*' in tags or etag.replace('W/', '', 1) in \
+            [tag.replace('W/', '', 1) for tag in tags]
+
+    @staticmethod
+    def iter_body_lines(data):
+        """
+        Method to iterate over non-empty lines of request body, as bytes,
+        while it is being received. Unlike get_body, the body's total size
+        isn't limited; throws request_errors.BodyTooLarge once a single line
+        is longer than MAX_LINE_SIZE bytes.
+        """
+
+        chunks = APIUtils._iter_body_chunks(data)
+
+        # Incomplete last line of chunks read so far
+        rest = b''
+        for chunk in chunks:
+            lines = (rest + chunk).split(b'\n')
+            rest = lines.pop()
+            if len(rest) > APIUtils.MAX_LINE_SIZE:
+                raise BodyTooLarge("Request body line is larger than %d bytes."
+                                   % APIUtils.MAX_LINE_SIZE)
+            for line in lines:
+                if line.strip():
+                    yield line
 
-        return bson.json_util.loads(data.body.read().decode('utf-8'))
+        if rest.strip():
+            yield rest
@@ -0,0 +1,108 @@
+"""In-memory index of event time intervals for overlap queries."""
+
+import threading
+from bisect import bisect_left
+
+
+class IntervalIndex(object):
+    """
+    Thread-safe index of half-open [start, end) intervals, each identified by
+    an id, answering overlap queries without calling Google.
+
+    Intervals are kept in arrays sorted by start, alongside a running maximum
+    of their ends. An interval [s, e) overlaps some indexed interval iff the
+    largest end among intervals starting before e is after s, so whether a
+    time range is busy takes O(log n). Listing overlapping intervals walks
+    back from there only while the running maximum is after s.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        # (start, id) of every interval, sorted, and their ends in same order
+        self._keys = []
+        self._ends = []
+
+        # Maps id to (start, end)
+        self._intervals = {}
+
+        # Running maximum of _ends; rebuilt lazily after changes
+        self._max_ends = []
+        self._dirty = False
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
+
+    def add(self, interval_id, start, end):
+        """Adds or replaces interval with input id."""
+
+        with self._lock:
+            self._remove(interval_id)
+            position = bisect_left(self._keys, (start, interval_id))
+            self._keys.insert(position, (start, interval_id))
+            self._ends.insert(position, end)
+            self._intervals[interval_id] = (start, end)
+            self._dirty = True
+
+    def remove(self, interval_id):
+        """Removes interval with input id, if it's indexed."""
+
+        with self._lock:
+            self._remove(interval_id)
+
+    def _remove(self, interval_id):
+        """Removes interval with input id. Lock must be held."""
+
+        interval = self._intervals.pop(interval_id, None)
+        if interval is None:
+            return
+        position = bisect_left(self._keys, (interval[0], interval_id))
+        del self._keys[position]
+        del self._ends[position]
+        self._dirty = True
+
+    def _get_max_ends(self):
+        """Returns running maximum of ends, rebuilding it if needed. Lock must be held."""
+
+        if self._dirty:
+            max_ends = []
+            running_max = None
+            for end in self._ends:
+                if running_max is None or end > running_max:
+                    running_max = end
+                max_ends.append(running_max)
+            self._max_ends = max_ends
+            self._dirty = False
+        return self._max_ends
+
+    def is_busy(self, start, end):
+        """Whether any indexed interval overlaps [start, end)."""
+
+        with self._lock:
+            position = bisect_left(self._keys, (end,))
+            return position > 0 and self._get_max_ends()[position - 1] > start
+
+    def overlaps(self, start, end):
+        """Returns list of ids of indexed intervals overlapping [start, end)."""
+
+        with self._lock:
+            max_ends = self._get_max_ends()
+            overlapping = []
+            position = bisect_left(self._keys, (end,)) - 1
+            while position >= 0 and max_ends[position] > start:
+                if self._ends[position] > start:
+                    overlapping.append(self._keys[position][1])
+                position -= 1
+            overlapping.reverse()
+            return overlapping
+
+    def clear(self):
+        """Removes every interval."""
+
+        with self._lock:
+            self._keys = []
+            self._ends = []
+            self._intervals = {}
+            self._max_ends = []
+            self._dirty = False
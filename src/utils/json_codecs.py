@@ -0,0 +1,60 @@
+"""Codecs for encoding and decoding request and response bodies."""
+
+import json
+
+# orjson is faster than the standard library's json module, but isn't
+# required; without it JsonCodec uses json.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonCodec(object):
+    """
+    Plain json codec. Parses bytes directly, without decoding them to a str
+    first, and encodes to bytes. Values json doesn't support (e.g. datetimes)
+    are encoded as strings.
+    """
+
+    content_type = 'application/json'
+
+    @staticmethod
+    def loads(data):
+        """Returns object parsed from input json bytes or bytearray."""
+
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+    @staticmethod
+    def dumps(obj):
+        """Returns input object encoded as json bytes."""
+
+        if orjson is not None:
+            return orjson.dumps(obj, default=str)
+        return json.dumps(obj, default=str, separators=(',', ':')).encode('utf-8')
+
+
+class ExtendedJsonCodec(object):
+    """
+    MongoDB extended json codec (bson.json_util), which round-trips types
+    such as dates and ObjectIds through special objects like {"$date": ...}.
+    Slower than JsonCodec since it runs object hooks on every dict.
+    """
+
+    content_type = 'application/json'
+
+    @staticmethod
+    def loads(data):
+        """Returns object parsed from input extended json bytes or bytearray."""
+
+        from bson import json_util
+        return json_util.loads(data.decode('utf-8'))
+
+    @staticmethod
+    def dumps(obj):
+        """Returns input object encoded as extended json bytes."""
+
+        from bson import json_util
+        return json_util.dumps(obj).encode('utf-8')
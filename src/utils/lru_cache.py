@@ -0,0 +1,67 @@
+"""Bounded in-memory cache with LRU eviction and TTL expiry."""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """
+    Thread-safe cache holding at most max_size entries, each for at most ttl
+    seconds. Once full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_size, ttl):
+        """
+        :param max_size: Maximum number of entries held.
+        :param ttl: Number of seconds an entry is held after being set.
+        """
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        # Maps key to (expiry time, value), least recently used first
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """Returns value of input key, or default if it's missing or expired."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            # Entry has expired; drop it
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        """Sets value of input key, evicting least recently used entries."""
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Removes input key and returns its value, or default if missing."""
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        """Removes every entry."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,295 @@
+"""Counters and histograms exposed in Prometheus text format."""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+class Metric(object):
+    """
+    Base class of metrics whose values are aggregated per thread.
+
+    Each thread updates its own shard without taking a lock, so recording a
+    value costs a couple of dict operations. Shards are only combined when
+    the metric is collected; shards of threads that have exited are folded
+    into a single retired shard then, and whenever RETIRE_INTERVAL new
+    shards have been added, so short-lived threads don't pile up even if
+    metrics are never collected.
+    """
+
+    type_name = None
+
+    # Number of shards added between folding in shards of exited threads
+    RETIRE_INTERVAL = 64
+
+    def __init__(self, name, help_text, label_names=()):
+        """
+        :param name: Metric name, e.g. 'calguru_events_created_total'.
+        :param help_text: Description of metric.
+        :param label_names: Names of labels every value is recorded with.
+        """
+
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+
+        # Guards _shards and _retired, but not shard contents
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        # (thread, shard) of every thread that has recorded a value
+        self._shards = []
+
+        # Combined shard of threads that have exited
+        self._retired = {}
+
+        # Number of shards added since shards of exited threads were folded
+        self._added = 0
+
+    def _get_shard(self):
+        """Returns calling thread's shard, mapping label values to values."""
+
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._added += 1
+                if self._added >= self.RETIRE_INTERVAL:
+                    self._retire()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire(self):
+        """
+        Folds shards of threads that have exited into the retired shard.
+        Lock must be held.
+        """
+
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+        self._added = 0
+
+    def _get_key(self, labels):
+        """Returns tuple of input labels' values, in order of label_names."""
+
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def collect(self):
+        """Returns dict mapping label values to values summed across threads."""
+
+        with self._lock:
+            self._retire()
+
+            total = {}
+            self._merge(total, self._retired)
+            for _, shard in self._shards:
+                self._merge(total, dict(shard))
+        return total
+
+    def _merge(self, total, shard):
+        """Adds values of input shard to total."""
+
+        raise NotImplementedError
+
+    def render(self):
+        """Returns lines of metric in Prometheus text format."""
+
+        lines = ['# HELP %s %s' % (self.name, self.help_text),
+                 '# TYPE %s %s' % (self.name, self.type_name)]
+        for key, value in sorted(self.collect().items()):
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        """Returns lines of input value with input label values."""
+
+        raise NotImplementedError
+
+    def _format_labels(self, key, extra=()):
+        """Returns Prometheus label set of input label values."""
+
+        pairs = list(zip(self.label_names, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{%s}' % ','.join(
+            '%s="%s"' % (name, value.replace('\\', '\\\\').replace('"', '\\"')
+                         .replace('\n', '\\n'))
+            for name, value in pairs)
+
+
+class Counter(Metric):
+    """Monotonically increasing count, e.g. of created events."""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """Increases count of input labels by input amount."""
+
+        shard = self._get_shard()
+        key = self._get_key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def get(self, **labels):
+        """Returns count of input labels."""
+
+        return self.collect().get(self._get_key(labels), 0)
+
+    def _merge(self, total, shard):
+        for key, value in shard.items():
+            total[key] = total.get(key, 0) + value
+
+    def _render_value(self, key, value):
+        return ['%s%s %s' % (self.name, self._format_labels(key), value)]
+
+
+class Histogram(Metric):
+    """Distribution of observed values, e.g. latencies, in buckets."""
+
+    type_name = 'histogram'
+
+    # Upper bounds of buckets in seconds
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                       2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        Metric.__init__(self, name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """Records input value with input labels."""
+
+        shard = self._get_shard()
+        key = self._get_key(labels)
+
+        # [count per bucket (last one unbounded), sum, count]
+        entry = shard.get(key)
+        if entry is None:
+            entry = shard[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Context manager observing number of seconds its block takes."""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get(self, **labels):
+        """Returns (sum, count) of values observed with input labels."""
+
+        entry = self.collect().get(self._get_key(labels))
+        return (entry[1], entry[2]) if entry else (0.0, 0)
+
+    def _merge(self, total, shard):
+        for key, (counts, value_sum, count) in shard.items():
+            entry = total.get(key)
+            if entry is None:
+                entry = total[key] = [[0] * len(counts), 0.0, 0]
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += value_sum
+            entry[2] += count
+
+    def _render_value(self, key, value):
+        counts, value_sum, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += bucket_count
+            lines.append('%s_bucket%s %d' % (
+                self.name, self._format_labels(key, [('le', str(bound))]),
+                cumulative))
+        lines.append('%s_sum%s %s' % (self.name, self._format_labels(key),
+                                      repr(value_sum)))
+        lines.append('%s_count%s %d' % (self.name, self._format_labels(key),
+                                        count))
+        return lines
+
+
+class MetricsRegistry(object):
+    """Set of metrics rendered together."""
+
+    # Content type of Prometheus text format
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, label_names=()):
+        """Returns new Counter registered in this registry."""
+
+        return self._register(Counter(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(),
+                  buckets=Histogram.DEFAULT_BUCKETS):
+        """Returns new Histogram registered in this registry."""
+
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Returns every metric in Prometheus text format."""
+
+        return '\n'.join(line for metric in self._metrics
+                         for line in metric.render()) + '\n'
+
+
+class CalGuruMetrics(object):
+    """Metrics recorded by CalGuru, exposed at GET /metrics."""
+
+    registry = MetricsRegistry()
+
+    body_parse_seconds = registry.histogram(
+        'calguru_body_parse_seconds',
+        'Time to read and parse a json request body.')
+
+    normalize_seconds = registry.histogram(
+        'calguru_normalize_seconds',
+        'Time to validate and convert the events of a create request.')
+
+    service_build_seconds = registry.histogram(
+        'calguru_service_build_seconds',
+        'Time to build a Google Calendar API Resource object.')
+
+    google_request_seconds = registry.histogram(
+        'calguru_google_request_seconds',
+        'Round-trip time of a request to Google Calendar API.', ('kind',))
+
+    event_cache = registry.counter(
+        'calguru_event_cache_total',
+        'Number of event reads by cache outcome (hit, revalidated, stale, or '
+        'miss).',
+        ('result',))
+
+    events_created = registry.counter(
+        'calguru_events_created_total', 'Number of events created.')
+
+    retries = registry.counter(
+        'calguru_retries_total', 'Number of Google Calendar API calls retried.')
+
+    google_errors = registry.counter(
+        'calguru_google_errors_total',
+        'Number of failed Google Calendar API calls by error reason.',
+        ('reason',))
+
+    digests = registry.counter(
+        'calguru_digests_total',
+        'Number of attendee digests of created events by outcome.', ('status',))
+
+    mirror_syncs = registry.counter(
+        'calguru_mirror_syncs_total',
+        'Number of background syncs of the local event mirror by outcome.',
+        ('status',))
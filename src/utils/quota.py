@@ -0,0 +1,268 @@
+"""Rate limiting of Google Calendar API calls shared across processes."""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class QuotaStore(object):
+    """
+    Storage of token buckets shared by every CalGuru worker using it.
+    Subclass to coordinate workers through another backend (e.g. Redis).
+    """
+
+    def try_acquire(self, bucket, waiter_id, worker, tokens, rate, capacity):
+        """
+        Takes input number of tokens from input bucket for input waiter if
+        it's the waiter's turn and enough tokens are available; otherwise
+        queues the waiter.
+
+        :param bucket: Name of bucket, e.g. a service account's email.
+        :param waiter_id: Unique id of this acquisition.
+        :param worker: Id of worker acquiring tokens.
+        :param tokens: Number of tokens to take.
+        :param rate: Number of tokens refilled per second.
+        :param capacity: Maximum number of tokens bucket can hold.
+        :return: 0 if tokens were taken, otherwise number of seconds to wait
+           before trying again.
+        """
+
+        raise NotImplementedError
+
+    def cancel(self, waiter_id):
+        """Removes input waiter from its bucket's queue."""
+
+        raise NotImplementedError
+
+    def pause(self, bucket, seconds):
+        """Blocks every worker's acquisitions from bucket for input seconds."""
+
+        raise NotImplementedError
+
+    def usage(self, bucket, rate, capacity):
+        """
+        Returns dict of input bucket's state: available 'tokens', seconds it's
+        'paused_for', number of 'waiting' acquisitions, and tokens taken by
+        each worker in the last USAGE_WINDOW seconds under 'workers'.
+        """
+
+        raise NotImplementedError
+
+
+class SqliteQuotaStore(QuotaStore):
+    """
+    QuotaStore in a SQLite database file, shared by workers on one host.
+
+    Acquisitions queue in the database, and the next one served is that of
+    the worker that took the fewest tokens in the last USAGE_WINDOW seconds,
+    so busy workers can't starve others of the quota. Waiters that stop
+    polling (e.g. of a killed worker) are dropped after STALE_SECONDS.
+    """
+
+    # Number of seconds of grants kept for fair sharing and usage reports
+    USAGE_WINDOW = 60
+
+    # Number of seconds after which a waiter that stopped polling is dropped
+    STALE_SECONDS = 5
+
+    # Maximum number of seconds a queued waiter sleeps between polls
+    POLL_SECONDS = 0.05
+
+    def __init__(self, path):
+        """
+        :param path: Path of SQLite database file, created if missing.
+        """
+
+        self.path = path
+        self._local = threading.local()
+        with self._transaction() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, '
+                'tokens REAL NOT NULL, updated REAL NOT NULL, '
+                'paused_until REAL NOT NULL)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS waiters (id TEXT PRIMARY KEY, '
+                'bucket TEXT NOT NULL, worker TEXT NOT NULL, '
+                'since REAL NOT NULL, seen REAL NOT NULL)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS grants (bucket TEXT NOT NULL, '
+                'worker TEXT NOT NULL, time REAL NOT NULL, tokens REAL NOT NULL)')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS grants_bucket_time ON grants (bucket, time)')
+
+    def _get_connection(self):
+        """Returns calling thread's connection to database."""
+
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+        return connection
+
+    def _transaction(self):
+        """
+        Returns context manager running its block in a write transaction, so
+        workers update buckets one at a time.
+        """
+
+        store = self
+
+        class Transaction(object):
+            def __enter__(self):
+                self.connection = store._get_connection()
+                self.connection.execute('BEGIN IMMEDIATE')
+                return self.connection
+
+            def __exit__(self, exc_type, exc, traceback):
+                self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+        return Transaction()
+
+    def _refill(self, connection, bucket, rate, capacity, now):
+        """
+        Returns (tokens, paused_until) of input bucket after refilling it,
+        creating it full if missing. Transaction must be open.
+        """
+
+        row = connection.execute(
+            'SELECT tokens, updated, paused_until FROM buckets WHERE name = ?',
+            (bucket,)).fetchone()
+        if row is None:
+            tokens, paused_until = float(capacity), 0.0
+            connection.execute('INSERT INTO buckets VALUES (?, ?, ?, ?)',
+                               (bucket, tokens, now, paused_until))
+            return tokens, paused_until
+
+        tokens = min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+        connection.execute('UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?',
+                           (tokens, now, bucket))
+        return tokens, row[2]
+
+    def try_acquire(self, bucket, waiter_id, worker, tokens, rate, capacity):
+        now = time.time()
+        with self._transaction() as connection:
+            available, paused_until = self._refill(connection, bucket, rate,
+                                                   capacity, now)
+
+            # Queue waiter, keeping its place if it was already queued
+            connection.execute('DELETE FROM waiters WHERE seen < ?',
+                               (now - self.STALE_SECONDS,))
+            connection.execute(
+                'INSERT INTO waiters VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET seen = excluded.seen',
+                (waiter_id, bucket, worker, now, now))
+
+            # Waiter of the worker with the least recent usage goes next
+            next_waiter = connection.execute(
+                'SELECT waiters.id FROM waiters LEFT JOIN '
+                '(SELECT worker, SUM(tokens) AS used FROM grants '
+                ' WHERE bucket = ? AND time >= ? GROUP BY worker) AS usage '
+                'ON usage.worker = waiters.worker WHERE waiters.bucket = ? '
+                'ORDER BY COALESCE(usage.used, 0), waiters.since, waiters.id '
+                'LIMIT 1',
+                (bucket, now - self.USAGE_WINDOW, bucket)).fetchone()[0]
+
+            # Requests for more tokens than capacity wait for a full bucket
+            # and leave it in debt, as with TokenBucket
+            needed = min(tokens, capacity)
+            if next_waiter != waiter_id:
+                return max(paused_until - now, self.POLL_SECONDS)
+            if now < paused_until or available < needed:
+                return min(max(paused_until - now, (needed - available) / rate),
+                           self.STALE_SECONDS / 2.0)
+
+            connection.execute('UPDATE buckets SET tokens = ? WHERE name = ?',
+                               (available - tokens, bucket))
+            connection.execute('DELETE FROM waiters WHERE id = ?', (waiter_id,))
+            connection.execute('INSERT INTO grants VALUES (?, ?, ?, ?)',
+                               (bucket, worker, now, tokens))
+            connection.execute('DELETE FROM grants WHERE bucket = ? AND time < ?',
+                               (bucket, now - self.USAGE_WINDOW))
+            return 0
+
+    def cancel(self, waiter_id):
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM waiters WHERE id = ?', (waiter_id,))
+
+    def pause(self, bucket, seconds):
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO buckets VALUES (?, 0, ?, 0)', (bucket, now))
+            connection.execute(
+                'UPDATE buckets SET paused_until = MAX(paused_until, ?) '
+                'WHERE name = ?', (now + seconds, bucket))
+
+    def usage(self, bucket, rate, capacity):
+        now = time.time()
+        with self._transaction() as connection:
+            tokens, paused_until = self._refill(connection, bucket, rate,
+                                                capacity, now)
+            waiting = connection.execute(
+                'SELECT COUNT(*) FROM waiters WHERE bucket = ? AND seen >= ?',
+                (bucket, now - self.STALE_SECONDS)).fetchone()[0]
+            workers = dict(connection.execute(
+                'SELECT worker, SUM(tokens) FROM grants WHERE bucket = ? '
+                'AND time >= ? GROUP BY worker ORDER BY worker',
+                (bucket, now - self.USAGE_WINDOW)).fetchall())
+        return {'tokens': tokens, 'paused_for': max(0.0, paused_until - now),
+                'waiting': waiting, 'workers': workers}
+
+
+class SharedTokenBucket(object):
+    """
+    Token bucket whose tokens are shared by every worker using the same
+    QuotaStore, so workers calling Google with the same service account
+    together stay under its quota. Has the interface of TokenBucket, so it
+    can be used wherever GoogleCalendarApi uses one.
+    """
+
+    def __init__(self, name, rate, capacity, store, worker=None):
+        """
+        :param name: Name of shared bucket, e.g. a service account's email.
+        :param rate: Number of tokens refilled per second, across workers.
+        :param capacity: Maximum number of tokens bucket can hold.
+        :param store: QuotaStore holding bucket.
+        :param worker: Optional id of this worker in usage reports. Defaults
+           to host name and process id.
+        """
+
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.store = store
+        self.worker = worker or '%s:%d' % (socket.gethostname(), os.getpid())
+
+    def acquire(self, tokens=1):
+        """Takes input number of tokens, blocking until it's this worker's turn."""
+
+        waiter_id = uuid.uuid4().hex
+        try:
+            while True:
+                wait = self.store.try_acquire(self.name, waiter_id, self.worker,
+                                              tokens, self.rate, self.capacity)
+                if not wait:
+                    return
+                time.sleep(wait)
+        except BaseException:
+            self.store.cancel(waiter_id)
+            raise
+
+    def pause(self, seconds):
+        """
+        Blocks every worker's acquisitions for input number of seconds, e.g.
+        after Google responds with a rate limit error.
+        """
+
+        self.store.pause(self.name, seconds)
+
+    def usage(self):
+        """Returns dict of bucket's rate, capacity, and current usage."""
+
+        return dict(self.store.usage(self.name, self.rate, self.capacity),
+                    name=self.name, rate=self.rate, capacity=self.capacity,
+                    shared=True)
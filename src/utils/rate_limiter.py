@@ -0,0 +1,87 @@
+"""Client-side rate limiting of Google Calendar API calls."""
+
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens refill continuously at rate tokens per second, up to capacity
+    tokens. Acquiring more tokens than are available blocks until enough have
+    refilled, so callers are smoothed to the sustained rate while short bursts
+    of up to capacity tokens go through immediately.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        :param rate: Number of tokens refilled per second.
+        :param capacity: Maximum number of tokens bucket can hold.
+        """
+
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+
+        # Guards _tokens, _updated, and _paused_until
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+        # Monotonic time before which no tokens are handed out
+        self._paused_until = 0.0
+
+    def _refill(self, now):
+        """Adds tokens refilled since last update. Lock must be held."""
+
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """
+        Takes input number of tokens from bucket, blocking until they are
+        available.
+
+        Requests for more tokens than capacity wait for a full bucket and then
+        leave it in debt, which later callers wait out.
+        """
+
+        # Number of tokens that must be in bucket before taking them
+        needed = min(tokens, self.capacity)
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now >= self._paused_until and self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+
+                # Time until pause ends and enough tokens have refilled
+                wait = max(self._paused_until - now,
+                           (needed - self._tokens) / self.rate)
+
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Blocks all acquisitions for input number of seconds, e.g. after Google
+        responds with a rate limit error and Retry-After header.
+        """
+
+        with self._lock:
+            self._paused_until = max(self._paused_until,
+                                     time.monotonic() + seconds)
+
+    def usage(self):
+        """Returns dict of bucket's rate, capacity, and current usage."""
+
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return {'rate': self.rate, 'capacity': self.capacity,
+                    'tokens': self._tokens,
+                    'paused_for': max(0.0, self._paused_until - now),
+                    'shared': False}
@@ -0,0 +1,197 @@
+"""Concurrent WSGI servers for running CalGuru in production."""
+
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import make_server, WSGIRequestHandler, WSGIServer
+from bottle import ServerAdapter
+
+
+class ThreadPoolWSGIServer(WSGIServer):
+    """
+    wsgiref server handling requests on a fixed pool of threads, instead of
+    one at a time. Every thread shares one Google Calendar API Resource
+    object per service account, and takes a connection from its HttpPool
+    for each call (see GoogleServiceCache).
+    """
+
+    # Number of threads handling requests
+    threads = 8
+
+    def __init__(self, *args, **kwargs):
+        WSGIServer.__init__(self, *args, **kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=self.threads,
+                                            thread_name_prefix='calguru-http')
+
+    def process_request(self, request, client_address):
+        """Hands request to a pool thread."""
+
+        self._executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        """Handles request on a pool thread, as ThreadingMixIn does."""
+
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        """Stops accepting connections, then waits for in-flight requests."""
+
+        WSGIServer.server_close(self)
+        self._executor.shutdown(wait=True)
+
+
+class QuietHandler(WSGIRequestHandler):
+    """wsgiref request handler without reverse DNS lookups."""
+
+    def address_string(self):
+        return self.client_address[0]
+
+
+class ThreadedWSGIRefServer(ServerAdapter):
+    """
+    Bottle adapter for ThreadPoolWSGIServer. Needs nothing beyond the
+    standard library, but closes the connection after every request; use
+    WaitressServer for keep-alive.
+
+    Options:
+       threads: Number of threads handling requests. Defaults to 8.
+    """
+
+    def run(self, handler):
+        threads = self.options.get('threads', ThreadPoolWSGIServer.threads)
+
+        class Server(ThreadPoolWSGIServer):
+            pass
+        Server.threads = threads
+
+        class Handler(QuietHandler):
+            def log_request(handler_self, *args, **kwargs):
+                if not self.quiet:
+                    QuietHandler.log_request(handler_self, *args, **kwargs)
+
+        server = self.srv = make_server(self.host, self.port, handler, Server,
+                                        Handler)
+
+        # Stop serving on SIGTERM; shutdown() blocks until serve_forever
+        # returns, so it's called from another thread
+        on_signal(lambda: threading.Thread(target=server.shutdown).start())
+
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+
+class WaitressServer(ServerAdapter):
+    """
+    Bottle adapter for waitress, a multi-threaded server supporting HTTP/1.1
+    keep-alive. On SIGTERM, the server stops accepting connections and keeps
+    serving open ones until queued and in-flight requests are done, for at
+    most shutdown_timeout seconds.
+
+    waitress hands a request to the app only once its whole body has been
+    received, so bodies can't be processed while they're uploaded (e.g. by
+    POST /gcal/events:stream); use ThreadedWSGIRefServer for that.
+
+    Options:
+       shutdown_timeout: Seconds to wait for requests on shutdown. Defaults
+          to waiting until they're done.
+    Other options are passed to waitress.create_server, e.g.:
+       threads: Number of threads handling requests. Defaults to 8.
+       channel_timeout: Seconds an idle keep-alive connection is kept open.
+       max_request_body_size: Largest request body accepted, in bytes.
+          Defaults to 1 GB.
+    """
+
+    # Seconds between checks for shutdown and for finished requests
+    POLL_SECONDS = 0.1
+
+    def run(self, handler):
+        from waitress import create_server, wasyncore
+
+        options = dict(self.options)
+        shutdown_timeout = options.pop('shutdown_timeout', None)
+        options.setdefault('threads', ThreadPoolWSGIServer.threads)
+        server = self.srv = create_server(handler, host=self.host,
+                                          port=self.port, **options)
+        if not self.quiet:
+            server.print_listen('Serving on http://{}:{}')
+
+        # waitress' own run() cancels queued requests on KeyboardInterrupt
+        # and gives in-flight ones 5 seconds, so the loop is run here instead
+        self._stopping = threading.Event()
+        on_signal(self._stopping.set)
+
+        def poll(timeout):
+            wasyncore.loop(timeout=timeout, map=server._map,
+                           use_poll=server.adj.asyncore_use_poll, count=1)
+
+        try:
+            while not self._stopping.is_set():
+                poll(self.POLL_SECONDS)
+
+            # Stop accepting connections, leaving the trigger waking the
+            # loop when responses are ready
+            wasyncore.dispatcher.close(server)
+
+            deadline = None if shutdown_timeout is None else \
+                time.monotonic() + shutdown_timeout
+            while self._is_busy(server) and \
+                    (deadline is None or time.monotonic() < deadline):
+                poll(self.POLL_SECONDS)
+        finally:
+            server.task_dispatcher.shutdown(timeout=1)
+            wasyncore.close_all(server._map)
+
+    def stop(self):
+        """Shuts server down gracefully, as on SIGTERM."""
+
+        self._stopping.set()
+
+    @staticmethod
+    def _is_busy(server):
+        """
+        Returns whether input waitress server has connections with queued or
+        in-flight requests, or responses not yet sent.
+        """
+
+        return any(getattr(channel, 'requests', None) or
+                   getattr(channel, 'total_outbufs_len', 0)
+                   for channel in list(server._map.values()))
+
+
+def on_signal(callback):
+    """Calls input function when process receives SIGTERM or SIGINT."""
+
+    # Signal handlers can only be installed from the main thread
+    if threading.current_thread() is not threading.main_thread():
+        return
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: callback())
+
+
+# Servers CalGuru can be run with, by name
+SERVERS = {'threaded': ThreadedWSGIRefServer, 'waitress': WaitressServer}
+
+
+def get_server(name, host, port, **options):
+    """
+    Returns Bottle server adapter of input name: 'threaded', 'waitress', or
+    'auto' (waitress if installed, otherwise threaded).
+    """
+
+    if name == 'auto':
+        try:
+            import waitress
+            name = 'waitress'
+        except ImportError:
+            name = 'threaded'
+
+    return SERVERS[name](host=host, port=port, **options)
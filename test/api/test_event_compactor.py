@@ -0,0 +1,71 @@
+"""Test compaction of repeating events into recurring event series."""
+
+import unittest
+from src.api.event_compactor import EventCompactor
+from src.api.event_normalizer import EventNormalizer
+
+
+class EventCompactorTest(unittest.TestCase):
+    """Test event_compactor.py."""
+
+    # UTC timestamp representing 10am, May 9th, 2018
+    START = 1525860000
+
+    DAY = 24 * 60 * 60
+    WEEK = 7 * DAY
+
+    def compact(self, event_dicts):
+        """Returns (series, remaining) of input valid event dicts."""
+
+        records, _ = EventNormalizer.normalize(event_dicts)
+        return EventCompactor.compact(records, list(range(len(event_dicts))))
+
+    def make_events(self, starts, summary='Standup'):
+        """Returns hour-long event dicts starting at input offsets from START."""
+
+        return [{'summary': summary, 'start': self.START + offset,
+                 'end': self.START + offset + 3600, 'attendees': ['a@b.com']}
+                for offset in starts]
+
+    def test_weekly_series_with_exdates(self):
+        """Test weekly events become one series, with missing weeks excluded."""
+
+        weeks = [0, 1, 2, 4, 5]
+        events = self.make_events([week * self.WEEK for week in reversed(weeks)])
+
+        series, remaining = self.compact(events)
+
+        self.assertEqual(remaining, [])
+        self.assertEqual(len(series), 1)
+        self.assertEqual(series[0].indexes, (4, 3, 2, 1, 0))
+        gcal_event = series[0].record.to_gcal_event()
+        self.assertEqual(gcal_event['recurrence'], [
+            'RRULE:FREQ=WEEKLY;INTERVAL=1;COUNT=6', 'EXDATE:20180530T100000Z'])
+        self.assertEqual(gcal_event['start']['dateTime'], '2018-05-09T10:00:00+00:00')
+        self.assertEqual(series[0].get_instance_ids('abc')[:2],
+                         ['abc_20180509T100000Z', 'abc_20180516T100000Z'])
+
+    def test_daily_interval(self):
+        """Test events every other day become a daily series with an interval."""
+
+        series, _ = self.compact(self.make_events([0, 2 * self.DAY, 4 * self.DAY]))
+
+        self.assertEqual(series[0].record.recurrence,
+                         ['RRULE:FREQ=DAILY;INTERVAL=2;COUNT=3'])
+
+    def test_irregular_events_not_compacted(self):
+        """Test events off cadence, too sparse, or too few are left alone."""
+
+        off_cadence = self.make_events([0, self.DAY, self.DAY + 3600], 'Off')
+        sparse = self.make_events([0, self.DAY, 10 * self.DAY], 'Sparse')
+        few = self.make_events([0, self.WEEK], 'Few')
+        other = self.make_events([0, self.WEEK, 2 * self.WEEK], 'Standup')
+        other[1]['location'] = 'Room 1'
+
+        series, remaining = self.compact(off_cadence + sparse + few + other)
+
+        self.assertEqual(series, [])
+        self.assertEqual(remaining, list(range(11)))
+
+    if __name__ == "__main__":
+        unittest.main()
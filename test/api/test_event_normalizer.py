@@ -0,0 +1,137 @@
+"""Test bulk validation and conversion of events."""
+
+import unittest
+from unittest import mock
+import arrow
+from src.api import event_normalizer
+from src.api.event_normalizer import EventNormalizer
+from src.api.gcal_api import GoogleCalendarApi
+import src.errors.gcal_errors as gcal_errors
+
+
+class EventNormalizerTest(unittest.TestCase):
+    """Test event_normalizer.py."""
+
+    # UTC timestamp representing 10am, May 9th, 2018
+    START = 1525860000
+
+    def make_events(self, count):
+        """Returns count valid event dicts, with every third one invalid."""
+
+        events = []
+        for index in range(count):
+            event = {'summary': 'Event %d' % index, 'start': self.START + index,
+                     'end': self.START + index + 60, 'attendees': ['a@b.com']}
+            if index % 3 == 1:
+                del event['summary']
+            elif index % 3 == 2:
+                event['end'] = event['start']
+            events.append(event)
+        return events
+
+    def test_reports_every_error(self):
+        """Test every invalid event is reported with its index."""
+
+        records, errors = EventNormalizer.normalize(self.make_events(6))
+
+        self.assertEqual(sorted(errors), [1, 2, 4, 5])
+        self.assertIsInstance(errors[1], gcal_errors.MissingEventFields)
+        self.assertIsInstance(errors[2], gcal_errors.InvalidEventTime)
+        self.assertEqual(records[3].to_gcal_event(), {
+            'summary': 'Event 3',
+            'start': {'dateTime': '2018-05-09T10:00:03+00:00', 'timeZone': 'UTC'},
+            'end': {'dateTime': '2018-05-09T10:01:03+00:00', 'timeZone': 'UTC'},
+            'attendees': [{'email': 'a@b.com'}]})
+
+        with self.assertRaises(gcal_errors.MissingEventFields) as context:
+            GoogleCalendarApi.normalize_events(self.make_events(6))
+        self.assertEqual([error['index'] for error in context.exception.errors],
+                         [1, 2, 4, 5])
+
+    def test_invalid_attendees(self):
+        """Test events whose attendees aren't a list of emails are reported."""
+
+        events = self.make_events(4)
+        events[0]['attendees'] = 'a@b.com'
+        events[3]['attendees'] = ['a@b.com', {'email': 'c@d.com'}]
+
+        records, errors = EventNormalizer.normalize(events)
+
+        self.assertEqual(sorted(errors), [0, 1, 2, 3])
+        self.assertIsInstance(errors[0], gcal_errors.InvalidEventAttendees)
+        self.assertIsInstance(errors[3], gcal_errors.InvalidEventAttendees)
+        self.assertEqual(records, [None] * 4)
+
+    def test_record_compact(self):
+        """Test records hold int timestamps and share interned attendee emails."""
+
+        records, _ = EventNormalizer.normalize([
+            {'summary': 'A', 'start': float(self.START), 'end': self.START + 60,
+             'attendees': [''.join(['a@', 'b.com'])]},
+            {'summary': 'B', 'start': self.START, 'end': self.START + 60,
+             'attendees': [''.join(['a@b', '.com'])], 'location': ''}])
+
+        self.assertIsInstance(records[0].start, int)
+        self.assertIs(records[0].attendees[0], records[1].attendees[0])
+        self.assertFalse(hasattr(records[0], '__dict__'))
+        self.assertNotIn('location', records[1].to_gcal_event())
+
+    def test_normalize_changes(self):
+        """Test only changed fields are converted, and invalid changes reported."""
+
+        gcal_changes, errors = EventNormalizer.normalize_changes([
+            {'start': self.START, 'location': None},
+            {'start': self.START, 'end': self.START},
+            {'colorId': '5'},
+            {},
+            {'end': 'tomorrow'},
+            {'attendees': ['a@b.com']},
+            {'attendees': 'a@b.com'},
+            {'attendees': None}])
+
+        self.assertEqual(gcal_changes[0], {
+            'start': {'dateTime': '2018-05-09T10:00:00+00:00', 'timeZone': 'UTC'},
+            'location': None})
+        self.assertEqual(gcal_changes[5], {'attendees': [{'email': 'a@b.com'}]})
+        self.assertEqual(gcal_changes[7], {'attendees': []})
+        self.assertEqual(sorted(errors), [1, 2, 3, 4, 6])
+        self.assertIsInstance(errors[1], gcal_errors.InvalidEventTime)
+        self.assertIsInstance(errors[2], gcal_errors.InvalidEventChanges)
+        self.assertIsInstance(errors[3], gcal_errors.InvalidEventChanges)
+        self.assertIsInstance(errors[4], gcal_errors.InvalidEventTime)
+        self.assertIsInstance(errors[6], gcal_errors.InvalidEventChanges)
+
+    def test_numpy_matches_pure_python(self):
+        """Test NumPy and pure Python paths give the same results."""
+
+        events = self.make_events(200)
+        events[0]['start'] = self.START + 0.25
+        events[3]['start'] = 'not a timestamp'
+
+        with_numpy = EventNormalizer.normalize(events)
+        with mock.patch.object(event_normalizer, 'numpy', None):
+            without_numpy = EventNormalizer.normalize(events)
+
+        self.assertEqual([record and record.to_gcal_event() for record in with_numpy[0]],
+                         [record and record.to_gcal_event()
+                          for record in without_numpy[0]])
+        self.assertEqual(sorted(with_numpy[1]), sorted(without_numpy[1]))
+        self.assertEqual(with_numpy[0][0].to_gcal_event()['start']['dateTime'],
+                         arrow.get(self.START + 0.25).isoformat('T'))
+
+        # Whole timestamps are formatted the same either way
+        timestamps = [self.START + index * 3600 for index in range(100)]
+        with_numpy = EventNormalizer.format_rfc3339(timestamps)
+        with mock.patch.object(event_normalizer, 'numpy', None):
+            self.assertEqual(EventNormalizer.format_rfc3339(timestamps), with_numpy)
+
+        # Years before 1000 are zero-padded either way
+        timestamps = [-40000000000] * EventNormalizer.NUMPY_MIN_EVENTS
+        self.assertEqual(EventNormalizer.format_rfc3339(timestamps)[0],
+                         '0702-06-15T00:53:20+00:00')
+        with mock.patch.object(event_normalizer, 'numpy', None):
+            self.assertEqual(EventNormalizer.format_rfc3339(timestamps)[0],
+                             '0702-06-15T00:53:20+00:00')
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,440 @@
+"""Test batching of Google Calendar API calls without calling Google."""
+
+import socket
+import unittest
+from unittest import mock
+from googleapiclient.errors import HttpError
+from src.api.gcal_api import GoogleCalendarApi
+from src.api.gcal_http_pool import HttpPool
+from src.api.gcal_notifications import DigestSender, NotificationPolicy
+from src.api.gcal_retry import RetryPolicy
+from src.sync.event_mirror import EventMirror
+from src.utils.lru_cache import TTLCache
+from src.utils.rate_limiter import TokenBucket
+import src.errors.gcal_errors as gcal_errors
+from test.test_helpers.fake_gcal_service import FakeBatch, FakeService, \
+    make_http_error
+from test.test_helpers.test_utils import TestUtils
+
+
+class GoogleCalendarBatchingTest(unittest.TestCase):
+    """Test batch execution in gcal_api.py against a fake Resource object."""
+
+    def setUp(self):
+        """Executed before each test."""
+
+        # Every thread gets the same fake Resource object, and calls are
+        # executed with placeholder connections
+        self.service = FakeService()
+        self.http_pool = HttpPool(object)
+        patch_service = mock.patch.object(
+            GoogleCalendarApi, 'get_service', return_value=self.service)
+        patch_pool = mock.patch.object(
+            GoogleCalendarApi, 'get_http_pool', return_value=self.http_pool)
+        for patch in (patch_service, patch_pool):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        # Keep retry and rate limit waits short
+        patch_retry = mock.patch.object(
+            GoogleCalendarApi, 'retry_policy',
+            RetryPolicy(max_retries=3, base_delay=0.001, max_delay=0.01))
+        patch_limiter = mock.patch.object(
+            GoogleCalendarApi, 'rate_limiter', TokenBucket(rate=10000, capacity=1000))
+        patch_indexes = mock.patch.object(GoogleCalendarApi, 'interval_indexes', {})
+        patch_cache = mock.patch.object(GoogleCalendarApi, 'event_cache',
+                                        TTLCache(max_size=100, ttl=60))
+        for patch in (patch_retry, patch_limiter, patch_indexes, patch_cache):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def fail_first_attempts(self, failures, error):
+        """
+        Makes calls for events whose summaries are keys of failures fail with
+        input error as many times as their values specify.
+        """
+
+        calendar_handler = self.service.handler
+
+        def handler(request):
+            summary = request.kwargs['body']['summary']
+            if failures.get(summary, 0) > 0:
+                failures[summary] -= 1
+                return None, error
+            return calendar_handler(request)
+
+        self.service.handler = handler
+
+    @staticmethod
+    def make_events(count):
+        """Returns count valid event dicts with summaries '0', '1', ..."""
+
+        return [{'summary': str(index),
+                 'start': 1525860000 + index * TestUtils.HOURS_MILLIS,
+                 'end': 1525860000 + (index + 1) * TestUtils.HOURS_MILLIS}
+                for index in range(count)]
+
+    def test_chunked_in_input_order(self):
+        """Test large inputs are split into batches and results keep input order."""
+
+        events_info = GoogleCalendarApi.batch_create_events(
+            self.make_events(23), batch_size=5, max_concurrency=3)
+
+        self.assertEqual(sorted(self.service.batch_sizes), [3, 5, 5, 5, 5])
+        self.assertEqual([info['summary'] for info in events_info],
+                         [str(index) for index in range(23)])
+        self.assertEqual(events_info[4]['link'], 'link-id-4')
+
+        # Batch requests share at most max_concurrency pooled connections
+        self.assertLessEqual(self.http_pool.stats()['created'], 3)
+        self.assertEqual(self.http_pool.stats()['created'] +
+                         self.http_pool.stats()['reused'], 5)
+
+    def test_empty_input(self):
+        """Test no batch request is sent when there are no events."""
+
+        self.assertEqual(GoogleCalendarApi.batch_create_events([]), [])
+        self.assertEqual(self.service.batch_sizes, [])
+
+    def test_retry_failed_calls_only(self):
+        """Test only calls that failed with retryable errors are resent."""
+
+        self.fail_first_attempts({'1': 2, '3': 1},
+                                 make_http_error(403, 'rateLimitExceeded'))
+
+        events_info = GoogleCalendarApi.batch_create_events(self.make_events(4))
+
+        self.assertEqual([info['summary'] for info in events_info],
+                         ['0', '1', '2', '3'])
+        self.assertEqual(self.service.batch_sizes, [4, 2, 1])
+
+    def fail_batches(self, errors):
+        """
+        Makes batch requests fail as a whole with the errors in input list,
+        in order, without executing their calls; None lets a batch through.
+        """
+
+        execute = FakeBatch.execute
+
+        def fail_batch(batch, **kwargs):
+            error = errors.pop(0) if errors else None
+            if error:
+                raise error
+            return execute(batch, **kwargs)
+
+        patch = mock.patch.object(FakeBatch, 'execute', fail_batch)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_retry_transport_errors(self):
+        """Test batch requests that time out or lose their connection are resent."""
+
+        self.fail_batches([socket.timeout('timed out'),
+                           ConnectionResetError('reset')])
+
+        events_info = GoogleCalendarApi.batch_create_events(self.make_events(3))
+
+        self.assertEqual([info['summary'] for info in events_info], ['0', '1', '2'])
+        self.assertEqual(self.service.batch_sizes, [3])
+        self.assertTrue(RetryPolicy().is_retryable(TimeoutError()))
+
+    def test_no_retry_client_error(self):
+        """Test calls failing with non-retryable errors aren't resent."""
+
+        self.fail_first_attempts({'0': 1}, make_http_error(400, 'invalid'))
+
+        with self.assertRaises(Exception):
+            GoogleCalendarApi.batch_create_events(self.make_events(2))
+        self.assertEqual(self.service.batch_sizes, [2])
+
+    def test_retry_after(self):
+        """Test Retry-After header sets minimum wait before retrying."""
+
+        error = make_http_error(429, 'rateLimitExceeded', {'retry-after': '2'})
+        self.assertEqual(RetryPolicy().get_delay(0, error), 2.0)
+        self.assertTrue(RetryPolicy().is_retryable(make_http_error(503)))
+        self.assertFalse(RetryPolicy().is_retryable(make_http_error(403, 'forbidden')))
+
+    def test_partial(self):
+        """Test partial mode reports each event's outcome by input position."""
+
+        self.fail_first_attempts({'2': 1}, make_http_error(400, 'invalid'))
+        events = self.make_events(4)
+        events[1]['end'] = events[1]['start']
+        events[3]['attendees'] = 'a@b.com'
+
+        items = GoogleCalendarApi.batch_create_events(events, partial=True)
+
+        self.assertEqual([item['index'] for item in items], [0, 1, 2, 3])
+        self.assertEqual([item['status'] for item in items],
+                         ['success', 'error', 'error', 'error'])
+        self.assertEqual(items[1]['reason'], 'InvalidEventTime')
+        self.assertEqual(items[2]['code'], 400)
+        self.assertEqual(items[3]['reason'], 'InvalidEventAttendees')
+        self.assertEqual(items[3]['code'], 400)
+
+    def test_partial_failed_chunk(self):
+        """Test a chunk whose whole batch fails doesn't lose other chunks' events."""
+
+        self.fail_batches([None, ValueError('bad batch')])
+
+        items = GoogleCalendarApi.batch_create_events(
+            self.make_events(4), batch_size=2, max_concurrency=1, partial=True)
+
+        self.assertEqual([item['status'] for item in items],
+                         ['success', 'success', 'error', 'error'])
+        self.assertEqual([item['id'] for item in items[:2]], ['id-0', 'id-1'])
+        self.assertEqual([item['reason'] for item in items[2:]],
+                         ['ValueError', 'ValueError'])
+        self.assertEqual(self.service.batch_sizes, [2])
+
+    def test_idempotency_key(self):
+        """Test retrying with an idempotency key doesn't duplicate events."""
+
+        event_id = GoogleCalendarApi.make_event_id('key', 0)
+        self.assertRegex(event_id, '^[0-9a-v]{52}$')
+        self.assertEqual(event_id, GoogleCalendarApi.make_event_id('key', 0))
+        self.assertNotEqual(event_id, GoogleCalendarApi.make_event_id('key', 1))
+
+        first = GoogleCalendarApi.batch_create_events(
+            self.make_events(3), idempotency_key='key')
+        second = GoogleCalendarApi.batch_create_events(
+            self.make_events(3), idempotency_key='key')
+
+        self.assertEqual(first, second)
+        self.assertEqual(first[0]['id'], event_id)
+        self.assertEqual(len(self.service.stored_events), 3)
+
+    def test_compact(self):
+        """Test repeating events are created with a single recurring event insert."""
+
+        week = 7 * 24 * 60 * 60
+        events = [{'summary': 'Standup', 'start': 1525860000 + index * week,
+                   'end': 1525863600 + index * week} for index in range(52)]
+        events.insert(1, {'summary': 'Lunch', 'start': 1525870800,
+                          'end': 1525874400})
+
+        progress = []
+        events_info = GoogleCalendarApi.batch_create_events(
+            events, compact=True, idempotency_key='key',
+            on_progress=lambda completed, total: progress.append(completed))
+
+        self.assertEqual(len(self.service.calls), 2)
+        series_id = GoogleCalendarApi.make_event_id('key', 0)
+        self.assertEqual(events_info[0]['id'], series_id + '_20180509T100000Z')
+        self.assertEqual(events_info[2]['id'], series_id + '_20180516T100000Z')
+        self.assertEqual(events_info[2]['series_id'], series_id)
+        self.assertNotIn('series_id', events_info[1])
+        self.assertEqual(progress[-1], 53)
+
+        # Every instance is known to conflict checks
+        self.assertEqual(GoogleCalendarApi.get_interval_index().overlaps(
+            1525860000 + 51 * week, 1525860001 + 51 * week),
+            [series_id + '_20190501T100000Z'])
+
+    def test_compact_mirror(self):
+        """Test mirror stores instances of series, not the recurring event."""
+
+        week = 7 * 24 * 60 * 60
+        events = [{'summary': 'Standup', 'start': 1525860000 + index * week,
+                   'end': 1525863600 + index * week} for index in range(4)]
+
+        mirror = EventMirror()
+        with mock.patch.object(GoogleCalendarApi, 'mirror', mirror):
+            events_info = GoogleCalendarApi.batch_create_events(
+                events, compact=True, idempotency_key='key')
+
+        instance_ids = [event_info['id'] for event_info in events_info]
+        series_id = events_info[0]['series_id']
+        self.assertEqual([event['id'] for event in mirror.query()], instance_ids)
+        self.assertIsNone(mirror.get(series_id))
+        self.assertEqual(GoogleCalendarApi.get_interval_index().overlaps(
+            1525860000, 1525860001), instance_ids[:1])
+
+    def test_notification_policies(self):
+        """Test digest and none policies insert silently; digest notifies once."""
+
+        sent = []
+        sender = DigestSender()
+        sender.send = lambda email, events: sent.append((email, len(events)))
+        policy = NotificationPolicy(digest_sender=sender)
+        events = self.make_events(4)
+        for event in events:
+            event['attendees'] = ['a@b.com']
+
+        with mock.patch.object(GoogleCalendarApi, 'notification_policy', policy):
+            GoogleCalendarApi.batch_create_events(events[:2], notifications='digest')
+            GoogleCalendarApi.batch_create_events(events[2:3], notifications='none')
+            GoogleCalendarApi.batch_create_events(events[3:])
+
+        self.assertEqual([call.kwargs['sendNotifications']
+                          for call in self.service.calls], [False, False, False, True])
+        self.assertEqual(sent, [('a@b.com', 2)])
+
+        # Retried inserts don't take notification tokens again
+        self.fail_first_attempts({'1': 2}, make_http_error(429, 'rateLimitExceeded'))
+        with mock.patch.object(policy, 'throttle') as throttle:
+            with mock.patch.object(GoogleCalendarApi, 'notification_policy', policy):
+                GoogleCalendarApi.batch_create_events(self.make_events(2))
+        self.assertEqual(throttle.call_count, 2)
+
+    def test_delete_events(self):
+        """Test deleting events in batches, with missing events counted as deleted."""
+
+        ids = [info['id'] for info in
+               GoogleCalendarApi.batch_create_events(self.make_events(3))]
+
+        items = GoogleCalendarApi.delete_events(ids + ['missing'], batch_size=2)
+
+        self.assertEqual([item['status'] for item in items], ['success'] * 4)
+        self.assertEqual([item['id'] for item in items], ids + ['missing'])
+        self.assertEqual(self.service.stored_events, {})
+
+        # Other errors are reported per id
+        self.service.handler = lambda request: (None, make_http_error(403, 'forbidden'))
+        items = GoogleCalendarApi.delete_events(['forbidden'])
+        self.assertEqual(items[0]['status'], 'error')
+        self.assertEqual(items[0]['code'], 403)
+
+    def test_patch_events(self):
+        """Test patching events sends only changes, honoring etags per event."""
+
+        ids = [info['id'] for info in
+               GoogleCalendarApi.batch_create_events(self.make_events(3))]
+        etag = self.service.get_etag(ids[1])
+
+        items = GoogleCalendarApi.patch_events([
+            {'id': ids[0], 'changes': {'summary': 'Renamed'}},
+            {'id': ids[1], 'changes': {'location': 'Room 1'}, 'etag': etag},
+            {'id': ids[2], 'changes': {'location': 'Room 2'}, 'etag': '"stale"'},
+            {'id': 'missing', 'changes': {'summary': 'Missing'}},
+            {'changes': {'summary': 'No id'}},
+            {'id': ids[0], 'changes': {'color': 'red'}}], batch_size=2)
+
+        self.assertEqual([item['index'] for item in items], list(range(6)))
+        self.assertEqual([item['status'] for item in items],
+                         ['success', 'success', 'error', 'error', 'error', 'error'])
+        self.assertEqual([item.get('code') for item in items[2:]],
+                         [412, 404, 400, 400])
+        self.assertEqual(items[0]['summary'], 'Renamed')
+        self.assertNotEqual(items[1]['etag'], etag)
+        self.assertEqual(self.service.stored_events[ids[1]]['location'], 'Room 1')
+        self.assertNotIn('location', self.service.stored_events[ids[2]])
+
+        # Only changed fields are sent
+        patch_calls = [call for call in self.service.calls if call.method == 'patch']
+        self.assertEqual(patch_calls[0].kwargs['body'], {'summary': 'Renamed'})
+        self.assertEqual(patch_calls[1].headers, {'If-Match': etag})
+
+    def test_get_event_cache(self):
+        """Test event reads are cached, revalidated by etag, and invalidated."""
+
+        event_id = GoogleCalendarApi.batch_create_events(self.make_events(1))[0]['id']
+
+        first = GoogleCalendarApi.get_event(event_id)
+        self.assertIs(GoogleCalendarApi.get_event(event_id), first)
+        gets = [call for call in self.service.calls if call.method == 'get']
+        self.assertEqual(len(gets), 1)
+
+        # Stale entries are revalidated; Google answers 304
+        with mock.patch.object(GoogleCalendarApi, 'EVENT_CACHE_FRESH_SECONDS', 0):
+            self.assertIs(GoogleCalendarApi.get_event(event_id), first)
+        self.assertEqual(self.service.calls[-1].headers,
+                         {'If-None-Match': first['etag']})
+
+        # Stale entries are served while Google fails; without one the
+        # error is raised
+        quota_error = make_http_error(403, 'rateLimitExceeded')
+        with mock.patch.object(GoogleCalendarApi, 'EVENT_CACHE_FRESH_SECONDS', 0), \
+                mock.patch.object(self.service, 'handler',
+                                  lambda request: (None, quota_error)):
+            self.assertIs(GoogleCalendarApi.get_event(event_id), first)
+            self.assertRaises(HttpError, GoogleCalendarApi.get_event, 'uncached')
+
+        # Updates replace entries, and deletes drop them
+        GoogleCalendarApi.patch_events([{'id': event_id,
+                                         'changes': {'summary': 'Renamed'}}])
+        self.assertEqual(GoogleCalendarApi.get_event(event_id)['summary'], 'Renamed')
+        GoogleCalendarApi.delete_events([event_id])
+        self.assertIsNone(GoogleCalendarApi.get_event(event_id))
+
+    def test_get_events(self):
+        """Test getting events in batches, with None for missing events."""
+
+        ids = [info['id'] for info in
+               GoogleCalendarApi.batch_create_events(self.make_events(3))]
+
+        events = GoogleCalendarApi.get_events([ids[2], 'missing', ids[0]])
+
+        self.assertEqual(events[0]['summary'], '2')
+        self.assertIsNone(events[1])
+        self.assertEqual(events[2]['summary'], '0')
+
+    def test_list_events_pages(self):
+        """Test listing events in a time range follows every page."""
+
+        GoogleCalendarApi.batch_create_events(self.make_events(7))
+
+        with mock.patch.object(GoogleCalendarApi, 'LIST_PAGE_SIZE', 2):
+            events = GoogleCalendarApi.list_events(
+                time_min=1525860000 + TestUtils.HOURS_MILLIS,
+                time_max=1525860000 + 6 * TestUtils.HOURS_MILLIS)
+
+            # Pages are only fetched as events are consumed
+            self.assertEqual(next(events)['summary'], '1')
+            self.assertEqual(len(self.service.calls), 7 + 1)
+            self.assertEqual([event['summary'] for event in events],
+                             ['2', '3', '4', '5'])
+
+        self.assertTrue(self.service.calls[-1].kwargs['fields'].startswith(
+            'nextPageToken,items('))
+
+    def test_conflicts(self):
+        """Test events overlapping known events are rejected or flagged."""
+
+        GoogleCalendarApi.batch_create_events(self.make_events(2))
+        overlapping = self.make_events(3)[1:]
+        overlapping[0]['summary'] = 'overlap'
+        overlapping[1]['summary'] = 'free'
+
+        with self.assertRaises(gcal_errors.EventConflict):
+            GoogleCalendarApi.batch_create_events(overlapping, conflicts='reject')
+
+        items = GoogleCalendarApi.batch_create_events(
+            overlapping, conflicts='reject', partial=True)
+        self.assertEqual(items[0]['code'], 409)
+        self.assertEqual(items[1]['status'], 'success')
+
+        # 'free' was created by previous request, so it conflicts now too
+        items = GoogleCalendarApi.batch_create_events(
+            self.make_events(3), conflicts='warn')
+        self.assertEqual([item.get('conflicts') for item in items],
+                         [['id-0'], ['id-1'], ['id-free']])
+
+        self.assertEqual(GoogleCalendarApi.get_free_busy(
+            [{'start': 0, 'end': 1}, overlapping[1]]), [False, True])
+
+    def test_service_accounts_round_robin(self):
+        """Test batch requests are spread across service accounts and calendars kept apart."""
+
+        with mock.patch.object(GoogleCalendarApi, 'service_account_dirs',
+                               ['second.json']), \
+                mock.patch.object(GoogleCalendarApi, 'rate_limiters', {}):
+            GoogleCalendarApi.batch_create_events(
+                self.make_events(8), batch_size=2, max_concurrency=1,
+                calendar_id='other@example.com')
+
+            accounts = [call[0][0] for call in GoogleCalendarApi.get_service.call_args_list]
+            self.assertEqual(sorted(set(accounts)),
+                             sorted([GoogleCalendarApi.service_account_dir,
+                                     'second.json']))
+            self.assertEqual(accounts.count('second.json'), 2)
+            self.assertIn('second.json', GoogleCalendarApi.rate_limiters)
+
+        self.assertEqual({call.kwargs['calendarId'] for call in self.service.calls},
+                         {'other@example.com'})
+        self.assertEqual(len(GoogleCalendarApi.get_interval_index('other@example.com')), 8)
+        self.assertEqual(len(GoogleCalendarApi.get_interval_index()), 0)
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,47 @@
+"""Test pool of reusable HTTP connections."""
+
+import threading
+import unittest
+from src.api.gcal_http_pool import HttpPool
+
+
+class HttpPoolTest(unittest.TestCase):
+    """Test gcal_http_pool.py."""
+
+    def test_bounded(self):
+        """Test threads wait for a connection once every one is in use."""
+
+        pool = HttpPool(object, size=1)
+        first = pool.acquire()
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        thread.start()
+        thread.join(0.05)
+
+        # Only connection is in use
+        self.assertEqual(acquired, [])
+
+        pool.release(first)
+        thread.join()
+        self.assertIs(acquired[0], first)
+        self.assertEqual(pool.stats()['created'], 1)
+
+    def test_failed_factory_frees_slot(self):
+        """Test a connection that couldn't be created doesn't count against size."""
+
+        attempts = []
+
+        def factory():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OSError('unreachable')
+            return object()
+
+        pool = HttpPool(factory, size=1)
+        with self.assertRaises(OSError):
+            pool.acquire()
+        with pool.connection() as http:
+            self.assertIsNotNone(http)
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,80 @@
+"""Test notification policies of created events."""
+
+import time
+import unittest
+from unittest import mock
+from src.api.gcal_notifications import DigestSender, NotificationPolicy, \
+    SmtpDigestSender
+
+
+class RecordingDigestSender(DigestSender):
+    """Digest sender keeping sent digests, failing for input emails."""
+
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.digests = {}
+
+    def send(self, email, events):
+        if email in self.failing:
+            raise IOError('SMTP server unavailable')
+        self.digests[email] = [event['summary'] for event in events]
+
+
+class NotificationPolicyTest(unittest.TestCase):
+    """Test gcal_notifications.py."""
+
+    @staticmethod
+    def make_event(summary, start, emails):
+        """Returns created event resource with input attendees."""
+
+        return {'summary': summary, 'start': {'dateTime': start},
+                'end': {'dateTime': start}, 'htmlLink': 'link-' + summary,
+                'attendees': [{'email': email} for email in emails]}
+
+    def test_send_digests(self):
+        """Test each attendee gets one digest of their events, in start order."""
+
+        sender = RecordingDigestSender(failing=('down@c.com',))
+        policy = NotificationPolicy(digest_sender=sender)
+
+        sent = policy.send_digests([
+            self.make_event('Second', '2018-05-10T10:00:00+00:00',
+                            ['a@b.com', 'down@c.com']),
+            self.make_event('First', '2018-05-09T10:00:00+00:00',
+                            ['A@b.com', 'x@y.com']),
+            self.make_event('Alone', '2018-05-09T10:00:00+00:00', [])])
+
+        self.assertEqual(sent, 2)
+        self.assertEqual(sender.digests, {'a@b.com': ['First', 'Second'],
+                                          'x@y.com': ['First']})
+
+    def test_smtp_session_reused(self):
+        """Test SMTP digests of one call share a connection."""
+
+        policy = NotificationPolicy(digest_sender=SmtpDigestSender('smtp.b.com'))
+        with mock.patch('smtplib.SMTP') as smtp:
+            sent = policy.send_digests([self.make_event(
+                'E', '2018-05-09T10:00:00+00:00', ['a@b.com', 'c@d.com'])])
+
+        self.assertEqual(sent, 2)
+        self.assertEqual(smtp.call_count, 1)
+        self.assertEqual(smtp.return_value.__enter__.return_value
+                         .send_message.call_count, 2)
+
+    def test_throttle_per_domain(self):
+        """Test notifying inserts are throttled per attendee domain only."""
+
+        policy = NotificationPolicy(domain_rate=20, domain_capacity=1)
+        started = time.monotonic()
+        for _ in range(3):
+            policy.throttle(self.make_event('E', '', ['a@b.com', 'c@B.com']))
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+        # Other domains and unthrottled policies don't wait
+        started = time.monotonic()
+        policy.throttle(self.make_event('E', '', ['a@other.com']))
+        NotificationPolicy().throttle(self.make_event('E', '', ['a@b.com'] * 100))
+        self.assertLess(time.monotonic() - started, 0.05)
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,112 @@
+"""Test Google credentials and Resource object cache."""
+
+import datetime
+import threading
+import unittest
+from unittest import mock
+from src.api.gcal_service_cache import GoogleServiceCache
+
+
+class FakeCredentials(object):
+    """Stand-in for service account credentials with a settable expiry."""
+
+    def __init__(self):
+        self.token = None
+        self.expiry = None
+        self.refresh_count = 0
+
+    def refresh(self, _):
+        self.refresh_count += 1
+        self.token = 'token-%d' % self.refresh_count
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+
+class GoogleServiceCacheTest(unittest.TestCase):
+    """Test gcal_service_cache.py."""
+
+    def setUp(self):
+        """Executed before each test."""
+
+        self.cache = GoogleServiceCache()
+        self.credentials = FakeCredentials()
+
+        # Avoid reading credentials from disk and building real Resource objects
+        patch_credentials = mock.patch(
+            'google.oauth2.service_account.Credentials.from_service_account_file',
+            return_value=self.credentials)
+        patch_build = mock.patch(
+            'googleapiclient.discovery.build_from_document',
+            side_effect=lambda *args, **kwargs: object())
+        self.from_file = patch_credentials.start()
+        self.build = patch_build.start()
+        self.addCleanup(patch_credentials.stop)
+        self.addCleanup(patch_build.stop)
+
+    def test_service_reused(self):
+        """Test Resource object and credentials are built once per thread."""
+
+        first = self.cache.get_service('creds.json', ['scope'])
+        second = self.cache.get_service('creds.json', ['scope'])
+
+        self.assertIs(first, second)
+        self.assertEqual(self.from_file.call_count, 1)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+        self.assertEqual(self.cache.stats()['refreshes'], 1)
+
+    def test_service_shared_across_threads(self):
+        """Test threads share Resource object and credentials."""
+
+        main_service = self.cache.get_service('creds.json', ['scope'])
+        thread_services = []
+        thread = threading.Thread(target=lambda: thread_services.append(
+            self.cache.get_service('creds.json', ['scope'])))
+        thread.start()
+        thread.join()
+
+        self.assertIs(main_service, thread_services[0])
+        self.assertEqual(self.from_file.call_count, 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_service_built_from_bundled_document(self):
+        """Test Resource object is built without fetching discovery document."""
+
+        self.cache.get_service('creds.json', ['scope'])
+        self.cache.get_service('other_creds.json', ['scope'])
+
+        document = self.build.call_args[0][0]
+        self.assertEqual(document['name'], 'calendar')
+        self.assertEqual(document['rootUrl'], 'https://www.googleapis.com/')
+        self.assertIs(self.build.call_args_list[0][0][0], document)
+
+    def test_http_pool_reused(self):
+        """Test HTTP connections are pooled per entry and reused."""
+
+        pool = self.cache.get_http_pool('creds.json', ['scope'])
+        self.assertIs(self.cache.get_http_pool('creds.json', ['scope']), pool)
+
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertIs(first.credentials, self.credentials)
+        self.assertEqual(self.cache.stats()['connections'], 1)
+        self.assertEqual(self.cache.stats()['connections_reused'], 1)
+
+    def test_proactive_refresh(self):
+        """Test token is refreshed once it is within the refresh margin."""
+
+        self.cache.get_service('creds.json', ['scope'])
+
+        # Token expires sooner than REFRESH_MARGIN_SECONDS from now
+        self.credentials.expiry = datetime.datetime.utcnow() + \
+            datetime.timedelta(seconds=GoogleServiceCache.REFRESH_MARGIN_SECONDS - 1)
+        self.cache.get_service('creds.json', ['scope'])
+
+        self.assertEqual(self.credentials.refresh_count, 2)
+        self.assertEqual(self.cache.stats()['refreshes'], 2)
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,64 @@
+"""Test local fake Google Calendar API used by benchmarks."""
+
+import unittest
+from unittest import mock
+from bench.fake_gcal_server import FakeCalendarServer
+from bench.run_bench import BenchCredentials
+from src.api.gcal_api import GoogleCalendarApi
+from src.api.gcal_retry import RetryPolicy
+from src.api.gcal_service_cache import GoogleServiceCache
+from src.utils.rate_limiter import TokenBucket
+
+
+class FakeCalendarServerTest(unittest.TestCase):
+    """Test fake_gcal_server.py with real googleapiclient Resource objects."""
+
+    def setUp(self):
+        """Executed before each test."""
+
+        # Some calls fail with 500 or 429 and have to be retried
+        self.fake = FakeCalendarServer(error_rate=0.1, rate_limit_rate=0.05,
+                                       seed=1).start()
+        self.addCleanup(self.fake.stop)
+
+        service_cache = GoogleServiceCache(
+            discovery_url=self.fake.discovery_url,
+            credentials_factory=lambda credentials_dir, scopes: BenchCredentials())
+        for patch in (mock.patch.object(GoogleCalendarApi, 'service_cache',
+                                        service_cache),
+                      mock.patch.object(GoogleCalendarApi, 'retry_policy',
+                                        RetryPolicy(base_delay=0.001, max_delay=0.01)),
+                      mock.patch.object(GoogleCalendarApi, 'rate_limiter',
+                                        TokenBucket(rate=10000, capacity=1000)),
+                      mock.patch.object(GoogleCalendarApi, 'interval_indexes', {})):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_batch_round_trip(self):
+        """Test events are created, read, and deleted through real batch requests."""
+
+        events_info = GoogleCalendarApi.batch_create_events(
+            [{'summary': str(index), 'start': 1525860000 + index * 3600,
+              'end': 1525863600 + index * 3600} for index in range(60)])
+
+        self.assertEqual([info['summary'] for info in events_info],
+                         [str(index) for index in range(60)])
+        self.assertGreater(self.fake.failures, 0)
+        self.assertEqual(len(self.fake.events[GoogleCalendarApi.calendar_id]), 60)
+
+        ids = [info['id'] for info in events_info]
+        self.assertEqual(GoogleCalendarApi.get_events(ids[:2])[1]['summary'], '1')
+
+        # Patches carry If-Match through batch requests
+        etag = self.fake.events[GoogleCalendarApi.calendar_id][ids[0]]['etag']
+        items = GoogleCalendarApi.patch_events([
+            {'id': ids[0], 'changes': {'summary': 'Renamed'}, 'etag': etag},
+            {'id': ids[1], 'changes': {'summary': 'Stale'}, 'etag': '"0"'}])
+        self.assertEqual([item['status'] for item in items], ['success', 'error'])
+        self.assertEqual(items[1]['code'], 412)
+        self.assertEqual(GoogleCalendarApi.get_events(ids[:1])[0]['summary'], 'Renamed')
+        GoogleCalendarApi.delete_events(ids)
+        self.assertEqual(self.fake.events[GoogleCalendarApi.calendar_id], {})
+
+    if __name__ == "__main__":
+        unittest.main()
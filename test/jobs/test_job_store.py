@@ -0,0 +1,42 @@
+"""Test storage of background job state."""
+
+import time
+import unittest
+from src.jobs.job_store import MemoryJobStore, SQLiteJobStore
+
+
+class JobStoreTest(unittest.TestCase):
+    """Test job_store.py."""
+
+    def check_store(self, store):
+        """Test input store creates, updates, gets, and deletes jobs."""
+
+        job = store.create('job-1', 3)
+        self.assertEqual(job['status'], 'queued')
+        self.assertIsNone(store.get('missing'))
+
+        store.update('job-1', status='succeeded', completed=3,
+                     results=[{'index': 0, 'status': 'success'}])
+        job = store.get('job-1')
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['completed'], 3)
+        self.assertEqual(job['results'][0]['status'], 'success')
+
+        # Unfinished jobs are never deleted
+        store.create('job-2', 1)
+        store.delete_before(time.time() + 1)
+        self.assertIsNone(store.get('job-1'))
+        self.assertIsNotNone(store.get('job-2'))
+
+    def test_memory_store(self):
+        """Test MemoryJobStore."""
+
+        self.check_store(MemoryJobStore())
+
+    def test_sqlite_store(self):
+        """Test SQLiteJobStore."""
+
+        self.check_store(SQLiteJobStore())
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,124 @@
+"""Test local mirror of Google Calendar."""
+
+import time
+import unittest
+from unittest import mock
+from src.api.gcal_api import GoogleCalendarApi
+from src.api.gcal_http_pool import HttpPool
+from src.sync.event_mirror import EventMirror
+from src.utils.rate_limiter import TokenBucket
+from test.test_helpers.fake_gcal_service import FakeService, FakeRequest
+from test.test_helpers.test_utils import TestUtils
+
+
+class EventMirrorTest(unittest.TestCase):
+    """Test event_mirror.py against a fake Google Calendar API."""
+
+    def setUp(self):
+        """Executed before each test."""
+
+        # Every thread gets the same fake Resource object, without throttling
+        self.service = FakeService()
+        for patch in (mock.patch.object(GoogleCalendarApi, 'get_service',
+                                        return_value=self.service),
+                      mock.patch.object(GoogleCalendarApi, 'get_http_pool',
+                                        return_value=HttpPool(object)),
+                      mock.patch.object(GoogleCalendarApi, 'rate_limiter',
+                                        TokenBucket(rate=10000, capacity=1000)),
+                      mock.patch.object(GoogleCalendarApi, 'interval_indexes', {})):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.mirror = EventMirror()
+
+    def create_events(self, *summaries):
+        """Creates one hour long events with input summaries, an hour apart."""
+
+        return GoogleCalendarApi.batch_create_events(
+            [{'summary': summary,
+              'start': 1525860000 + index * TestUtils.HOURS_MILLIS,
+              'end': 1525860000 + (index + 1) * TestUtils.HOURS_MILLIS}
+             for index, summary in enumerate(summaries)])
+
+    def delete_in_google(self, event_id):
+        """Deletes event directly in fake Google Calendar, bypassing mirror."""
+
+        FakeRequest(self.service, 'delete', {'eventId': event_id}).execute()
+
+    def test_incremental_sync(self):
+        """Test syncs fetch only changed events and record them as changes."""
+
+        self.create_events('A', 'B', 'C')
+        self.assertEqual(self.mirror.sync(), 3)
+        _, seq = self.mirror.changes()
+
+        # Only the deleted event is fetched by the next sync
+        self.delete_in_google('id-B')
+        self.assertEqual(self.mirror.sync(), 1)
+
+        changes, _ = self.mirror.changes(seq)
+        self.assertEqual([(event['id'], event['status']) for event in changes],
+                         [('id-B', 'cancelled')])
+        self.assertEqual([event['summary'] for event in self.mirror.query()],
+                         ['A', 'C'])
+        self.assertEqual([event['summary'] for event in self.mirror.query(
+            time_min=1525860000 + 2 * TestUtils.HOURS_MILLIS)], ['C'])
+
+    def test_full_resync_on_gone(self):
+        """Test rejected sync token triggers full sync that drops stale events."""
+
+        self.create_events('A', 'B')
+        self.mirror.sync()
+
+        # Sync token expires while an event is deleted
+        self.delete_in_google('id-A')
+        with self.mirror._lock:
+            self.mirror._set_meta('sync_token', 'expired')
+        self.mirror.sync()
+
+        self.assertIsNone(self.mirror.get('id-A'))
+        self.assertEqual(self.mirror.get('id-B')['summary'], 'B')
+        self.assertNotEqual(self.mirror.sync_token, 'expired')
+
+    def test_reads_served_from_mirror(self):
+        """Test GoogleCalendarApi reads from synced mirror and updates it on writes."""
+
+        with mock.patch.object(GoogleCalendarApi, 'mirror', self.mirror):
+            self.create_events('A')
+            self.mirror.sync()
+            calls = len(self.service.calls)
+
+            self.assertEqual(GoogleCalendarApi.get_event('id-A')['summary'], 'A')
+            self.assertEqual([event['summary'] for event in
+                              GoogleCalendarApi.list_events(q='a')], ['A'])
+            self.assertEqual(len(self.service.calls), calls)
+
+            # Created events are mirrored without waiting for a sync
+            self.create_events('X', 'Y')
+            self.assertEqual(self.mirror.get('id-Y')['summary'], 'Y')
+
+            GoogleCalendarApi.delete_events(['id-Y'])
+            self.assertIsNone(self.mirror.get('id-Y'))
+
+    def test_background_sync_errors_recorded(self):
+        """Test failed background syncs are kept in last_error until one succeeds."""
+
+        def wait_for(condition):
+            deadline = time.monotonic() + 5
+            while not condition() and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        with mock.patch.object(self.mirror, 'sync',
+                               side_effect=IOError('no credentials')):
+            self.mirror.start(interval=60)
+            wait_for(lambda: self.mirror.last_error)
+            self.mirror.stop()
+        self.assertEqual(self.mirror.last_error, 'OSError: no credentials')
+
+        self.mirror.start(interval=60)
+        wait_for(lambda: self.mirror.last_error is None)
+        self.mirror.stop()
+        self.assertIsNotNone(self.mirror.sync_token)
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,446 @@
+"""Test application endpoints against a fake Google Calendar API."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import calguru
+from bson import json_util
+from webtest import TestApp, TestRequest
+from src.api.gcal_api import GoogleCalendarApi
+from src.api.gcal_http_pool import HttpPool
+from src.sync.event_mirror import EventMirror
+from src.utils.lru_cache import TTLCache
+from src.utils.metrics import CalGuruMetrics
+from src.utils.quota import SqliteQuotaStore
+from src.utils.rate_limiter import TokenBucket
+from test.test_helpers.fake_gcal_service import FakeService
+from test.test_helpers.test_utils import TestUtils
+
+
+class CalGuruOfflineTest(unittest.TestCase):
+    """Test calguru.py without calling Google."""
+
+    def setUp(self):
+        """Executed before each test."""
+
+        # Create test app to mimic calguru.py
+        self.app = TestApp(calguru.app)
+
+        # Every thread gets the same fake Resource object, without throttling
+        self.service = FakeService()
+        for patch in (mock.patch.object(GoogleCalendarApi, 'get_service',
+                                        return_value=self.service),
+                      mock.patch.object(GoogleCalendarApi, 'get_http_pool',
+                                        return_value=HttpPool(object)),
+                      mock.patch.object(GoogleCalendarApi, 'rate_limiter',
+                                        TokenBucket(rate=10000, capacity=1000)),
+                      mock.patch.object(GoogleCalendarApi, 'interval_indexes', {}),
+                      mock.patch.object(GoogleCalendarApi, 'event_cache',
+                                        TTLCache(max_size=100, ttl=60))):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        # Don't leak stored responses between tests
+        self.addCleanup(calguru.idempotency_cache.clear)
+
+    @staticmethod
+    def get_data(resp):
+        """Returns 'data' of input response's json body."""
+
+        return json_util.loads(resp.body.decode('utf-8'))['data']
+
+    @staticmethod
+    def make_event(summary, start=1514901600):
+        """Returns valid event dict with input summary."""
+
+        return {'summary': summary, 'start': start,
+                'end': start + TestUtils.HOURS_MILLIS}
+
+    def test_create_gcal_events_partial(self):
+        """Test POST /gcal/events?partial=true reports each event's outcome."""
+
+        events = [self.make_event('Valid'), {'summary': 'Missing times'}]
+
+        resp = self.app.post_json('/gcal/events?partial=true', {'events': events})
+
+        self.assertEqual(resp.status_code, 200)
+        items = self.get_data(resp)['calendar_events']
+        self.assertEqual(items[0]['status'], 'success')
+        self.assertEqual(items[0]['id'], 'id-Valid')
+        self.assertEqual(items[1]['status'], 'error')
+        self.assertEqual(items[1]['reason'], 'MissingEventFields')
+
+    def test_create_gcal_events_async(self):
+        """Test POST /gcal/events?async=true queues a job that can be polled."""
+
+        events = [self.make_event('Async 1'), self.make_event('Async 2')]
+
+        resp = self.app.post_json('/gcal/events?async=true', {'events': events})
+
+        self.assertEqual(resp.status_code, 202)
+        job_id = self.get_data(resp)['job_id']
+        self.assertEqual(resp.headers['Location'], '/gcal/jobs/' + job_id)
+
+        # Wait for job to finish and check its results
+        calguru.job_queue.join()
+        job = self.get_data(self.app.get('/gcal/jobs/' + job_id))['job']
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['completed'], 2)
+        self.assertEqual([item['id'] for item in job['results']],
+                         ['id-Async 1', 'id-Async 2'])
+
+        # Retries get the job's current state, not the one it was queued in
+        headers = {'Idempotency-Key': 'async-key'}
+        body = {'events': [self.make_event('Async 3')]}
+        job_id = self.get_data(self.app.post_json(
+            '/gcal/events?async=true', body, headers=headers))['job_id']
+        calguru.job_queue.join()
+        resp = self.app.post_json('/gcal/events?async=true', body, headers=headers)
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.headers['Location'], '/gcal/jobs/' + job_id)
+        self.assertEqual(self.get_data(resp)['job']['status'], 'succeeded')
+
+        # Invalid payloads are rejected before being queued
+        resp = self.app.post_json('/gcal/events?async=true',
+                                  {'events': [{'summary': 'Missing times'}]},
+                                  expect_errors=True)
+        self.assertEqual(resp.status_code, 400)
+
+        # Unknown jobs aren't found
+        resp = self.app.get('/gcal/jobs/missing', expect_errors=True)
+        self.assertEqual(resp.status_code, 404)
+
+    def test_create_gcal_events_idempotency_key(self):
+        """Test requests retried with an Idempotency-Key get stored response."""
+
+        headers = {'Idempotency-Key': 'retry-key'}
+        body = {'events': [self.make_event('Retried')]}
+
+        first = self.app.post_json('/gcal/events', body, headers=headers)
+        calls = len(self.service.calls)
+        second = self.app.post_json('/gcal/events', body, headers=headers)
+
+        self.assertEqual(self.get_data(first), self.get_data(second))
+        self.assertEqual(len(self.service.calls), calls)
+
+        # Same key with a different request is rejected
+        resp = self.app.post_json('/gcal/events',
+                                  {'events': [self.make_event('Other')]},
+                                  headers=headers, expect_errors=True)
+        self.assertEqual(resp.status_code, 422)
+
+    def test_get_gcal_event(self):
+        """Test GET /gcal/events/<id> returns event with ETag, or 304 if unchanged."""
+
+        self.app.post_json('/gcal/events', {'events': [self.make_event('Poll')]})
+
+        resp = self.app.get('/gcal/events/id-Poll')
+        self.assertEqual(self.get_data(resp)['calendar_event']['summary'], 'Poll')
+        etag = resp.headers['ETag']
+
+        resp = self.app.get('/gcal/events/id-Poll',
+                            headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.body, b'')
+
+        # Polling is answered from cache
+        self.assertEqual(len([call for call in self.service.calls
+                              if call.method == 'get']), 1)
+
+        resp = self.app.get('/gcal/events/missing', expect_errors=True)
+        self.assertEqual(resp.status_code, 404)
+
+    def test_json_content_type(self):
+        """Test successful and failed responses are labelled as json."""
+
+        resp = self.app.post_json('/gcal/events', {'events': [self.make_event('Json')]})
+        self.assertEqual(resp.content_type, 'application/json')
+
+        resp = self.app.get('/gcal/events/missing', expect_errors=True)
+        self.assertEqual(resp.content_type, 'application/json')
+
+    def test_delete_gcal_events(self):
+        """Test DELETE /gcal/events deletes every listed event."""
+
+        self.app.post_json('/gcal/events', {'events': [self.make_event('Delete')]})
+
+        resp = self.app.delete_json('/gcal/events', {'ids': ['id-Delete', 'gone']})
+
+        self.assertEqual(resp.status_code, 200)
+        items = self.get_data(resp)['calendar_events']
+        self.assertEqual([item['status'] for item in items], ['success', 'success'])
+        self.assertEqual(self.service.stored_events, {})
+
+    def test_delete_gcal_events_invalid_ids(self):
+        """Test DELETE /gcal/events rejects ids that aren't a list of strings."""
+
+        self.app.post_json('/gcal/events', {'events': [self.make_event('a')]})
+
+        resp = self.app.delete_json('/gcal/events', {'ids': 'abc'},
+                                    expect_errors=True)
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.app.delete_json('/gcal/events', {'ids': [1, 'gone', None]})
+        items = self.get_data(resp)['calendar_events']
+        self.assertEqual([item['status'] for item in items],
+                         ['error', 'success', 'error'])
+        self.assertEqual(items[0]['reason'], 'InvalidEventIds')
+        self.assertEqual(len([call for call in self.service.calls
+                              if call.method == 'delete']), 1)
+        self.assertIn('id-a', self.service.stored_events)
+
+    def test_patch_gcal_events(self):
+        """Test PATCH /gcal/events updates events and reports each outcome."""
+
+        self.app.post_json('/gcal/events', {'events': [self.make_event('Patch')]})
+
+        resp = self.app.patch_json('/gcal/events?notify=false', {'events': [
+            {'id': 'id-Patch', 'changes': {'start': 1514898000}},
+            {'id': 'id-Patch', 'changes': {'summary': 'Late'}, 'etag': '"old"'}]})
+
+        self.assertEqual(resp.status_code, 200)
+        items = self.get_data(resp)['calendar_events']
+        self.assertEqual(items[0]['status'], 'success')
+        self.assertEqual(items[1]['code'], 412)
+        self.assertEqual(self.service.stored_events['id-Patch']['summary'], 'Patch')
+        self.assertFalse(self.service.calls[-1].kwargs['sendNotifications'])
+
+    def test_patch_gcal_events_invalid(self):
+        """Test PATCH /gcal/events rejects updates that aren't a list."""
+
+        resp = self.app.patch_json('/gcal/events', {'events': 'abc'},
+                                   expect_errors=True)
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(self.service.calls)
+
+        resp = self.app.patch_json('/gcal/events', {'events': [
+            {'id': 'id-Patch', 'changes': {'attendees': 'a@b.com'}}]})
+        items = self.get_data(resp)['calendar_events']
+        self.assertEqual(items[0]['reason'], 'InvalidEventChanges')
+        self.assertFalse(self.service.calls)
+
+    def test_get_gcal_quota(self):
+        """Test GET /gcal/quota reports usage of local and shared rate limiters."""
+
+        account = self.get_data(self.app.get('/gcal/quota'))['accounts'][0]
+        self.assertFalse(account['shared'])
+        self.assertEqual(account['capacity'], 1000)
+
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        for patch in (mock.patch.object(GoogleCalendarApi, 'quota_store', None),
+                      mock.patch.object(GoogleCalendarApi, 'rate_limiters', {})):
+            patch.start()
+            self.addCleanup(patch.stop)
+        GoogleCalendarApi.use_quota_store(
+            SqliteQuotaStore(os.path.join(path, 'quota.sqlite3')))
+
+        self.app.post_json('/gcal/events', {'events': [self.make_event('Quota')]})
+
+        account = self.get_data(self.app.get('/gcal/quota'))['accounts'][0]
+        self.assertTrue(account['shared'])
+        self.assertEqual(sum(account['workers'].values()), 1)
+
+    def test_get_gcal_events(self):
+        """Test GET /gcal/events streams events as newline-delimited json."""
+
+        self.app.post_json('/gcal/events', {'events': [
+            self.make_event('Standup'), self.make_event('Lunch', 1514905200)]})
+
+        resp = self.app.get('/gcal/events?timeMin=1514800000&q=Standup')
+
+        self.assertEqual(resp.content_type, 'application/x-ndjson')
+        lines = [json_util.loads(line) for line in resp.text.splitlines()]
+        self.assertEqual([event['summary'] for event in lines], ['Standup'])
+
+        resp = self.app.get('/gcal/events?ids=id-Lunch,missing')
+        lines = [json_util.loads(line) for line in resp.text.splitlines()]
+        self.assertEqual(lines[0]['summary'], 'Lunch')
+        self.assertIsNone(lines[1])
+
+        resp = self.app.get('/gcal/events?timeMax=2018-01-02T14:30:00Z')
+        lines = [json_util.loads(line) for line in resp.text.splitlines()]
+        self.assertEqual([event['summary'] for event in lines], ['Standup'])
+
+        # Invalid times are client errors
+        for query in ('timeMin=tomorrow', 'timeMax=1e20', 'timeMin=nan'):
+            resp = self.app.get('/gcal/events?' + query, expect_errors=True)
+            self.assertEqual(resp.status_code, 400)
+            self.assertIn('RFC3339', resp.json['message'])
+
+    def test_stream_gcal_events(self):
+        """Test POST /gcal/events:stream creates events from ndjson lines."""
+
+        body = b'\n'.join([json.dumps(self.make_event('Event %d' % index)).encode()
+                           for index in range(7)] + [b'', b'{not json'])
+
+        with mock.patch.object(GoogleCalendarApi, 'BATCH_SIZE', 2), \
+                mock.patch.object(GoogleCalendarApi, 'MAX_CONCURRENT_BATCHES', 2):
+            resp = self.app.post('/gcal/events:stream', body,
+                                 content_type='application/x-ndjson')
+
+        self.assertEqual(resp.content_type, 'application/x-ndjson')
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        self.assertEqual([line['index'] for line in lines], list(range(8)))
+        self.assertEqual([line['summary'] for line in lines[:7]],
+                         ['Event %d' % index for index in range(7)])
+        self.assertEqual(lines[7]['status'], 'error')
+        self.assertEqual(lines[7]['reason'], 'InvalidBody')
+
+    def test_get_gcal_changes(self):
+        """Test GET /gcal/changes lists mirror changes since a sequence number."""
+
+        # Mirror isn't enabled
+        resp = self.app.get('/gcal/changes', expect_errors=True)
+        self.assertEqual(resp.status_code, 503)
+
+        mirror = EventMirror()
+        with mock.patch.object(GoogleCalendarApi, 'mirror', mirror):
+            self.app.post_json('/gcal/events', {'events': [self.make_event('First')]})
+            mirror.sync()
+            since = self.get_data(self.app.get('/gcal/changes'))['next']
+
+            self.app.delete_json('/gcal/events', {'ids': ['id-First']})
+            data = self.get_data(self.app.get('/gcal/changes?since=%d' % since))
+
+            resp = self.app.get('/gcal/changes?since=x', expect_errors=True)
+            self.assertEqual(resp.status_code, 400)
+            resp = self.app.get('/gcal/changes?limit=0', expect_errors=True)
+            self.assertEqual(resp.status_code, 400)
+
+        self.assertEqual([(event['id'], event['status']) for event in data['changes']],
+                         [('id-First', 'cancelled')])
+        self.assertGreater(data['next'], since)
+
+        # Failure of background sync is reported while mirror isn't ready
+        mirror = EventMirror()
+        mirror.last_error = 'FileNotFoundError: no credentials'
+        with mock.patch.object(GoogleCalendarApi, 'mirror', mirror):
+            resp = self.app.get('/gcal/changes', expect_errors=True)
+        self.assertEqual(resp.status_code, 503)
+        self.assertIn('no credentials', resp.json['message'])
+
+    def test_conflicts_and_free_busy(self):
+        """Test conflicting events are rejected and slots reported busy."""
+
+        self.app.post_json('/gcal/events', {'events': [self.make_event('Busy')]})
+
+        resp = self.app.post_json('/gcal/events?conflicts=reject',
+                                  {'events': [self.make_event('Clash')]},
+                                  expect_errors=True)
+        self.assertEqual(resp.status_code, 409)
+
+        resp = self.app.post_json('/gcal/events?conflicts=maybe',
+                                  {'events': [self.make_event('Clash')]},
+                                  expect_errors=True)
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.app.post_json('/gcal/freebusy', {'slots': [
+            {'start': 1514901600, 'end': 1514902000},
+            {'start': 1514905200, 'end': 1514906000}]})
+        self.assertEqual([slot['busy'] for slot in self.get_data(resp)['slots']],
+                         [True, False])
+
+        # Malformed slots are client errors
+        for slots in ([{'start': 'a', 'end': 2}], [{'start': 2, 'end': 1}], ['slot'],
+                      'slots'):
+            resp = self.app.post_json('/gcal/freebusy', {'slots': slots},
+                                      expect_errors=True)
+            self.assertEqual(resp.status_code, 400)
+
+    def test_invalid_bodies_rejected(self):
+        """Test unparseable and oversized request bodies get client errors."""
+
+        resp = self.app.post('/gcal/events', b'{"events": [', expect_errors=True)
+        self.assertEqual(resp.status_code, 400)
+
+        with mock.patch('src.utils.api_utils.APIUtils.MAX_BODY_SIZE', 16):
+            resp = self.app.post_json('/gcal/events',
+                                      {'events': [self.make_event('Big')]},
+                                      expect_errors=True)
+        self.assertEqual(resp.status_code, 413)
+        self.assertEqual(self.service.calls, [])
+
+    def test_chunked_bodies(self):
+        """Test chunked request bodies are decoded and limited while read."""
+
+        def post_chunked(body):
+            request = TestRequest.blank('/gcal/events', method='POST', body=body)
+            request.content_type = 'application/json'
+            request.headers['Transfer-Encoding'] = 'chunked'
+            del request.environ['CONTENT_LENGTH']
+            return self.app.do_request(request, expect_errors=True)
+
+        body = json.dumps({'events': [self.make_event('Chunked')]}).encode('utf-8')
+        chunked = b''.join(b'%x\r\n%s\r\n' % (len(body[start:start + 10]),
+                                                 body[start:start + 10])
+                           for start in range(0, len(body), 10)) + b'0\r\n\r\n'
+
+        resp = post_chunked(chunked)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('id-Chunked', self.service.stored_events)
+
+        # Oversized bodies are rejected before Bottle buffers them
+        with mock.patch('src.utils.api_utils.APIUtils.MAX_BODY_SIZE', 16), \
+                mock.patch('bottle.BaseRequest.body', new_callable=mock.PropertyMock,
+                           side_effect=AssertionError('Body was buffered.')):
+            resp = post_chunked(chunked)
+        self.assertEqual(resp.status_code, 413)
+
+        self.assertEqual(post_chunked(b'zz\r\n{}').status_code, 400)
+
+    def test_notifications_parameter(self):
+        """Test notifications policy is validated and passed through."""
+
+        resp = self.app.post_json('/gcal/events?notifications=none',
+                                  {'events': [self.make_event('Quiet')]})
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(self.service.calls[-1].kwargs['sendNotifications'])
+
+        # Digests need a configured sender
+        for policy in ('loud', 'digest'):
+            resp = self.app.post_json('/gcal/events?notifications=' + policy,
+                                      {'events': [self.make_event('Quiet')]},
+                                      expect_errors=True)
+            self.assertEqual(resp.status_code, 400)
+
+    def test_calendar_routes(self):
+        """Test /gcal/calendars/<calendar_id> endpoints use input calendar."""
+
+        resp = self.app.post_json('/gcal/calendars/team@example.com/events',
+                                  {'events': [self.make_event('Team')]})
+        self.assertEqual(self.get_data(resp)['calendar_events'][0]['summary'], 'Team')
+
+        resp = self.app.post_json('/gcal/calendars/team@example.com/freebusy',
+                                  {'slots': [{'start': 1514901600,
+                                              'end': 1514905200}]})
+        self.assertTrue(self.get_data(resp)['slots'][0]['busy'])
+
+        # Default calendar doesn't know the event
+        resp = self.app.post_json('/gcal/freebusy', {'slots': [
+            {'start': 1514901600, 'end': 1514905200}]})
+        self.assertFalse(self.get_data(resp)['slots'][0]['busy'])
+        self.assertEqual({call.kwargs['calendarId'] for call in self.service.calls},
+                         {'team@example.com'})
+
+    def test_get_metrics(self):
+        """Test GET /metrics reports created events and Google round trips."""
+
+        created = CalGuruMetrics.events_created.get()
+        self.app.post_json('/gcal/events', {'events': [self.make_event('A'),
+                                                       self.make_event('B')]})
+
+        resp = self.app.get('/metrics')
+
+        self.assertTrue(resp.content_type.startswith('text/plain'))
+        self.assertEqual(CalGuruMetrics.events_created.get(), created + 2)
+        self.assertIn('calguru_events_created_total %d' % (created + 2),
+                      resp.text.splitlines())
+        self.assertIn('calguru_google_request_seconds_count{kind="batch"}', resp.text)
+        self.assertIn('calguru_body_parse_seconds_count', resp.text)
+
+    if __name__ == "__main__":
+        unittest.main()
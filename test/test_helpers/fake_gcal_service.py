@@ -0,0 +1,198 @@
+"""In-memory stand-in for Google Calendar API Resource objects."""
+
+import json
+import threading
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+def make_http_error(status, reason=None, headers=None):
+    """Returns HttpError like those Google Calendar API calls fail with."""
+
+    resp = httplib2.Response(dict(headers or {}, status=status))
+    content = json.dumps({'error': {'code': status, 'message': reason or 'error',
+                                    'errors': [{'reason': reason}]}})
+    return HttpError(resp, content.encode('utf-8'))
+
+
+class FakeRequest(object):
+    """A single Google Calendar API call that hasn't been executed yet."""
+
+    def __init__(self, service, method, kwargs):
+        self.service = service
+        self.method = method
+        self.kwargs = kwargs
+        self.headers = {}
+
+    def execute(self, **_):
+        """Executes call outside of a batch request."""
+
+        response, exception = self.service.handle(self)
+        if exception:
+            raise exception
+        return response
+
+
+class FakeEvents(object):
+    """Mimics the events collection of a Resource object."""
+
+    def __init__(self, service):
+        self.service = service
+
+    def __getattr__(self, method):
+        return lambda **kwargs: FakeRequest(self.service, method, kwargs)
+
+
+class FakeBatch(object):
+    """Mimics googleapiclient.http.BatchHttpRequest."""
+
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self, **_):
+        with self.service.lock:
+            self.service.batch_sizes.append(len(self.requests))
+        for request_id, request in self.requests:
+            response, exception = self.service.handle(request)
+            self.callback(request_id, response, exception)
+
+
+class FakeService(object):
+    """
+    Mimics a Resource object for Google Calendar API.
+
+    Every executed call is passed to handler, which returns a
+    (response, exception) tuple. The default handler keeps events in memory:
+    inserted events get ids derived from their summaries unless they specify
+    their own, and inserting an existing id fails with 409.
+    """
+
+    def __init__(self, handler=None):
+        self.handler = handler or self.calendar_handler
+        self.lock = threading.Lock()
+        self.calls = []
+        self.batch_sizes = []
+
+        # Events stored by calendar_handler, by id
+        self.stored_events = {}
+
+        # Deleted events by id, and number of the last change of every event;
+        # sync tokens are change numbers
+        self.deleted_events = {}
+        self.change_seqs = {}
+
+    def events(self):
+        return FakeEvents(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def handle(self, request):
+        with self.lock:
+            self.calls.append(request)
+        return self.handler(request)
+
+    def calendar_handler(self, request):
+        """Handles calls against events kept in stored_events."""
+
+        event_id = request.kwargs.get('eventId')
+
+        if request.method == 'insert':
+            body = dict(request.kwargs.get('body') or {})
+            event_id = body.get('id') or 'id-%s' % body.get('summary')
+            if body.get('id') and event_id in self.stored_events:
+                return None, make_http_error(409, 'duplicate')
+            body.update({'id': event_id, 'htmlLink': 'link-%s' % event_id,
+                         'status': 'confirmed'})
+            self.stored_events[event_id] = body
+            self.record_change(event_id)
+            return dict(body, etag=self.get_etag(event_id)), None
+
+        if request.method == 'list':
+            if request.kwargs.get('syncToken'):
+                return self.list_changes(**request.kwargs)
+            return self.list_events(**request.kwargs), None
+
+        if event_id not in self.stored_events:
+            return None, make_http_error(404, 'notFound')
+
+        if request.method == 'get':
+            etag = self.get_etag(event_id)
+            if request.headers.get('If-None-Match') == etag:
+                return None, make_http_error(304)
+            return dict(self.stored_events[event_id], etag=etag), None
+
+        if request.method == 'patch':
+            if_match = request.headers.get('If-Match')
+            if if_match and if_match != self.get_etag(event_id):
+                return None, make_http_error(412, 'conditionNotMet')
+            self.stored_events[event_id].update(request.kwargs.get('body') or {})
+            self.record_change(event_id)
+            return dict(self.stored_events[event_id],
+                        etag=self.get_etag(event_id)), None
+
+        if request.method == 'delete':
+            self.deleted_events[event_id] = dict(
+                self.stored_events.pop(event_id), status='cancelled')
+            self.record_change(event_id)
+            return '', None
+
+        return None, make_http_error(400, 'unsupported')
+
+    def list_events(self, timeMin=None, timeMax=None, q=None, pageToken=None,
+                    maxResults=250, **_):
+        """Returns page of stored events in time range, ordered by start time."""
+
+        events = sorted(self.stored_events.values(),
+                        key=lambda event: event['start']['dateTime'])
+        events = [event for event in events
+                  if (timeMin is None or event['end']['dateTime'] > timeMin) and
+                  (timeMax is None or event['start']['dateTime'] < timeMax) and
+                  (not q or q in event.get('summary', ''))]
+
+        return self.make_page(events, pageToken, maxResults)
+
+    def get_etag(self, event_id):
+        """Returns etag of current version of event with input id."""
+
+        return '"%d"' % self.change_seqs[event_id]
+
+    def record_change(self, event_id):
+        """Records that event with input id has changed."""
+
+        self.change_seqs[event_id] = max(self.change_seqs.values() or [0]) + 1
+
+    def list_changes(self, syncToken, pageToken=None, maxResults=250, **_):
+        """
+        Returns page of events, including deleted ones, changed since input
+        sync token. Fails with 410 if sync token is 'expired'.
+        """
+
+        if syncToken == 'expired':
+            return None, make_http_error(410, 'fullSyncRequired')
+
+        events = [dict(self.stored_events.get(event_id) or
+                       self.deleted_events[event_id])
+                  for event_id, seq in sorted(self.change_seqs.items(),
+                                              key=lambda item: item[1])
+                  if seq > int(syncToken)]
+        return self.make_page(events, pageToken, maxResults), None
+
+    def make_page(self, events, page_token, max_results):
+        """
+        Returns page of input events starting at input page token. Page tokens
+        are offsets into events; the last page has a sync token.
+        """
+
+        offset = int(page_token or 0)
+        page = {'items': [dict(event) for event in events[offset:offset + max_results]]}
+        if offset + max_results < len(events):
+            page['nextPageToken'] = str(offset + max_results)
+        else:
+            page['nextSyncToken'] = str(max(self.change_seqs.values() or [0]))
+        return page
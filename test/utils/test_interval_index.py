@@ -0,0 +1,51 @@
+"""Test index of event time intervals."""
+
+import random
+import unittest
+from src.utils.interval_index import IntervalIndex
+
+
+class IntervalIndexTest(unittest.TestCase):
+    """Test interval_index.py."""
+
+    def test_overlaps(self):
+        """Test overlapping intervals are found, with touching ones excluded."""
+
+        index = IntervalIndex()
+        index.add('long', 0, 100)
+        index.add('a', 10, 20)
+        index.add('b', 30, 40)
+
+        self.assertEqual(index.overlaps(15, 35), ['long', 'a', 'b'])
+        self.assertEqual(index.overlaps(20, 30), ['long'])
+        self.assertFalse(index.is_busy(100, 110))
+        self.assertTrue(index.is_busy(99, 110))
+
+        # Replacing and removing intervals
+        index.add('long', 0, 5)
+        index.remove('b')
+        self.assertEqual(index.overlaps(15, 35), ['a'])
+        self.assertFalse(index.is_busy(20, 30))
+        self.assertEqual(len(index), 2)
+
+    def test_matches_brute_force(self):
+        """Test queries match checking every interval on random data."""
+
+        rand = random.Random(7)
+        index = IntervalIndex()
+        intervals = {}
+        for interval_id in range(300):
+            start = rand.randint(0, 10000)
+            intervals[interval_id] = (start, start + rand.randint(1, 300))
+            index.add(interval_id, *intervals[interval_id])
+
+        for _ in range(200):
+            start = rand.randint(0, 10000)
+            end = start + rand.randint(1, 100)
+            expected = sorted(interval_id for interval_id, (s, e) in intervals.items()
+                              if s < end and e > start)
+            self.assertEqual(sorted(index.overlaps(start, end)), expected)
+            self.assertEqual(index.is_busy(start, end), bool(expected))
+
+    if __name__ == "__main__":
+        unittest.main()
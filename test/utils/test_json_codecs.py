@@ -0,0 +1,30 @@
+"""Test request and response body codecs."""
+
+import datetime
+import unittest
+from src.utils.json_codecs import JsonCodec, ExtendedJsonCodec
+
+
+class JsonCodecsTest(unittest.TestCase):
+    """Test json_codecs.py."""
+
+    def test_round_trip(self):
+        """Test both codecs decode what they encode, from and to bytes."""
+
+        obj = {'events': [{'summary': 'Café', 'start': 1514901600,
+                           'attendees': ['a@example.com']}], 'ok': True}
+
+        for codec in (JsonCodec, ExtendedJsonCodec):
+            encoded = codec.dumps(obj)
+            self.assertIsInstance(encoded, bytes)
+            self.assertEqual(codec.loads(encoded), obj)
+
+    def test_unsupported_values_encoded_as_strings(self):
+        """Test JsonCodec encodes values json doesn't support as strings."""
+
+        encoded = JsonCodec.dumps({'when': datetime.date(2018, 5, 9)})
+
+        self.assertEqual(JsonCodec.loads(encoded), {'when': '2018-05-09'})
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,36 @@
+"""Test bounded in-memory cache."""
+
+import time
+import unittest
+from src.utils.lru_cache import TTLCache
+
+
+class TTLCacheTest(unittest.TestCase):
+    """Test lru_cache.py."""
+
+    def test_lru_eviction(self):
+        """Test least recently used entry is evicted once cache is full."""
+
+        cache = TTLCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        # 'a' is now most recently used, so 'b' is evicted
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl_expiry(self):
+        """Test entries expire after ttl seconds."""
+
+        cache = TTLCache(max_size=10, ttl=0.01)
+        cache.set('a', 1)
+        time.sleep(0.02)
+
+        self.assertEqual(cache.get('a', 'expired'), 'expired')
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,70 @@
+"""Test counters and histograms."""
+
+import threading
+import unittest
+from src.utils.metrics import MetricsRegistry
+
+
+class MetricsTest(unittest.TestCase):
+    """Test metrics.py."""
+
+    def setUp(self):
+        """Executed before each test."""
+
+        self.registry = MetricsRegistry()
+        self.counter = self.registry.counter('test_total', 'Test counter.',
+                                             ('reason',))
+        self.histogram = self.registry.histogram('test_seconds', 'Test histogram.',
+                                                 buckets=(0.1, 1.0))
+
+    def test_threads_aggregated(self):
+        """Test values recorded by several threads, including exited ones, add up."""
+
+        def record():
+            for _ in range(1000):
+                self.counter.inc(reason='rateLimitExceeded')
+            self.histogram.observe(0.5)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.counter.inc(2, reason='notFound')
+
+        self.assertEqual(self.counter.get(reason='rateLimitExceeded'), 4000)
+        self.assertEqual(self.counter.get(reason='notFound'), 2)
+        self.assertEqual(self.histogram.get(), (2.0, 4))
+
+        # Shards of exited threads are folded together
+        self.assertEqual(len(self.counter._shards), 1)
+
+    def test_exited_threads_retired_without_collect(self):
+        """Test shards of exited threads don't pile up between collections."""
+
+        for _ in range(3 * self.counter.RETIRE_INTERVAL):
+            thread = threading.Thread(target=self.counter.inc)
+            thread.start()
+            thread.join()
+
+        self.assertLessEqual(len(self.counter._shards), self.counter.RETIRE_INTERVAL)
+        self.assertEqual(self.counter.get(), 3 * self.counter.RETIRE_INTERVAL)
+
+    def test_render(self):
+        """Test metrics are rendered in Prometheus text format."""
+
+        self.counter.inc(reason='quota "exceeded"')
+        self.histogram.observe(0.05)
+        self.histogram.observe(5)
+
+        lines = self.registry.render().splitlines()
+
+        self.assertIn('# TYPE test_total counter', lines)
+        self.assertIn('test_total{reason="quota \\"exceeded\\""} 1', lines)
+        self.assertIn('test_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{le="1.0"} 1', lines)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 2', lines)
+        self.assertIn('test_seconds_count 2', lines)
+
+    if __name__ == "__main__":
+        unittest.main()
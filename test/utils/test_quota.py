@@ -0,0 +1,97 @@
+"""Test rate limiting shared across processes."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from src.utils.quota import SharedTokenBucket, SqliteQuotaStore
+
+
+class SqliteQuotaStoreTest(unittest.TestCase):
+    """Test quota.py."""
+
+    def setUp(self):
+        """Executed before each test."""
+
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'quota.sqlite3')
+
+    def make_bucket(self, worker, rate=100, capacity=5):
+        """Returns bucket of input worker, with its own store of the database."""
+
+        return SharedTokenBucket('account', rate=rate, capacity=capacity,
+                                 store=SqliteQuotaStore(self.path), worker=worker)
+
+    def test_tokens_shared(self):
+        """Test workers take tokens from the same bucket."""
+
+        first, second = self.make_bucket('a'), self.make_bucket('b')
+
+        start = time.monotonic()
+        first.acquire(5)
+        self.assertLess(time.monotonic() - start, 0.05)
+
+        # First worker emptied bucket; 5 more tokens take 0.05 seconds to refill
+        second.acquire(5)
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_pause_shared(self):
+        """Test pausing a worker's bucket pauses every worker's."""
+
+        first, second = self.make_bucket('a'), self.make_bucket('b')
+        first.pause(0.05)
+
+        start = time.monotonic()
+        second.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_fair_sharing(self):
+        """Test worker with the least recent usage is served first."""
+
+        store = SqliteQuotaStore(self.path)
+        self.assertEqual(store.try_acquire('account', 'a1', 'a', 1, 10, 1), 0)
+
+        # Worker a queues before worker b, but b hasn't used any tokens yet
+        self.assertGreater(store.try_acquire('account', 'a2', 'a', 1, 10, 1), 0)
+        self.assertGreater(store.try_acquire('account', 'b1', 'b', 1, 10, 1), 0)
+
+        time.sleep(0.15)
+        self.assertGreater(store.try_acquire('account', 'a2', 'a', 1, 10, 1), 0)
+        self.assertEqual(store.try_acquire('account', 'b1', 'b', 1, 10, 1), 0)
+
+        # Worker a is served once b has used as many tokens
+        time.sleep(0.15)
+        self.assertEqual(store.try_acquire('account', 'a2', 'a', 1, 10, 1), 0)
+
+    def test_stale_waiter_dropped(self):
+        """Test waiter that stopped polling doesn't block other workers."""
+
+        store = SqliteQuotaStore(self.path)
+        store.STALE_SECONDS = 0.05
+        store.pause('account', 0.2)
+        self.assertGreater(store.try_acquire('account', 'dead', 'a', 1, 100, 5), 0)
+
+        time.sleep(0.3)
+        self.assertEqual(store.try_acquire('account', 'b1', 'b', 1, 100, 5), 0)
+
+    def test_usage(self):
+        """Test usage reports available tokens and each worker's calls."""
+
+        first, second = self.make_bucket('a', rate=0.001), \
+            self.make_bucket('b', rate=0.001)
+        first.acquire(3)
+        second.acquire(1)
+        second.pause(60)
+
+        usage = first.usage()
+        self.assertEqual(usage['name'], 'account')
+        self.assertTrue(usage['shared'])
+        self.assertAlmostEqual(usage['tokens'], 1, places=2)
+        self.assertGreater(usage['paused_for'], 59)
+        self.assertEqual(usage['waiting'], 0)
+        self.assertEqual(usage['workers'], {'a': 3, 'b': 1})
+
+    if __name__ == "__main__":
+        unittest.main()
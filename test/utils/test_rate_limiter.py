@@ -0,0 +1,35 @@
+"""Test client-side rate limiting."""
+
+import time
+import unittest
+from src.utils.rate_limiter import TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+    """Test rate_limiter.py."""
+
+    def test_burst_then_throttle(self):
+        """Test a full bucket is spent at once and then refills at rate."""
+
+        bucket = TokenBucket(rate=100, capacity=5)
+
+        start = time.monotonic()
+        bucket.acquire(5)
+        self.assertLess(time.monotonic() - start, 0.05)
+
+        # Bucket is empty; 5 more tokens take 0.05 seconds to refill
+        bucket.acquire(5)
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_pause(self):
+        """Test no tokens are handed out while bucket is paused."""
+
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.pause(0.05)
+
+        start = time.monotonic()
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    if __name__ == "__main__":
+        unittest.main()
@@ -0,0 +1,84 @@
+"""Test concurrent WSGI servers."""
+
+import threading
+import time
+import unittest
+from urllib.request import urlopen
+from bottle import Bottle
+from src.utils.server import ThreadedWSGIRefServer, WaitressServer
+
+
+class ThreadedWSGIRefServerTest(unittest.TestCase):
+    """Test server.py."""
+
+    def test_requests_handled_concurrently(self):
+        """Test slow requests don't block each other, and shutdown waits for them."""
+
+        app = Bottle()
+
+        @app.get('/slow')
+        def slow():
+            time.sleep(0.3)
+            return 'done'
+
+        server = ThreadedWSGIRefServer(host='127.0.0.1', port=0, threads=4)
+        server.quiet = True
+        thread = threading.Thread(target=server.run, args=(app,))
+        thread.start()
+        while not hasattr(server, 'srv'):
+            time.sleep(0.01)
+        url = 'http://127.0.0.1:%d/slow' % server.srv.server_port
+
+        bodies = []
+        clients = [threading.Thread(target=lambda: bodies.append(urlopen(url).read()))
+                   for _ in range(4)]
+        started = time.monotonic()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+
+        self.assertEqual(bodies, [b'done'] * 4)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+        server.srv.shutdown()
+        thread.join()
+
+
+class WaitressServerTest(unittest.TestCase):
+    """Test WaitressServer in server.py."""
+
+    def test_shutdown_finishes_requests(self):
+        """Test stopping server lets in-flight and queued requests finish."""
+
+        app = Bottle()
+
+        @app.get('/slow')
+        def slow():
+            time.sleep(0.3)
+            return 'done'
+
+        server = WaitressServer(host='127.0.0.1', port=0, threads=1)
+        server.quiet = True
+        thread = threading.Thread(target=server.run, args=(app,))
+        thread.start()
+        while not hasattr(server, '_stopping'):
+            time.sleep(0.01)
+        url = 'http://127.0.0.1:%d/slow' % server.srv.socket.getsockname()[1]
+
+        # Second request waits in queue behind the first
+        bodies = []
+        clients = [threading.Thread(target=lambda: bodies.append(urlopen(url).read()))
+                   for _ in range(2)]
+        for client in clients:
+            client.start()
+        time.sleep(0.1)
+        server.stop()
+
+        for client in clients:
+            client.join()
+        thread.join()
+        self.assertEqual(bodies, [b'done'] * 2)
+
+    if __name__ == "__main__":
+        unittest.main()